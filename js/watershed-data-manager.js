@@ -22,7 +22,9 @@ class WatershedDataManager {
     this.baseUrl = 'https://raw.githubusercontent.com/alaskafishcounts/afca-watershed-dataset/main';
     this.manifest = null;
     this.cache = new Map();
-    this.cacheTimeout = 300000; // 5 minutes
+    this.cacheTimeout = 300000; // 5 minutes, for files the manifest lists without a hash
+    this.fileStoreName = 'afca-watershed-data'; // Cache Storage bucket kept across visits
+    this.preferColumnar = false; // load *.columnar.json variants when the manifest lists them
     this.loading = false;
     this.error = null;
     
@@ -30,7 +32,8 @@ class WatershedDataManager {
     this.cacheStats = {
       hits: 0,
       misses: 0,
-      sets: 0
+      sets: 0,
+      stored: 0
     };
     
     // Available parameters
@@ -64,7 +67,8 @@ class WatershedDataManager {
    */
   async loadManifest() {
     try {
-      const response = await fetch(`${this.baseUrl}/manifest.json`);
+      // Always revalidated: the manifest's file hashes decide whether everything else is reused
+      const response = await fetch(`${this.baseUrl}/manifest.json`, { cache: 'no-cache' });
       if (!response.ok) {
         throw new Error(`HTTP ${response.status}: ${response.statusText}`);
       }
@@ -80,6 +84,110 @@ class WatershedDataManager {
     }
   }
 
+  /**
+   * Return a location's organized manifest entry, fetching its shard when the manifest is sharded
+   * (a root manifest with per-location summaries in `locations` and each entry in its own shard)
+   */
+  async loadLocationManifest(locationId) {
+    if (!this.manifest) {
+      await this.loadManifest();
+    }
+
+    const entry = this.manifest?.organized?.[locationId];
+    if (entry) {
+      return entry;
+    }
+
+    const summary = this.manifest?.locations?.[locationId];
+    if (!summary?.manifest) {
+      return null;
+    }
+
+    const response = await this.fetchFile(summary.manifest, summary.manifest_hash);
+    const shard = await response.json();
+    this.manifest.organized = { ...this.manifest.organized, ...shard.organized };
+    this.manifest.files = { ...this.manifest.files, ...shard.files };
+    return this.manifest.organized[locationId] || null;
+  }
+
+  /**
+   * Content hash the manifest lists for a file, or undefined for files it does not hash
+   */
+  fileHash(path) {
+    return this.manifest?.files?.[path]?.hash;
+  }
+
+  /**
+   * Whether a cache entry can be reused: entries for hashed files are kept until the manifest lists
+   * a different hash, others expire after cacheTimeout
+   */
+  isFresh(cached) {
+    const hash = cached.path && this.fileHash(cached.path);
+    if (hash) {
+      return cached.hash === hash;
+    }
+    return Date.now() - cached.timestamp < this.cacheTimeout;
+  }
+
+  /**
+   * Cache a loaded file's data under cacheKey, remembering its path and hash for isFresh
+   */
+  cacheFile(cacheKey, path, data, hash = this.fileHash(path)) {
+    this.cache.set(cacheKey, {
+      data,
+      path,
+      hash,
+      timestamp: Date.now()
+    });
+    this.cacheStats.sets++;
+  }
+
+  /**
+   * Fetch a dataset file. Files with a known hash are kept in Cache Storage keyed by that hash, so
+   * repeat visits reuse them without a request until the manifest lists a new hash.
+   */
+  async fetchFile(path, hash = this.fileHash(path)) {
+    const url = `${this.baseUrl}/${path}`;
+    const store = hash ? await this.openFileStore() : null;
+    const key = `${url}?hash=${hash}`;
+
+    const stored = store && await store.match(key);
+    if (stored) {
+      this.cacheStats.stored++;
+      return stored;
+    }
+
+    const response = await fetch(url);
+    if (!response.ok) {
+      throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+    }
+
+    if (store) {
+      try {
+        // Drop earlier versions of the file before storing this one
+        await store.delete(url, { ignoreSearch: true });
+        await store.put(key, response.clone());
+      } catch (error) {
+        console.warn(`Unable to store ${path} in Cache Storage:`, error);
+      }
+    }
+    return response;
+  }
+
+  /**
+   * Open the persistent file store, or return null where Cache Storage is unavailable
+   */
+  async openFileStore() {
+    if (typeof caches === 'undefined') {
+      return null;
+    }
+    try {
+      return await caches.open(this.fileStoreName);
+    } catch (error) {
+      return null;
+    }
+  }
+
   /**
    * Load watershed data for a specific location and parameter
    */
@@ -95,12 +203,10 @@ class WatershedDataManager {
 
     // Check cache first
     const cacheKey = `watershed_${locationId}_${parameter}_${year || 'all'}`;
-    if (this.cache.has(cacheKey)) {
-      const cached = this.cache.get(cacheKey);
-      if (Date.now() - cached.timestamp < this.cacheTimeout) {
-        this.cacheStats.hits++;
-        return cached.data;
-      }
+    const cached = this.cache.get(cacheKey);
+    if (cached && this.isFresh(cached)) {
+      this.cacheStats.hits++;
+      return cached.data;
     }
 
     this.cacheStats.misses++;
@@ -115,6 +221,8 @@ class WatershedDataManager {
         throw new Error('Unable to load watershed manifest');
       }
 
+      await this.loadLocationManifest(locationId);
+
       // Get file path from manifest
       const filePath = this.getFilePath(locationId, parameter, year);
       if (!filePath) {
@@ -122,19 +230,11 @@ class WatershedDataManager {
       }
 
       // Load data from GitHub
-      const response = await fetch(`${this.baseUrl}/${filePath}`);
-      if (!response.ok) {
-        throw new Error(`HTTP ${response.status}: ${response.statusText}`);
-      }
-
-      const data = await response.json();
+      const response = await this.fetchFile(filePath);
+      const data = WatershedDataManager.expandColumnar(await response.json());
 
       // Cache the result
-      this.cache.set(cacheKey, {
-        data,
-        timestamp: Date.now()
-      });
-      this.cacheStats.sets++;
+      this.cacheFile(cacheKey, filePath, data);
 
       return data;
 
@@ -179,6 +279,11 @@ class WatershedDataManager {
       return null;
     }
 
+    const columnarPath = this.preferColumnar && locationData.columnar?.[parameter]?.[year];
+    if (columnarPath) {
+      return columnarPath;
+    }
+
     const parameterData = locationData[parameter];
     if (!parameterData || !parameterData[year]) {
       return null;
@@ -187,14 +292,286 @@ class WatershedDataManager {
     return parameterData[year];
   }
 
+  /**
+   * Load a series exported by export-binary-series.py as typed arrays, without per-row parsing
+   * Returns {header, columns: {name: Float32Array | Int16Array}, quality: Uint8Array}. Int16 columns
+   * hold scaled values (multiply by header.columns[name].scale) with header.columns[name].null marking
+   * gaps; Float32 gaps are NaN. Quality codes index header.quality.labels, with header.quality.null for gaps.
+   */
+  async loadBinarySeries(locationId, parameter, year) {
+    const cacheKey = `binary_${locationId}_${parameter}_${year}`;
+    const cached = this.cache.get(cacheKey);
+    if (cached && this.isFresh(cached)) {
+      this.cacheStats.hits++;
+      return cached.data;
+    }
+
+    this.cacheStats.misses++;
+
+    const headerPath = (await this.loadLocationManifest(locationId))?.binary?.[parameter]?.[year];
+    if (!headerPath) {
+      throw new Error(`No binary series for location ${locationId}, parameter ${parameter}, year ${year}`);
+    }
+
+    const header = await (await this.fetchFile(headerPath)).json();
+
+    // The header carries the blob's sha256, so the blob is stored under it too
+    const blobPath = headerPath.slice(0, headerPath.lastIndexOf('/') + 1) + header.blob;
+    const blobResponse = await this.fetchFile(blobPath, header.sha256);
+
+    const data = WatershedDataManager.viewBinarySeries(header, await blobResponse.arrayBuffer());
+    this.cacheFile(cacheKey, headerPath, data);
+
+    return data;
+  }
+
+  /**
+   * View a binary series blob as typed arrays; the arrays share the buffer on little-endian platforms
+   */
+  static viewBinarySeries(header, buffer) {
+    const littleEndian = new Uint8Array(new Uint16Array([1]).buffer)[0] === 1;
+    const columns = {};
+
+    for (const [name, spec] of Object.entries(header.columns)) {
+      const int16 = spec.type === 'int16';
+      if (littleEndian) {
+        columns[name] = int16
+          ? new Int16Array(buffer, spec.offset, header.length)
+          : new Float32Array(buffer, spec.offset, header.length);
+      } else {
+        // Big-endian platforms copy through a DataView
+        const view = new DataView(buffer, spec.offset);
+        const values = int16 ? new Int16Array(header.length) : new Float32Array(header.length);
+        for (let i = 0; i < header.length; i++) {
+          values[i] = int16 ? view.getInt16(i * 2, true) : view.getFloat32(i * 4, true);
+        }
+        columns[name] = values;
+      }
+    }
+
+    return {
+      header,
+      columns,
+      quality: new Uint8Array(buffer, header.quality.offset, header.length)
+    };
+  }
+
+  /**
+   * Load the periods first..last (inclusive labels) of a series exported with --records, fetching
+   * only their fixed-width records with an HTTP Range request
+   * Returns {header, first, columns: {name: Float64Array}, quality: Uint8Array}, with NaN and
+   * header.quality.null marking gaps; first is the record index of the first period returned.
+   */
+  async loadRecordWindow(locationId, parameter, year, first, last = first) {
+    const headerPath = (await this.loadLocationManifest(locationId))?.records?.[parameter]?.[year];
+    if (!headerPath) {
+      throw new Error(`No records series for location ${locationId}, parameter ${parameter}, year ${year}`);
+    }
+
+    const cacheKey = `records_${locationId}_${parameter}_${year}`;
+    const cached = this.cache.get(cacheKey);
+    let header = cached && this.isFresh(cached) ? cached.data : null;
+    if (!header) {
+      header = await (await this.fetchFile(headerPath)).json();
+      this.cacheFile(cacheKey, headerPath, header);
+    }
+
+    const firstRecord = Math.max(WatershedDataManager.periodOffset(header.start, first, header.step), 0);
+    const lastRecord = Math.min(WatershedDataManager.periodOffset(header.start, last, header.step), header.length - 1);
+    const columns = Object.fromEntries(Object.keys(header.columns).map(name => [name, new Float64Array(0)]));
+    if (firstRecord > lastRecord) {
+      return { header, first: firstRecord, columns, quality: new Uint8Array(0) };
+    }
+
+    const firstByte = header.header_bytes + firstRecord * header.record_bytes;
+    const lastByte = header.header_bytes + (lastRecord + 1) * header.record_bytes - 1;
+    const recordsPath = headerPath.slice(0, headerPath.lastIndexOf('/') + 1) + header.records;
+    const response = await fetch(`${this.baseUrl}/${recordsPath}`, { headers: { Range: `bytes=${firstByte}-${lastByte}` } });
+    if (!response.ok) {
+      throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+    }
+
+    // A server that ignores Range answers 200 with the whole file
+    let buffer = await response.arrayBuffer();
+    if (response.status === 200) {
+      buffer = buffer.slice(firstByte, lastByte + 1);
+    }
+
+    const count = lastRecord - firstRecord + 1;
+    const view = new DataView(buffer);
+    const quality = new Uint8Array(count);
+    for (const [name, spec] of Object.entries(header.columns)) {
+      const values = new Float64Array(count);
+      for (let i = 0; i < count; i++) {
+        const position = i * header.record_bytes + spec.offset;
+        if (spec.type === 'int16') {
+          const raw = view.getInt16(position, true);
+          values[i] = raw === spec.null ? NaN : raw * spec.scale;
+        } else {
+          values[i] = view.getFloat32(position, true);
+        }
+      }
+      columns[name] = values;
+    }
+    for (let i = 0; i < count; i++) {
+      quality[i] = view.getUint8(i * header.record_bytes + header.quality.offset);
+    }
+
+    return { header, first: firstRecord, columns, quality };
+  }
+
+  /**
+   * Return the number of steps from a start period label to another label (the inverse of periodLabeler)
+   */
+  static periodOffset(start, label, step) {
+    if (step === 'P1M') {
+      const [startYear, startMonth] = start.split('-').map(Number);
+      const [year, month] = label.split('-').map(Number);
+      return (year * 12 + month) - (startYear * 12 + startMonth);
+    }
+    if (step === 'P1Y') {
+      return Number(label.slice(0, 4)) - Number(start.slice(0, 4));
+    }
+
+    const hourly = step === 'PT1H';
+    const parse = value => Date.parse(hourly ? `${value.slice(0, 13)}:00:00Z` : `${value.slice(0, 10)}T00:00:00Z`);
+    const stepMs = hourly ? 3600000 : 86400000 * (step === 'P1W' ? 7 : 1);
+    return Math.floor((parse(label) - parse(start)) / stepMs);
+  }
+
+  /**
+   * Expand a columnar file ({format: 'columnar', columns: {start, step, values, quality}})
+   * into the row-oriented {data: [{date, ...values, quality}]} shape; row files pass through
+   */
+  static expandColumnar(file) {
+    if (!file || file.format !== 'columnar') {
+      return file;
+    }
+
+    const { start, step, length, values, quality, quality_breakdown: breakdown } = file.columns;
+    const labels = file.columns.quality_labels || ['good', 'fair', 'poor'];
+    const key = step === 'P1D' ? 'date' : 'period';
+    const label = WatershedDataManager.periodLabeler(start, step);
+    const columns = Object.entries(values);
+
+    const data = [];
+    for (let i = 0; i < length; i++) {
+      const row = { [key]: null };
+      let present = false;
+      for (const [column, columnValues] of columns) {
+        if (columnValues[i] !== null) {
+          row[column] = columnValues[i];
+          present = true;
+        }
+      }
+      if (!present) {
+        continue;
+      }
+      row[key] = label(i);
+      if (quality[i] !== null) {
+        row.quality = labels[quality[i]];
+      }
+      if (breakdown && breakdown[i] !== null) {
+        row.quality_breakdown = breakdown[i];
+      }
+      data.push(row);
+    }
+
+    const { format, columns: _columns, ...rest } = file;
+    return { ...rest, data };
+  }
+
+  /**
+   * Return a function mapping a step offset from a columnar start label to its period label
+   */
+  static periodLabeler(start, step) {
+    if (step === 'P1M') {
+      const [year, month] = start.split('-').map(Number);
+      const first = year * 12 + month - 1;
+      return offset => {
+        const index = first + offset;
+        return `${String(Math.floor(index / 12)).padStart(4, '0')}-${String(index % 12 + 1).padStart(2, '0')}`;
+      };
+    }
+    if (step === 'P1Y') {
+      const first = Number(start.slice(0, 4));
+      return offset => String(first + offset).padStart(4, '0');
+    }
+
+    const hourly = step === 'PT1H';
+    const base = Date.parse(hourly ? `${start}:00Z` : `${start}T00:00:00Z`);
+    const stepMs = hourly ? 3600000 : 86400000 * (step === 'P1W' ? 7 : 1);
+    return offset => {
+      const iso = new Date(base + offset * stepMs).toISOString();
+      return hourly ? `${iso.slice(0, 13)}:00` : iso.slice(0, 10);
+    };
+  }
+
+  /**
+   * Load a location bundle written by bundle-location-data.py: the watershed summary and every
+   * parameter for one year, or for every year when year is omitted. Returns null when the
+   * manifest lists no such bundle.
+   */
+  async loadBundle(locationId, year = null) {
+    const bundlePath = (await this.loadLocationManifest(locationId))?.bundles?.[year || 'all'];
+    if (!bundlePath) {
+      return null;
+    }
+
+    const cacheKey = `bundle_${locationId}_${year || 'all'}`;
+    const cached = this.cache.get(cacheKey);
+    if (cached && this.isFresh(cached)) {
+      this.cacheStats.hits++;
+      return cached.data;
+    }
+
+    this.cacheStats.misses++;
+
+    const response = await this.fetchFile(bundlePath);
+    const data = await response.json();
+    this.cacheFile(cacheKey, bundlePath, data);
+
+    return data;
+  }
+
   /**
    * Load all available watershed data for a location
+   * Uses the location-year bundle (or the all-years bundle) when the manifest lists one, so a
+   * cold start is one request; otherwise loads each parameter file.
    */
   async loadAllWatershedData(locationId, year) {
     const parameters = ['temperature', 'flow', 'quality', 'watershed'];
     const results = {};
 
+    try {
+      const bundles = (await this.loadLocationManifest(locationId))?.bundles || {};
+      const yearBundle = year && bundles[year];
+      const bundlePath = yearBundle || bundles.all;
+      const bundle = bundlePath ? await this.loadBundle(locationId, yearBundle ? year : null) : null;
+
+      if (bundle) {
+        for (const parameter of parameters) {
+          const series = parameter === 'watershed'
+            ? bundle.watershed
+            : (yearBundle ? bundle.parameters[parameter] : bundle.parameters[parameter]?.[year]);
+          if (!series) {
+            // The bundle holds everything published for this location-year
+            results[parameter] = null;
+            continue;
+          }
+          results[parameter] = WatershedDataManager.expandColumnar(series);
+          // Later single-parameter loads are served from the bundle while it is unchanged
+          this.cacheFile(`watershed_${locationId}_${parameter}_${year || 'all'}`, bundlePath, results[parameter]);
+        }
+      }
+    } catch (error) {
+      console.warn(`Failed to load bundle for location ${locationId}, falling back to parameter files:`, error);
+    }
+
     for (const parameter of parameters) {
+      if (parameter in results) {
+        continue;
+      }
       try {
         results[parameter] = await this.loadWatershedData(locationId, parameter, year);
       } catch (error) {
@@ -210,11 +587,12 @@ class WatershedDataManager {
    * Get available locations with watershed data
    */
   getAvailableLocations() {
-    if (!this.manifest || !this.manifest.organized) {
+    const locations = this.manifest?.locations || this.manifest?.organized;
+    if (!locations) {
       return [];
     }
 
-    return Object.keys(this.manifest.organized).map(locationId => ({
+    return Object.keys(locations).map(locationId => ({
       id: locationId,
       name: this.getLocationName(locationId),
       parameters: this.getAvailableParameters(locationId),
@@ -227,7 +605,7 @@ class WatershedDataManager {
    */
   getLocationName(locationId) {
     // Try to get name from first available data file
-    const locationData = this.manifest.organized[locationId];
+    const locationData = this.manifest.organized?.[locationId];
     if (locationData && locationData.temperature) {
       const firstYear = Object.keys(locationData.temperature)[0];
       if (firstYear) {
@@ -243,7 +621,12 @@ class WatershedDataManager {
    * Get available parameters for a location
    */
   getAvailableParameters(locationId) {
-    const locationData = this.manifest.organized[locationId];
+    const summary = this.manifest.locations?.[locationId];
+    if (summary) {
+      return summary.parameters.filter(parameter => this.parameters[parameter]);
+    }
+
+    const locationData = this.manifest.organized?.[locationId];
     if (!locationData) {
       return [];
     }
@@ -261,7 +644,12 @@ class WatershedDataManager {
    * Get available years for a location
    */
   getAvailableYears(locationId) {
-    const locationData = this.manifest.organized[locationId];
+    const summary = this.manifest.locations?.[locationId];
+    if (summary) {
+      return summary.years;
+    }
+
+    const locationData = this.manifest.organized?.[locationId];
     if (!locationData) {
       return [];
     }
@@ -298,7 +686,10 @@ class WatershedDataManager {
    */
   clearCache() {
     this.cache.clear();
-    this.cacheStats = { hits: 0, misses: 0, sets: 0 };
+    this.cacheStats = { hits: 0, misses: 0, sets: 0, stored: 0 };
+    if (typeof caches !== 'undefined') {
+      caches.delete(this.fileStoreName).catch(() => {});
+    }
     console.log('🗑️ Watershed data cache cleared');
   }
 
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+AFCA Binary Series Format
+Encodes AFCA series files as one little-endian blob of typed arrays (Float32
+or scaled Int16 values, Uint8 quality codes) plus a small JSON header, so
+clients can view the columns without parsing rows
+"""
+
+import struct
+import hashlib
+
+import numpy as np
+
+from columnar import period_index, to_columnar, to_row_document
+
+BINARY_FORMAT = 'binary'
+BINARY_DIR = '08-binary'
+BLOB_SUFFIX = '.bin'
+HEADER_SUFFIX = '.bin.json'
+
+COLUMNS_LAYOUT = 'columns'
+RECORDS_LAYOUT = 'records'
+RECORD_SUFFIX = '.rec'
+RECORD_HEADER_SUFFIX = '.rec.json'
+
+# Fixed header of a records file: magic, version, record bytes, record count, step, start label
+RECORD_MAGIC = b'AFCR'
+RECORD_VERSION = 1
+RECORD_HEADER = struct.Struct('<4sHHI4s16s')
+
+INT16_NULL = -32768
+INT16_LIMIT = 32767
+QUALITY_NULL = 255
+
+# Most decimal places tried when looking for an exact Int16 scaling
+MAX_SCALE_DIGITS = 4
+
+# Rollup 'resolution' field -> columnar step
+ROLLUP_STEPS = {
+    'hourly': 'PT1H',
+    'weekly': 'P1W',
+    'monthly': 'P1M',
+    'season': 'P1Y'
+}
+
+def document_step(document):
+    """Return the columnar step of an AFCA document: its rollup resolution, or daily"""
+    return ROLLUP_STEPS.get(document.get('resolution'), 'P1D')
+
+def header_path(blob_path):
+    """Return the JSON header path for a .bin blob path"""
+    return f"{blob_path[:-len(BLOB_SUFFIX)]}{HEADER_SUFFIX}"
+
+def record_header_path(record_path):
+    """Return the JSON header path for a .rec records path"""
+    return f"{record_path[:-len(RECORD_SUFFIX)]}{RECORD_HEADER_SUFFIX}"
+
+def binary_header_path(path, suffix=HEADER_SUFFIX):
+    """Return the data/08-binary header path mirroring a data/ series file path"""
+    relative = path.split('data/', 1)[1]
+    return f"data/{BINARY_DIR}/{relative[:-len('.json')]}{suffix}"
+
+def _int16_digits(values):
+    """Return the decimal places that store every value exactly as Int16, or None when Float32 is needed"""
+    if len(values) == 0:
+        return 0
+    for digits in range(MAX_SCALE_DIGITS + 1):
+        scaled = values * 10 ** digits
+        rounded = np.round(scaled)
+        if np.abs(rounded).max() > INT16_LIMIT:
+            return None
+        if np.allclose(scaled, rounded, rtol=0, atol=1e-6):
+            return digits
+    return None
+
+def _encode_column(values, encoding):
+    """Return (spec, little-endian typed array) for one column of floats/None"""
+    array = np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+    present = ~np.isnan(array)
+
+    digits = _int16_digits(array[present]) if encoding in ('auto', 'int16') else None
+    if digits is None:
+        if encoding == 'int16':
+            raise ValueError("Values do not fit a scaled Int16 column")
+        return {'type': 'float32', 'null': 'NaN'}, array.astype('<f4')
+
+    encoded = np.full(len(array), INT16_NULL, dtype='<i2')
+    encoded[present] = np.round(array[present] * 10 ** digits)
+    return {'type': 'int16', 'scale': 10 ** -digits, 'null': INT16_NULL}, encoded
+
+def _quality_codes(block):
+    """Return a columnar block's quality codes as a Uint8 array, gaps as QUALITY_NULL"""
+    return np.array([QUALITY_NULL if code is None else code for code in block['quality']], dtype=np.uint8)
+
+def _series_header(document, block, step, layout):
+    """Return the JSON header fields shared by both layouts"""
+    header = {field: value for field, value in document.items() if field != 'data'}
+    header.update({
+        'format': BINARY_FORMAT,
+        'layout': layout,
+        'byte_order': 'little',
+        'start': block['start'],
+        'step': step,
+        'length': block['length']
+    })
+    return header
+
+def encode_document(document, encoding='auto'):
+    """Encode an AFCA series document (rows or columnar); returns (header, blob bytes)
+
+    encoding is 'float32', 'int16' (scaled, failing when a column does not
+    fit) or 'auto' (scaled Int16 where exact, else Float32). Each array
+    starts on a 4-byte boundary so it can be viewed in place.
+    """
+    document = to_row_document(document)
+    step = document_step(document)
+    block = to_columnar(document.get('data', []), step)
+
+    chunks = []
+    offset = 0
+    columns = {}
+    for column, values in block['values'].items():
+        spec, array = _encode_column(values, encoding)
+        data = array.tobytes()
+        columns[column] = {**spec, 'offset': offset}
+        chunks.append(data)
+        offset += len(data)
+        padding = -offset % 4
+        chunks.append(b'\0' * padding)
+        offset += padding
+
+    blob = b''.join(chunks) + _quality_codes(block).tobytes()
+    header = _series_header(document, block, step, COLUMNS_LAYOUT)
+    header.update({
+        'columns': columns,
+        'quality': {'type': 'uint8', 'offset': offset, 'labels': block['quality_labels'], 'null': QUALITY_NULL},
+        'bytes': len(blob),
+        'sha256': hashlib.sha256(blob).hexdigest()
+    })
+    return header, blob
+
+def decode_columns(header, blob):
+    """Return {column: float64 array with NaN for nulls} and the quality code array from a header and blob"""
+    length = header['length']
+    columns = {}
+    for column, spec in header['columns'].items():
+        if spec['type'] == 'int16':
+            raw = np.frombuffer(blob, dtype='<i2', count=length, offset=spec['offset'])
+            values = raw.astype(np.float64) * spec['scale']
+            values[raw == spec['null']] = np.nan
+        else:
+            values = np.frombuffer(blob, dtype='<f4', count=length, offset=spec['offset']).astype(np.float64)
+        columns[column] = values
+    quality = np.frombuffer(blob, dtype=np.uint8, count=length, offset=header['quality']['offset'])
+    return columns, quality
+
+def encode_records(document, encoding='auto'):
+    """Encode an AFCA series document as fixed-width records; returns (header, file bytes)
+
+    The file is a RECORD_HEADER followed by one record per step from the
+    start label, gaps included, so the byte offset of any period follows
+    from its label and a client can fetch a window with an HTTP Range
+    request. Each record holds every value column, then the Uint8 quality
+    code, packed without padding.
+    """
+    document = to_row_document(document)
+    step = document_step(document)
+    block = to_columnar(document.get('data', []), step)
+
+    fields = []
+    arrays = []
+    columns = {}
+    offset = 0
+    for column, values in block['values'].items():
+        spec, array = _encode_column(values, encoding)
+        columns[column] = {**spec, 'offset': offset}
+        fields.append((f"c{len(fields)}", array.dtype.str))
+        arrays.append(array)
+        offset += array.itemsize
+
+    quality = {'type': 'uint8', 'offset': offset, 'labels': block['quality_labels'], 'null': QUALITY_NULL}
+    fields.append(('quality', 'u1'))
+    arrays.append(_quality_codes(block))
+
+    records = np.empty(block['length'], dtype=np.dtype(fields))
+    for (field, _), array in zip(fields, arrays):
+        records[field] = array
+
+    record_bytes = records.dtype.itemsize
+    fixed = RECORD_HEADER.pack(RECORD_MAGIC, RECORD_VERSION, record_bytes, block['length'],
+                               step.encode('ascii'), (block['start'] or '').encode('ascii'))
+    data = fixed + records.tobytes()
+
+    header = _series_header(document, block, step, RECORDS_LAYOUT)
+    header.update({
+        'header_bytes': RECORD_HEADER.size,
+        'record_bytes': record_bytes,
+        'columns': columns,
+        'quality': quality,
+        'bytes': len(data),
+        'sha256': hashlib.sha256(data).hexdigest()
+    })
+    return header, data
+
+def read_record_header(data):
+    """Return {record_bytes, length, step, start} from the fixed header at the front of a records file"""
+    magic, version, record_bytes, length, step, start = RECORD_HEADER.unpack_from(data)
+    if magic != RECORD_MAGIC or version != RECORD_VERSION:
+        raise ValueError("Not an AFCA records file")
+    return {
+        'record_bytes': record_bytes,
+        'length': length,
+        'step': step.rstrip(b'\0').decode('ascii'),
+        'start': start.rstrip(b'\0').decode('ascii') or None
+    }
+
+def record_range(header, first, last=None):
+    """Return (first record, first byte, last byte) covering the periods first..last, or None outside the series
+
+    The byte positions are inclusive, as in an HTTP Range header. The window
+    is clipped to the series.
+    """
+    if header['start'] is None:
+        return None
+    base = period_index(header['start'], header['step'])
+    first_record = max(period_index(first, header['step']) - base, 0)
+    last_record = min(period_index(last or first, header['step']) - base, header['length'] - 1)
+    if first_record > last_record:
+        return None
+
+    first_byte = header['header_bytes'] + first_record * header['record_bytes']
+    last_byte = header['header_bytes'] + (last_record + 1) * header['record_bytes'] - 1
+    return first_record, first_byte, last_byte
+
+def decode_records(header, data):
+    """Return {column: float64 array with NaN for nulls} and the quality code array from whole records"""
+    fields = [(f"c{index}", '<i2' if spec['type'] == 'int16' else '<f4')
+              for index, spec in enumerate(header['columns'].values())]
+    records = np.frombuffer(data, dtype=np.dtype(fields + [('quality', 'u1')]),
+                            count=len(data) // header['record_bytes'])
+
+    columns = {}
+    for (field, _), (column, spec) in zip(fields, header['columns'].items()):
+        values = records[field].astype(np.float64)
+        if spec['type'] == 'int16':
+            values[records[field] == spec['null']] = np.nan
+            values *= spec['scale']
+        columns[column] = values
+    return columns, records['quality'].copy()
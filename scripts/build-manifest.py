@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+AFCA Manifest Build Script
+Re-indexes every data file into manifest.json, and switches the index
+between one monolithic manifest and a root manifest with per-location shards
+"""
+
+import argparse
+
+from manifest_builder import ManifestBuilder, SHARD_DIR
+
+def get_working_directory():
+    """Return the working directory for local storage"""
+    return "."
+
+def main():
+    """Main manifest build function"""
+    parser = argparse.ArgumentParser(description="Rebuild manifest.json from the files under data/")
+    layout = parser.add_mutually_exclusive_group()
+    layout.add_argument('--shards', dest='shards', action='store_const', const=True,
+                        help=f"Write a small root manifest plus one {SHARD_DIR}/location-<id>.json shard per location")
+    layout.add_argument('--no-shards', dest='shards', action='store_const', const=False,
+                        help="Write the whole index into manifest.json")
+    args = parser.parse_args()
+
+    print("AFCA Manifest Build")
+    print("===================")
+
+    builder = ManifestBuilder(get_working_directory(), shards=args.shards)
+    builder.rebuild()
+    layout = "sharded" if builder.shards else "monolithic"
+    if builder.save():
+        print(f"Updated manifest.json ({layout}) with {builder.describe()}")
+    else:
+        print(f"manifest.json ({layout}) unchanged: {builder.describe()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+AFCA Build Cache
+On-disk record of the content hash of each raw input and of the output files it
+produced, so reruns only reprocess inputs that changed or whose outputs were
+rewritten by something else
+"""
+
+import os
+import json
+import hashlib
+
+CACHE_VERSION = 2
+HASH_BLOCK_SIZE = 1 << 20
+
+def file_hash(path):
+    """Return the sha256 hex digest of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class BuildCache:
+    """Content hashes of inputs and their outputs, invalidated wholesale when the build settings change"""
+
+    def __init__(self, cache_file, settings=None, rebuild=False):
+        self.cache_file = cache_file
+        self.settings = dict(settings or {}, version=CACHE_VERSION)
+        self.rebuild = rebuild
+        self.cache = self.load()
+        self.hashes = {}
+
+    def load(self):
+        """Load the cache file; a missing file, a forced rebuild or different settings start empty"""
+        empty = {"settings": self.settings, "inputs": {}}
+        if self.rebuild or not os.path.exists(self.cache_file):
+            return empty
+
+        try:
+            with open(self.cache_file, 'r') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return empty
+
+        if cache.get("settings") != self.settings:
+            return empty
+        return cache
+
+    def save(self):
+        """Write the cache file"""
+        os.makedirs(os.path.dirname(self.cache_file) or '.', exist_ok=True)
+        with open(self.cache_file, 'w') as f:
+            json.dump(self.cache, f, indent=2, sort_keys=True)
+
+    def entry(self, path):
+        """Return the cached entry for an input, or an empty dict"""
+        return self.cache["inputs"].get(os.path.basename(path), {})
+
+    def hash(self, path):
+        """Return an input's content hash, reusing the cached hash while its size and mtime are unchanged"""
+        if path in self.hashes:
+            return self.hashes[path]
+
+        stat = os.stat(path)
+        entry = self.entry(path)
+        if entry.get('size') == stat.st_size and entry.get('mtime_ns') == stat.st_mtime_ns:
+            digest = entry['sha256']
+        else:
+            digest = file_hash(path)
+        self.hashes[path] = digest
+        return digest
+
+    def is_changed(self, path):
+        """Return True when an input is new, its contents changed or one of its outputs is missing or differs"""
+        entry = self.entry(path)
+        if not entry or entry.get('sha256') != self.hash(path):
+            return True
+        return not all(os.path.exists(output) and file_hash(output) == digest
+                       for output, digest in entry.get('outputs', {}).items())
+
+    def changed(self, paths):
+        """Return the inputs among paths that need reprocessing"""
+        return [path for path in paths if self.is_changed(path)]
+
+    def removed(self, paths):
+        """Return the names of cached inputs no longer among paths"""
+        names = {os.path.basename(path) for path in paths}
+        return sorted(name for name in self.cache["inputs"] if name not in names)
+
+    def outputs(self, name):
+        """Return the output files last produced by an input"""
+        return sorted(self.cache["inputs"].get(os.path.basename(name), {}).get('outputs', {}))
+
+    def dependents(self, paths, outputs):
+        """Return the inputs among paths that last produced any of the given output files"""
+        outputs = set(outputs)
+        return [path for path in paths if outputs.intersection(self.outputs(path))]
+
+    def record(self, path, outputs):
+        """Store an input's current hash and the output files it produced, with their current hashes"""
+        stat = os.stat(path)
+        self.cache["inputs"][os.path.basename(path)] = {
+            'sha256': self.hash(path),
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'outputs': {output: file_hash(output) for output in sorted(set(outputs))}
+        }
+
+    def forget(self, name):
+        """Drop an input that no longer exists"""
+        self.cache["inputs"].pop(os.path.basename(name), None)
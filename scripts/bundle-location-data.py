@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+AFCA Location Bundle Script
+Writes one pre-joined bundle per location-year (and optionally per location
+with every year) under data/09-bundles, so the app's cold start is a single
+request instead of one per parameter
+"""
+
+import os
+import json
+import argparse
+
+from columnar import is_columnar_file
+from json_writer import write_json_if_changed
+from location_bundles import build_bundle, bundle_path, ALL_YEARS, BUNDLE_DIR, PARAMETER_DIRS
+from manifest_builder import ManifestBuilder
+
+def get_working_directory():
+    """Return the working directory for local storage"""
+    return "."
+
+class LocationBundler:
+    def __init__(self, all_years=False, columnar=False):
+        self.base_dir = get_working_directory()
+        self.data_dir = f"{self.base_dir}/data"
+        self.bundle_dir = f"{self.data_dir}/{BUNDLE_DIR}"
+        self.all_years = all_years
+        self.columnar = columnar
+        self.touched_outputs = set()
+
+    def load_series(self):
+        """Return {location_id: {parameter: {year: series document}}} from the daily series directories"""
+        locations = {}
+        for parameter, series_dir in PARAMETER_DIRS.items():
+            source_dir = f"{self.data_dir}/{series_dir}"
+            if not os.path.exists(source_dir):
+                continue
+
+            for filename in sorted(os.listdir(source_dir)):
+                if not filename.endswith('.json') or is_columnar_file(filename):
+                    continue
+                parts = filename[:-len('.json')].split('-')
+                if len(parts) != 3 or parts[0] != 'location':
+                    continue
+
+                with open(f"{source_dir}/{filename}", 'r') as f:
+                    locations.setdefault(parts[1], {}).setdefault(parameter, {})[parts[2]] = json.load(f)
+        return locations
+
+    def load_watershed(self, location_id):
+        """Return a location's watershed document, or None when it has none"""
+        watershed_file = f"{self.data_dir}/02-watersheds/location-{location_id}.json"
+        if not os.path.exists(watershed_file):
+            return None
+        with open(watershed_file, 'r') as f:
+            return json.load(f)
+
+    def bundle_all(self):
+        """Write every bundle and remove stale ones; returns the number of bundles written or changed"""
+        written = 0
+        bundled = set()
+        for location_id, series in sorted(self.load_series().items()):
+            watershed = self.load_watershed(location_id)
+            years = sorted({year for documents in series.values() for year in documents})
+            if self.all_years:
+                years.append(ALL_YEARS)
+
+            for year in years:
+                path = bundle_path(location_id, year)
+                bundle = build_bundle(location_id, series, watershed, year, self.columnar)
+                written += write_json_if_changed(f"{self.base_dir}/{path}", bundle, indent=None)
+                bundled.add(os.path.basename(path))
+                self.touched_outputs.add(path)
+
+        # Bundles for location-years that no longer have data, or all-years bundles no longer asked for
+        if os.path.exists(self.bundle_dir):
+            for filename in sorted(os.listdir(self.bundle_dir)):
+                if filename.endswith('.json') and filename not in bundled:
+                    os.remove(f"{self.bundle_dir}/{filename}")
+                    self.touched_outputs.add(f"data/{BUNDLE_DIR}/{filename}")
+                    print(f"  Removed stale bundle {filename}")
+
+        print(f"Bundled {len(bundled)} files ({written} changed) in data/{BUNDLE_DIR}")
+        return written
+
+    def update_manifest(self):
+        """List each location's bundles in manifest.json"""
+        if not os.path.exists(f"{self.base_dir}/manifest.json"):
+            return
+
+        builder = ManifestBuilder(self.base_dir)
+        builder.update(self.touched_outputs)
+        if builder.save():
+            print("Updated manifest.json with location bundles")
+
+def main():
+    """Main bundle function"""
+    parser = argparse.ArgumentParser(description="Write per-location bundles of the watershed summary and every parameter")
+    parser.add_argument('--all-years', action='store_true',
+                        help="Also write location-<id>.json bundles holding every year of a location")
+    parser.add_argument('--columnar', action='store_true',
+                        help="Embed series as columnar blocks instead of rows")
+    args = parser.parse_args()
+
+    print("AFCA Location Bundles")
+    print("=====================")
+
+    bundler = LocationBundler(all_years=args.all_years, columnar=args.columnar)
+    bundler.bundle_all()
+    bundler.update_manifest()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+AFCA Columnar Series Format
+Conversion between row-oriented data ([{date, value, ..., quality}]) and the
+columnar variant: a start period, an ISO 8601 step and parallel value and
+quality arrays with explicit nulls for gaps
+"""
+
+from datetime import date, datetime, timedelta
+
+COLUMNAR_FORMAT = 'columnar'
+COLUMNAR_SUFFIX = '.columnar.json'
+
+# Steps of each resolution, as ISO 8601 durations
+RESOLUTION_STEPS = {
+    'hour': 'PT1H',
+    'day': 'P1D',
+    'week': 'P1W',
+    'month': 'P1M',
+    'season': 'P1Y'
+}
+
+DEFAULT_QUALITY_LABELS = ('good', 'fair', 'poor')
+
+def columnar_path(path):
+    """Return the columnar file path next to a row-oriented .json file"""
+    return f"{path[:-len('.json')]}{COLUMNAR_SUFFIX}" if path.endswith('.json') else f"{path}{COLUMNAR_SUFFIX}"
+
+def is_columnar_file(filename):
+    """Return True for columnar variant files"""
+    return filename.endswith(COLUMNAR_SUFFIX)
+
+def period_key(step):
+    """Return the row key holding the period label: 'date' for daily series, 'period' for the rest"""
+    return 'date' if step == 'P1D' else 'period'
+
+def period_index(label, step):
+    """Return the integer index of a period label for a step"""
+    if step == 'PT1H':
+        moment = datetime.fromisoformat(label)
+        return moment.toordinal() * 24 + moment.hour
+    if step in ('P1D', 'P1W'):
+        days = date.fromisoformat(label).toordinal()
+        # Ordinal 1 (0001-01-01) is a Monday, so weeks run Monday through Sunday
+        return days if step == 'P1D' else (days - 1) // 7
+    if step == 'P1M':
+        year, month = label.split('-')[:2]
+        return int(year) * 12 + int(month) - 1
+    if step == 'P1Y':
+        return int(label[:4])
+    raise ValueError(f"Unknown columnar step: {step}")
+
+def period_label(start, offset, step):
+    """Return the label of the period offset steps after the start label"""
+    if step == 'PT1H':
+        return (datetime.fromisoformat(start) + timedelta(hours=offset)).strftime('%Y-%m-%dT%H:00')
+    if step in ('P1D', 'P1W'):
+        return (date.fromisoformat(start) + timedelta(days=offset * (7 if step == 'P1W' else 1))).isoformat()
+    if step == 'P1M':
+        month = period_index(start, step) + offset
+        return f"{month // 12:04d}-{month % 12 + 1:02d}"
+    if step == 'P1Y':
+        return f"{int(start[:4]) + offset:04d}"
+    raise ValueError(f"Unknown columnar step: {step}")
+
+def to_columnar(records, step='P1D', quality_labels=DEFAULT_QUALITY_LABELS):
+    """Convert sorted row records to a columnar block
+
+    Returns {start, step, length, values: {column: [...]}, quality_labels,
+    quality: [label index], quality_breakdown?} where every array has one
+    entry per period from start to the last record, and periods without a
+    record hold null.
+    """
+    key = period_key(step)
+    if not records:
+        return {'start': None, 'step': step, 'length': 0, 'values': {}, 'quality_labels': list(quality_labels), 'quality': []}
+
+    start = records[0][key]
+    first = period_index(start, step)
+    positions = [period_index(record[key], step) - first for record in records]
+    length = positions[-1] + 1
+
+    labels = list(quality_labels)
+    values = {}
+    quality = [None] * length
+    breakdown = None
+    for position, record in zip(positions, records):
+        for column, value in record.items():
+            if column in (key, 'quality', 'quality_breakdown'):
+                continue
+            if column not in values:
+                values[column] = [None] * length
+            values[column][position] = value
+        if record.get('quality') is not None:
+            if record['quality'] not in labels:
+                labels.append(record['quality'])
+            quality[position] = labels.index(record['quality'])
+        if 'quality_breakdown' in record:
+            if breakdown is None:
+                breakdown = [None] * length
+            breakdown[position] = record['quality_breakdown']
+
+    block = {'start': start, 'step': step, 'length': length, 'values': values, 'quality_labels': labels, 'quality': quality}
+    if breakdown is not None:
+        block['quality_breakdown'] = breakdown
+    return block
+
+def to_rows(block):
+    """Expand a columnar block back into row records, skipping gap periods"""
+    step = block['step']
+    key = period_key(step)
+    labels = block.get('quality_labels', DEFAULT_QUALITY_LABELS)
+    values = block.get('values', {})
+    quality = block.get('quality', [])
+    breakdown = block.get('quality_breakdown')
+
+    records = []
+    for position in range(block.get('length', 0)):
+        row = {column: column_values[position] for column, column_values in values.items()
+               if column_values[position] is not None}
+        if not row:
+            continue
+        record = {key: period_label(block['start'], position, step), **row}
+        if quality[position] is not None:
+            record['quality'] = labels[quality[position]]
+        if breakdown is not None and breakdown[position] is not None:
+            record['quality_breakdown'] = breakdown[position]
+        records.append(record)
+    return records
+
+def columnar_errors(block):
+    """Return a list of structural problems with a columnar block (empty when valid)"""
+    errors = []
+    for field in ('start', 'step', 'length', 'values', 'quality'):
+        if field not in block:
+            errors.append(f"Missing columnar field: {field}")
+    if errors:
+        return errors
+
+    if block['step'] not in RESOLUTION_STEPS.values():
+        errors.append(f"Unknown columnar step: {block['step']}")
+    length = block['length']
+    for column, column_values in block['values'].items():
+        if len(column_values) != length:
+            errors.append(f"Column {column} has {len(column_values)} values, expected {length}")
+    if len(block['quality']) != length:
+        errors.append(f"quality has {len(block['quality'])} values, expected {length}")
+    if 'quality_breakdown' in block and len(block['quality_breakdown']) != length:
+        errors.append(f"quality_breakdown has {len(block['quality_breakdown'])} values, expected {length}")
+    return errors
+
+def to_columnar_document(document, step='P1D'):
+    """Return a copy of a row-oriented AFCA document with its data in columnar form"""
+    columnar = {}
+    for field, value in document.items():
+        if field == 'data':
+            columnar['format'] = COLUMNAR_FORMAT
+            columnar['columns'] = to_columnar(value, step)
+        else:
+            columnar[field] = value
+    return columnar
+
+def to_row_document(document):
+    """Return a row-oriented copy of an AFCA document, expanding a columnar one"""
+    if document.get('format') != COLUMNAR_FORMAT:
+        return document
+    rows = {}
+    for field, value in document.items():
+        if field == 'columns':
+            rows['data'] = to_rows(value)
+        elif field != 'format':
+            rows[field] = value
+    return rows
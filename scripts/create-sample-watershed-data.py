@@ -10,6 +10,9 @@ import random
 from datetime import datetime, timedelta
 from pathlib import Path
 
+from json_writer import write_json_if_changed
+from manifest_builder import ManifestBuilder
+
 def get_working_directory():
     """Return the working directory for local storage"""
     return "."
@@ -72,8 +75,7 @@ def create_sample_temperature_data():
             }
             
             output_file = f"{base_dir}/data/03-temperature/location-{location['id']}-{year}.json"
-            with open(output_file, "w") as f:
-                json.dump(temp_data, f, indent=2)
+            write_json_if_changed(output_file, temp_data)
             
             print(f"  Created temperature data: {location['name']} {year} ({len(daily_data)} days)")
 
@@ -136,8 +138,7 @@ def create_sample_flow_data():
             }
             
             output_file = f"{base_dir}/data/05-flow/location-{location['id']}-{year}.json"
-            with open(output_file, "w") as f:
-                json.dump(flow_data, f, indent=2)
+            write_json_if_changed(output_file, flow_data)
             
             print(f"  Created flow data: {location['name']} {year} ({len(daily_data)} days)")
 
@@ -192,8 +193,7 @@ def create_sample_water_quality_data():
             }
             
             output_file = f"{base_dir}/data/04-quality/location-{location['id']}-{year}.json"
-            with open(output_file, "w") as f:
-                json.dump(quality_data, f, indent=2)
+            write_json_if_changed(output_file, quality_data)
             
             print(f"  Created water quality data: {location['name']} {year} ({len(weekly_data)} weeks)")
 
@@ -278,74 +278,19 @@ def create_sample_watershed_boundaries():
         }
         
         output_file = f"{base_dir}/data/02-watersheds/location-{location['id']}.json"
-        with open(output_file, "w") as f:
-            json.dump(watershed_data, f, indent=2)
+        write_json_if_changed(output_file, watershed_data)
         
         print(f"  Created watershed boundary: {location['name']}")
 
 def update_manifest_with_sample_data():
-    """Update manifest.json with sample data statistics"""
+    """Re-index manifest.json over the sample data files"""
     print("Updating manifest with sample data...")
     
-    base_dir = get_working_directory()
-    manifest_path = f"{base_dir}/manifest.json"
-    
-    with open(manifest_path, "r") as f:
-        manifest = json.load(f)
-    
-    # Count files in each directory
-    total_files = 0
-    locations_covered = set()
-    years_covered = set()
-    
-    for data_dir in ["02-watersheds", "03-temperature", "04-quality", "05-flow"]:
-        data_path = f"{base_dir}/data/{data_dir}"
-        if os.path.exists(data_path):
-            files = [f for f in os.listdir(data_path) if f.endswith('.json')]
-            total_files += len(files)
-            
-            # Extract location IDs and years from filenames
-            for filename in files:
-                if "location-" in filename:
-                    parts = filename.replace(".json", "").split("-")
-                    if len(parts) >= 2:
-                        try:
-                            location_id = int(parts[1])
-                            locations_covered.add(location_id)
-                            
-                            if len(parts) >= 3:
-                                year = int(parts[2])
-                                years_covered.add(year)
-                        except ValueError:
-                            continue
-    
-    # Update manifest statistics
-    manifest["statistics"]["total_files"] = total_files
-    manifest["statistics"]["locations_covered"] = len(locations_covered)
-    manifest["statistics"]["years_covered"] = sorted(list(years_covered))
-    manifest["last_updated"] = datetime.now().isoformat()
-    
-    # Create organized structure
-    organized = {}
-    for location_id in locations_covered:
-        organized[str(location_id)] = {
-            "watershed": f"data/02-watersheds/location-{location_id}.json",
-            "temperature": {},
-            "flow": {},
-            "quality": {}
-        }
-        
-        for year in years_covered:
-            organized[str(location_id)]["temperature"][str(year)] = f"data/03-temperature/location-{location_id}-{year}.json"
-            organized[str(location_id)]["flow"][str(year)] = f"data/05-flow/location-{location_id}-{year}.json"
-            organized[str(location_id)]["quality"][str(year)] = f"data/04-quality/location-{location_id}-{year}.json"
-    
-    manifest["organized"] = organized
-    
-    with open(manifest_path, "w") as f:
-        json.dump(manifest, f, indent=2)
+    builder = ManifestBuilder(get_working_directory())
+    builder.rebuild()
+    builder.save()
     
-    print(f"  Updated manifest.json with {total_files} files, {len(locations_covered)} locations, {len(years_covered)} years")
+    print(f"  Updated manifest.json with {builder.describe()}")
 
 def main():
     """Main sample data creation function"""
@@ -5,24 +5,77 @@ Downloads real-time and historical data from USGS stream gauges
 """
 
 import os
+import re
 import json
-import requests
+import copy
+import shutil
+import argparse
+import threading
 from datetime import datetime, timedelta
 from pathlib import Path
+from urllib.parse import urlencode
+
+from nwis_client import NWISClient, RequestScheduler
+from station_metadata_cache import StationMetadataCache
+from station_registry import get_registry
+from raw_archive import (COMPRESSION_SUFFIXES, raw_path, find_raw_file, is_raw_file,
+                         load_raw_json, dump_raw_json)
 
 def get_working_directory():
     """Return the working directory for local storage"""
     return "."
 
+# Rough size of one serialized NWIS value and values per site/parameter/day,
+# used to keep multi-site responses under the batch size limit
+ESTIMATED_BYTES_PER_VALUE = 80
+VALUES_PER_DAY = {'iv': 96, 'dv': 1}
+
+STREAM_PARAMETERS = ['00060', '00010', '00065']  # Flow, Temperature, Stage
+
+WATER_QUALITY_PARAMETERS = [
+    '00010',  # Temperature
+    '00095',  # Specific conductance
+    '00094',  # Dissolved oxygen
+    '00076',  # Turbidity
+    '00400',  # pH
+    '00403',  # pH, field
+    '00405',  # pH, lab
+]
+
+# Raw file kind -> (NWIS service, parameter codes)
+DOWNLOAD_KINDS = {
+    'instantaneous': ('iv', STREAM_PARAMETERS),
+    'daily': ('dv', STREAM_PARAMETERS),
+    'water_quality': ('iv', WATER_QUALITY_PARAMETERS)
+}
+
+# Backfill chunk sizes in months
+CHUNK_MONTHS = {'month': 1, 'quarter': 3}
+
+RAW_FILE_PATTERN = re.compile(r'^usgs_(instantaneous|daily|water_quality)_(\d+)')
+
 class USGSDataDownloader:
-    def __init__(self):
+    def __init__(self, max_in_flight=1, scheduler_options=None, compression='gzip',
+                 metadata_ttl_days=30, refresh_metadata=False):
         self.base_url = "https://waterservices.usgs.gov/nwis"
         self.base_dir = get_working_directory()
         self.raw_data_dir = f"{self.base_dir}/raw-data"
+        self.compression = compression
+        self.watermarks_file = f"{self.raw_data_dir}/download_watermarks.json"
+        self.failed_requests_file = f"{self.raw_data_dir}/failed_requests.json"
+        self.client = NWISClient(max_in_flight=max_in_flight)
+        self.scheduler = RequestScheduler(self.client, **(scheduler_options or {}))
+        self.metadata_cache = StationMetadataCache(ttl_days=metadata_ttl_days, refresh=refresh_metadata)
+        self.store_lock = threading.Lock()
+        self.failed_requests = []
         os.makedirs(self.raw_data_dir, exist_ok=True)
         
     def get_station_info(self, station_id):
-        """Get station information from USGS"""
+        """Get station information, from the metadata cache when it is fresh"""
+        return self.metadata_cache.lookup(station_id, 'site_info', lambda: self.fetch_station_info(station_id))
+    
+    def fetch_station_info(self, station_id):
+        """Fetch station information from USGS"""
         url = f"{self.base_url}/site"
         params = {
             'format': 'json',
@@ -31,7 +84,7 @@ class USGSDataDownloader:
         }
         
         try:
-            response = requests.get(url, params=params, timeout=30)
+            response = self.scheduler.get(url, params=params, timeout=30)
             response.raise_for_status()
             data = response.json()
             
@@ -46,7 +99,7 @@ class USGSDataDownloader:
     def download_instantaneous_data(self, station_id, start_date, end_date, parameters=None):
         """Download instantaneous (15-minute) data from USGS"""
         if parameters is None:
-            parameters = ['00060', '00010', '00065']  # Flow, Temperature, Stage
+            parameters = STREAM_PARAMETERS
         
         url = f"{self.base_url}/iv"
         params = {
@@ -60,26 +113,23 @@ class USGSDataDownloader:
         
         try:
             print(f"Downloading instantaneous data for station {station_id}...")
-            response = requests.get(url, params=params, timeout=60)
+            # Stream the raw response straight into the compressed archive
+            raw_file = raw_path(f"{self.raw_data_dir}/usgs_instantaneous_{station_id}_{start_date}_{end_date}", self.compression)
+            response = self.scheduler.get(url, params=params, timeout=60, stream_to=raw_file)
             response.raise_for_status()
-            data = response.json()
-            
-            # Save raw data
-            raw_file = f"{self.raw_data_dir}/usgs_instantaneous_{station_id}_{start_date}_{end_date}.json"
-            with open(raw_file, 'w') as f:
-                json.dump(data, f, indent=2)
             
             print(f"  Saved raw data: {raw_file}")
-            return data
+            return raw_file
             
         except Exception as e:
             print(f"  Error downloading instantaneous data: {e}")
+            self.record_failure('download_instantaneous_data', [station_id, start_date, end_date, parameters], e)
             return None
     
     def download_daily_data(self, station_id, start_date, end_date, parameters=None):
         """Download daily data from USGS"""
         if parameters is None:
-            parameters = ['00060', '00010', '00065']  # Flow, Temperature, Stage
+            parameters = STREAM_PARAMETERS
         
         url = f"{self.base_url}/dv"
         params = {
@@ -93,34 +143,23 @@ class USGSDataDownloader:
         
         try:
             print(f"Downloading daily data for station {station_id}...")
-            response = requests.get(url, params=params, timeout=60)
+            # Stream the raw response straight into the compressed archive
+            raw_file = raw_path(f"{self.raw_data_dir}/usgs_daily_{station_id}_{start_date}_{end_date}", self.compression)
+            response = self.scheduler.get(url, params=params, timeout=60, stream_to=raw_file)
             response.raise_for_status()
-            data = response.json()
-            
-            # Save raw data
-            raw_file = f"{self.raw_data_dir}/usgs_daily_{station_id}_{start_date}_{end_date}.json"
-            with open(raw_file, 'w') as f:
-                json.dump(data, f, indent=2)
             
             print(f"  Saved raw data: {raw_file}")
-            return data
+            return raw_file
             
         except Exception as e:
             print(f"  Error downloading daily data: {e}")
+            self.record_failure('download_daily_data', [station_id, start_date, end_date, parameters], e)
             return None
     
     def download_water_quality_data(self, station_id, start_date, end_date):
         """Download water quality data from USGS"""
         # Common water quality parameters
-        parameters = [
-            '00010',  # Temperature
-            '00095',  # Specific conductance
-            '00094',  # Dissolved oxygen
-            '00076',  # Turbidity
-            '00400',  # pH
-            '00403',  # pH, field
-            '00405',  # pH, lab
-        ]
+        parameters = WATER_QUALITY_PARAMETERS
         
         url = f"{self.base_url}/iv"
         params = {
@@ -134,24 +173,389 @@ class USGSDataDownloader:
         
         try:
             print(f"Downloading water quality data for station {station_id}...")
-            response = requests.get(url, params=params, timeout=60)
+            # Stream the raw response straight into the compressed archive
+            raw_file = raw_path(f"{self.raw_data_dir}/usgs_water_quality_{station_id}_{start_date}_{end_date}", self.compression)
+            response = self.scheduler.get(url, params=params, timeout=60, stream_to=raw_file)
             response.raise_for_status()
-            data = response.json()
-            
-            # Save raw data
-            raw_file = f"{self.raw_data_dir}/usgs_water_quality_{station_id}_{start_date}_{end_date}.json"
-            with open(raw_file, 'w') as f:
-                json.dump(data, f, indent=2)
             
             print(f"  Saved raw data: {raw_file}")
-            return data
+            return raw_file
             
         except Exception as e:
             print(f"  Error downloading water quality data: {e}")
+            self.record_failure('download_water_quality_data', [station_id, start_date, end_date], e)
+            return None
+    
+    def record_failure(self, method, args, error):
+        """Remember a failed download so it can be replayed without re-running the whole job"""
+        with self.store_lock:
+            self.failed_requests.append({
+                'method': method,
+                'args': args,
+                'error': str(error),
+                'failed_at': datetime.now().isoformat()
+            })
+    
+    def save_failed_requests(self):
+        """Write the failed-request manifest, or remove it when every request succeeded"""
+        if self.failed_requests:
+            with open(self.failed_requests_file, 'w') as f:
+                json.dump(self.failed_requests, f, indent=2)
+            print(f"\n{len(self.failed_requests)} failed requests saved for replay: {self.failed_requests_file}")
+        elif os.path.exists(self.failed_requests_file):
+            os.remove(self.failed_requests_file)
+    
+    def replay_failed_requests(self):
+        """Re-run the downloads recorded in the failed-request manifest"""
+        if not os.path.exists(self.failed_requests_file):
+            print("No failed requests to replay")
+            return
+        
+        with open(self.failed_requests_file, 'r') as f:
+            failed = json.load(f)
+        
+        print(f"Replaying {len(failed)} failed requests...")
+        tasks = [(getattr(self, entry['method']), tuple(entry['args'])) for entry in failed]
+        self.client.run_tasks(tasks)
+    
+    def plan_site_batches(self, service, station_ids, start_date, end_date, parameters,
+                          max_url_length=2000, max_batch_bytes=50_000_000):
+        """Group stations into multi-site requests bounded by URL length and estimated response size"""
+        days = (datetime.strptime(end_date, '%Y-%m-%d') - datetime.strptime(start_date, '%Y-%m-%d')).days + 1
+        site_bytes = days * VALUES_PER_DAY[service] * len(parameters) * ESTIMATED_BYTES_PER_VALUE
+        
+        batches = []
+        batch = []
+        for station_id in station_ids:
+            candidate = batch + [station_id]
+            params = {
+                'format': 'json',
+                'sites': ','.join(candidate),
+                'startDT': start_date,
+                'endDT': end_date,
+                'parameterCd': ','.join(parameters),
+                'siteStatus': 'all'
+            }
+            url_length = len(f"{self.base_url}/{service}?{urlencode(params)}")
+            
+            if batch and (url_length > max_url_length or site_bytes * len(candidate) > max_batch_bytes):
+                batches.append(batch)
+                batch = [station_id]
+            else:
+                batch = candidate
+        
+        if batch:
+            batches.append(batch)
+        
+        return batches
+    
+    def split_time_series_by_site(self, data, station_ids):
+        """Split a multi-site NWIS response into one single-site document per station that has series
+        
+        Stations the response holds no series for are left out, so no empty
+        raw file is written for them.
+        """
+        series_by_site = {station_id: [] for station_id in station_ids}
+        for series in data.get('value', {}).get('timeSeries', []):
+            site_code = series['sourceInfo']['siteCode'][0]['value']
+            series_by_site.setdefault(site_code, []).append(series)
+        
+        documents = {}
+        for station_id, site_series in series_by_site.items():
+            if not site_series:
+                continue
+            document = copy.copy(data)
+            document['value'] = dict(data.get('value', {}))
+            document['value']['timeSeries'] = site_series
+            documents[station_id] = document
+        
+        return documents
+    
+    def fetch_time_series(self, service, station_ids, start_date, end_date, parameters, timeout=60):
+        """Request an NWIS time series document for one or more stations"""
+        url = f"{self.base_url}/{service}"
+        params = {
+            'format': 'json',
+            'sites': ','.join(station_ids),
+            'startDT': start_date,
+            'endDT': end_date,
+            'parameterCd': ','.join(parameters),
+            'siteStatus': 'all'
+        }
+        
+        response = self.scheduler.get(url, params=params, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+    
+    def download_batch(self, service, kind, station_ids, start_date, end_date, parameters):
+        """Download one multi-site request and save one raw file per station"""
+        try:
+            print(f"Downloading {kind} data for {len(station_ids)} stations: {', '.join(station_ids)}...")
+            data = self.fetch_time_series(service, station_ids, start_date, end_date, parameters, timeout=120)
+            
+            documents = self.split_time_series_by_site(data, station_ids)
+            for station_id in station_ids:
+                if station_id not in documents:
+                    print(f"  No {kind} series for station {station_id}; nothing saved")
+            for station_id, document in documents.items():
+                raw_file = raw_path(f"{self.raw_data_dir}/usgs_{kind}_{station_id}_{start_date}_{end_date}", self.compression)
+                dump_raw_json(document, raw_file)
+                
+                print(f"  Saved raw data: {raw_file} ({len(document['value']['timeSeries'])} series)")
+            
+            return documents
+            
+        except Exception as e:
+            print(f"  Error downloading batched {kind} data: {e}")
+            self.record_failure('download_batch', [service, kind, station_ids, start_date, end_date, parameters], e)
+            return None
+    
+    def download_stations_batched(self, station_ids, start_date, end_date,
+                                  max_url_length=2000, max_batch_bytes=50_000_000):
+        """Download instantaneous, daily and water quality data with multi-site requests"""
+        tasks = []
+        for kind, (service, parameters) in DOWNLOAD_KINDS.items():
+            batches = self.plan_site_batches(service, station_ids, start_date, end_date, parameters,
+                                             max_url_length=max_url_length, max_batch_bytes=max_batch_bytes)
+            print(f"  {kind}: {len(station_ids)} stations in {len(batches)} requests")
+            for batch in batches:
+                tasks.append((self.download_batch, (service, kind, batch, start_date, end_date, parameters)))
+        
+        return self.client.run_tasks(tasks)
+    
+    def load_watermarks(self):
+        """Load the per-station, per-parameter high-water marks of downloaded data"""
+        if os.path.exists(self.watermarks_file):
+            with open(self.watermarks_file, 'r') as f:
+                return json.load(f)
+        return {}
+    
+    def save_watermarks(self, watermarks):
+        """Write the watermarks through a temporary file so readers never see a partial document"""
+        tmp_file = f"{self.watermarks_file}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(watermarks, f, indent=2)
+        os.replace(tmp_file, self.watermarks_file)
+    
+    def plan_incremental_requests(self, kind, station_id, end_date, initial_days=730):
+        """Return [(start_date, parameters)] requests that resume each parameter from its own watermark
+        
+        Parameters sharing a watermark day share a request, so a parameter
+        that stopped reporting only re-requests its own quiet period instead
+        of holding every other parameter back. Parameters without a watermark
+        join the most recent request; before a station's first download every
+        parameter starts initial_days before end_date.
+        """
+        _, parameters = DOWNLOAD_KINDS[kind]
+        # Read under the store lock so a concurrent merge never hands the planner a half-written file
+        with self.store_lock:
+            station_marks = self.load_watermarks().get(kind, {}).get(station_id, {})
+        starts = {code: station_marks[code][:10] for code in parameters if code in station_marks}
+        if not starts:
+            start_date = (datetime.strptime(end_date, '%Y-%m-%d') - timedelta(days=initial_days)).strftime('%Y-%m-%d')
+            return [(start_date, list(parameters))]
+        
+        latest = max(starts.values())
+        requests_by_start = {}
+        for code in parameters:
+            requests_by_start.setdefault(starts.get(code, latest), []).append(code)
+        return sorted(requests_by_start.items())
+    
+    def merge_into_store(self, kind, station_id, data):
+        """Merge newly downloaded series into the canonical raw file and advance the watermarks"""
+        store_stem = f"{self.raw_data_dir}/usgs_{kind}_{station_id}"
+        store_file = raw_path(store_stem, self.compression)
+        new_series = data.get('value', {}).get('timeSeries', [])
+        added = 0
+        
+        with self.store_lock:
+            existing_file = find_raw_file(store_stem)
+            if existing_file:
+                store = load_raw_json(existing_file)
+                if existing_file != store_file:
+                    os.remove(existing_file)
+            else:
+                store = copy.copy(data)
+                store['value'] = dict(data.get('value', {}))
+                store['value']['timeSeries'] = []
+            
+            stored_series = {series['name']: series for series in store['value']['timeSeries']}
+            watermarks = self.load_watermarks()
+            station_marks = watermarks.setdefault(kind, {}).setdefault(station_id, {})
+            
+            for series in new_series:
+                values = series['values'][0]['value']
+                existing = stored_series.get(series['name'])
+                
+                if existing is None:
+                    store['value']['timeSeries'].append(series)
+                    stored_series[series['name']] = series
+                    added += len(values)
+                else:
+                    # Newer downloads replace overlapping points (provisional data gets revised)
+                    merged = {value['dateTime']: value for value in existing['values'][0]['value']}
+                    added += sum(1 for value in values if value['dateTime'] not in merged)
+                    merged.update((value['dateTime'], value) for value in values)
+                    existing['values'][0]['value'] = sorted(merged.values(),
+                                                            key=lambda v: datetime.fromisoformat(v['dateTime']))
+                
+                if values:
+                    parameter_code = series['variable']['variableCode'][0]['value']
+                    latest = max((value['dateTime'] for value in values), key=datetime.fromisoformat)
+                    previous = station_marks.get(parameter_code)
+                    if previous is None or datetime.fromisoformat(latest) > datetime.fromisoformat(previous):
+                        station_marks[parameter_code] = latest
+            
+            dump_raw_json(store, store_file)
+            
+            self.save_watermarks(watermarks)
+        
+        return added
+    
+    def download_incremental(self, kind, station_id, end_date, initial_days=730):
+        """Download only data newer than each parameter's stored watermark and merge it into the canonical raw file"""
+        service, _ = DOWNLOAD_KINDS[kind]
+        
+        try:
+            added = 0
+            # Each request restarts from its watermark day; points already stored are deduplicated on merge
+            for start_date, parameters in self.plan_incremental_requests(kind, station_id, end_date, initial_days):
+                print(f"Downloading {kind} data ({', '.join(parameters)}) for station {station_id} since {start_date}...")
+                data = self.fetch_time_series(service, [station_id], start_date, end_date, parameters)
+                added += self.merge_into_store(kind, station_id, data)
+            print(f"  Merged {added} new values into usgs_{kind}_{station_id}{COMPRESSION_SUFFIXES[self.compression]}")
+            return added
+            
+        except Exception as e:
+            print(f"  Error downloading incremental {kind} data: {e}")
+            self.record_failure('download_incremental', [kind, station_id, end_date, initial_days], e)
             return None
     
+    def download_stations_incremental(self, station_ids, end_date):
+        """Refresh the canonical raw store for every station and data kind"""
+        tasks = []
+        for station_id in station_ids:
+            for kind in DOWNLOAD_KINDS:
+                tasks.append((self.download_incremental, (kind, station_id, end_date)))
+        
+        return self.client.run_tasks(tasks)
+    
+    def plan_backfill_chunks(self, start_date, end_date, chunk='month'):
+        """Split a date range into calendar month- or quarter-aligned (start, end) chunks"""
+        months = CHUNK_MONTHS[chunk]
+        start = datetime.strptime(start_date, '%Y-%m-%d').date()
+        end = datetime.strptime(end_date, '%Y-%m-%d').date()
+        
+        chunks = []
+        chunk_start = start
+        while chunk_start <= end:
+            # First day of the next aligned period
+            month_index = chunk_start.year * 12 + chunk_start.month - 1
+            next_index = (month_index // months + 1) * months
+            next_start = chunk_start.replace(year=next_index // 12, month=next_index % 12 + 1, day=1)
+            chunk_end = min(end, next_start - timedelta(days=1))
+            chunks.append((chunk_start.isoformat(), chunk_end.isoformat()))
+            chunk_start = next_start
+        
+        return chunks
+    
+    def chunk_path(self, checkpoint_dir, chunk_start, chunk_end):
+        """Return the checkpoint file for one backfill chunk"""
+        return raw_path(f"{checkpoint_dir}/chunk_{chunk_start}_{chunk_end}", self.compression)
+    
+    def download_chunk(self, kind, station_id, chunk_start, chunk_end, checkpoint_dir):
+        """Download one backfill chunk into the checkpoint directory"""
+        service, parameters = DOWNLOAD_KINDS[kind]
+        chunk_file = self.chunk_path(checkpoint_dir, chunk_start, chunk_end)
+        url = f"{self.base_url}/{service}"
+        params = {
+            'format': 'json',
+            'sites': station_id,
+            'startDT': chunk_start,
+            'endDT': chunk_end,
+            'parameterCd': ','.join(parameters),
+            'siteStatus': 'all'
+        }
+        
+        try:
+            # Streamed to a temp file and renamed, so an interrupted write never looks like a finished chunk
+            response = self.scheduler.get(url, params=params, timeout=60, stream_to=chunk_file)
+            response.raise_for_status()
+            
+            print(f"  Checkpointed {kind} chunk {chunk_start} to {chunk_end} for station {station_id}")
+            return chunk_file
+            
+        except Exception as e:
+            print(f"  Error downloading {kind} chunk {chunk_start} to {chunk_end}: {e}")
+            self.record_failure('download_chunk', [kind, station_id, chunk_start, chunk_end, checkpoint_dir], e)
+            return None
+    
+    def stitch_chunks(self, chunk_files):
+        """Stitch chunk documents into one document with a single ordered series per parameter"""
+        stitched = None
+        series_by_name = {}
+        
+        for chunk_file in chunk_files:
+            data = load_raw_json(chunk_file)
+            
+            if stitched is None:
+                stitched = copy.copy(data)
+                stitched['value'] = dict(data.get('value', {}))
+                stitched['value']['timeSeries'] = []
+            
+            for series in data.get('value', {}).get('timeSeries', []):
+                existing = series_by_name.get(series['name'])
+                if existing is None:
+                    series_by_name[series['name']] = series
+                    stitched['value']['timeSeries'].append(series)
+                else:
+                    existing['values'][0]['value'].extend(series['values'][0]['value'])
+        
+        for series in series_by_name.values():
+            unique = {value['dateTime']: value for value in series['values'][0]['value']}
+            series['values'][0]['value'] = sorted(unique.values(), key=lambda v: datetime.fromisoformat(v['dateTime']))
+        
+        return stitched
+    
+    def backfill(self, kind, station_ids, start_date, end_date, chunk='month'):
+        """Backfill a long history in parallel chunks, resuming from checkpoints left by earlier runs"""
+        chunks = self.plan_backfill_chunks(start_date, end_date, chunk)
+        
+        tasks = []
+        checkpoints = {}
+        for station_id in station_ids:
+            checkpoint_dir = f"{self.raw_data_dir}/backfill/{kind}_{station_id}_{start_date}_{end_date}"
+            os.makedirs(checkpoint_dir, exist_ok=True)
+            checkpoints[station_id] = checkpoint_dir
+            
+            pending = [(cs, ce) for cs, ce in chunks if not os.path.exists(self.chunk_path(checkpoint_dir, cs, ce))]
+            print(f"Backfill {kind} {station_id}: {len(chunks) - len(pending)}/{len(chunks)} chunks already checkpointed")
+            for chunk_start, chunk_end in pending:
+                tasks.append((self.download_chunk, (kind, station_id, chunk_start, chunk_end, checkpoint_dir)))
+        
+        self.client.run_tasks(tasks)
+        
+        for station_id, checkpoint_dir in checkpoints.items():
+            chunk_files = [self.chunk_path(checkpoint_dir, cs, ce) for cs, ce in chunks]
+            missing = [chunk_file for chunk_file in chunk_files if not os.path.exists(chunk_file)]
+            if missing:
+                print(f"  Backfill {kind} {station_id} incomplete: {len(missing)} chunks missing, rerun to resume")
+                continue
+            
+            stitched = self.stitch_chunks(chunk_files)
+            raw_file = raw_path(f"{self.raw_data_dir}/usgs_{kind}_{station_id}_{start_date}_{end_date}", self.compression)
+            dump_raw_json(stitched, raw_file)
+            
+            shutil.rmtree(checkpoint_dir)
+            print(f"  Saved stitched backfill: {raw_file}")
+    
     def get_available_parameters(self, station_id):
-        """Get available parameters for a station"""
+        """Get available parameters for a station, from the metadata cache when it is fresh"""
+        return self.metadata_cache.lookup(station_id, 'parameters',
+                                          lambda: self.fetch_available_parameters(station_id)) or []
+    
+    def fetch_available_parameters(self, station_id):
+        """Fetch available parameters for a station from USGS"""
         url = f"{self.base_url}/site"
         params = {
             'format': 'json',
@@ -160,7 +564,7 @@ class USGSDataDownloader:
         }
         
         try:
-            response = requests.get(url, params=params, timeout=30)
+            response = self.scheduler.get(url, params=params, timeout=30)
             response.raise_for_status()
             data = response.json()
             
@@ -178,17 +582,13 @@ class USGSDataDownloader:
             
         except Exception as e:
             print(f"Error getting parameters for station {station_id}: {e}")
-            return []
+            return None
     
-    def download_alaska_stations_data(self):
+    def download_alaska_stations_data(self, batched=False, incremental=False,
+                                      max_url_length=2000, max_batch_bytes=50_000_000):
         """Download data for all Alaska stations"""
         # Alaska stream gauge stations
-        alaska_stations = [
-            {"station_id": "15276000", "location_id": 410, "location_name": "Kenai River at Soldotna, AK"},
-            {"station_id": "15290000", "location_id": 411, "location_name": "Russian River near Cooper Landing, AK"},
-            {"station_id": "15284000", "location_id": 412, "location_name": "Moose River near Sterling, AK"},
-            {"station_id": "15292000", "location_id": 413, "location_name": "Killey River near Sterling, AK"}
-        ]
+        alaska_stations = get_registry(self.base_dir).stations()
         
         # Download data for the last 2 years
         end_date = datetime.now()
@@ -197,10 +597,34 @@ class USGSDataDownloader:
         start_str = start_date.strftime('%Y-%m-%d')
         end_str = end_date.strftime('%Y-%m-%d')
         
+        if incremental:
+            print(f"Incremental refresh up to {end_str}")
+            self.download_stations_incremental([station['station_id'] for station in alaska_stations], end_str)
+            return
+        
         print(f"Downloading data from {start_str} to {end_str}")
         
+        if batched:
+            station_ids = [station['station_id'] for station in alaska_stations]
+            self.download_stations_batched(station_ids, start_str, end_str,
+                                           max_url_length=max_url_length, max_batch_bytes=max_batch_bytes)
+            return
+        
+        if self.client.max_in_flight > 1:
+            print(f"Concurrent mode: up to {self.client.max_in_flight} requests in flight")
+            tasks = []
+            for station in alaska_stations:
+                station_id = station['station_id']
+                tasks.append((self.get_available_parameters, (station_id,)))
+                tasks.append((self.download_instantaneous_data, (station_id, start_str, end_str)))
+                tasks.append((self.download_daily_data, (station_id, start_str, end_str)))
+                tasks.append((self.download_water_quality_data, (station_id, start_str, end_str)))
+            
+            self.client.run_tasks(tasks)
+            return
+        
         for station in alaska_stations:
-            print(f"\nProcessing station: {station['location_name']} ({station['station_id']})")
+            print(f"\nProcessing station: {station['station_name']} ({station['station_id']})")
             
             # Get available parameters
             parameters = self.get_available_parameters(station['station_id'])
@@ -227,19 +651,18 @@ class USGSDataDownloader:
         
         # Count downloaded files
         if os.path.exists(self.raw_data_dir):
-            files = [f for f in os.listdir(self.raw_data_dir) if f.endswith('.json')]
+            files = [f for f in os.listdir(self.raw_data_dir) if is_raw_file(f)]
             summary["total_files"] = len(files)
             
             # Group files by station
             stations = {}
             for file in files:
-                if file.startswith('usgs_'):
-                    parts = file.split('_')
-                    if len(parts) >= 3:
-                        station_id = parts[2]
-                        if station_id not in stations:
-                            stations[station_id] = []
-                        stations[station_id].append(file)
+                match = RAW_FILE_PATTERN.match(file)
+                if match:
+                    station_id = match.group(2)
+                    if station_id not in stations:
+                        stations[station_id] = []
+                    stations[station_id].append(file)
             
             # Create station summaries
             for station_id, files in stations.items():
@@ -250,6 +673,11 @@ class USGSDataDownloader:
                 }
                 summary["stations"].append(station_summary)
         
+        # Per-request latency and transfer statistics for this run
+        summary["requests"] = self.client.summarize()
+        summary["scheduler"] = self.scheduler.summarize()
+        summary["failed_requests"] = len(self.failed_requests)
+        
         # Save summary
         summary_file = f"{self.raw_data_dir}/download_summary.json"
         with open(summary_file, 'w') as f:
@@ -258,19 +686,76 @@ class USGSDataDownloader:
         print(f"\nDownload summary saved: {summary_file}")
         print(f"Total files downloaded: {summary['total_files']}")
         print(f"Stations processed: {len(summary['stations'])}")
+        print(f"Requests: {summary['requests']['requests']}, {summary['requests']['total_bytes']} bytes")
+        if 'latency_s' in summary['requests']:
+            latency = summary['requests']['latency_s']
+            print(f"Latency: mean {latency['mean']}s, p95 {latency['p95']}s, max {latency['max']}s")
+        print(f"Retries: {summary['scheduler']['retries']}, failed requests: {summary['failed_requests']}")
 
 def main():
     """Main download function"""
     print("AFCA USGS Data Download Script")
     print("==============================")
     
-    downloader = USGSDataDownloader()
+    parser = argparse.ArgumentParser(description="Download USGS stream gauge data")
+    parser.add_argument('--max-in-flight', type=int, default=1,
+                        help="Maximum concurrent requests (1 downloads stations serially)")
+    parser.add_argument('--batch', action='store_true',
+                        help="Request several stations per NWIS call and split the response per station")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Fetch only data newer than the stored watermarks and merge into the canonical raw files")
+    parser.add_argument('--backfill', nargs=2, metavar=('START', 'END'),
+                        help="Backfill instantaneous data between two YYYY-MM-DD dates in parallel chunks")
+    parser.add_argument('--chunk', choices=sorted(CHUNK_MONTHS), default='month',
+                        help="Backfill chunk size")
+    parser.add_argument('--replay-failed', action='store_true',
+                        help="Replay the downloads recorded in raw-data/failed_requests.json")
+    parser.add_argument('--requests-per-second', type=float, default=5,
+                        help="Per-host request rate limit")
+    parser.add_argument('--max-retries', type=int, default=4,
+                        help="Retries for timeouts and 5xx responses")
+    parser.add_argument('--deadline', type=float, default=300,
+                        help="Total seconds allowed per request including retries")
+    parser.add_argument('--compression', choices=sorted(COMPRESSION_SUFFIXES), default='gzip',
+                        help="Compression for raw files written to raw-data/")
+    parser.add_argument('--refresh-metadata', action='store_true',
+                        help="Ignore the station metadata cache and re-fetch site information")
+    parser.add_argument('--metadata-ttl-days', type=float, default=30,
+                        help="Days before cached station metadata is re-fetched")
+    parser.add_argument('--max-url-length', type=int, default=2000,
+                        help="Maximum request URL length for a multi-site batch")
+    parser.add_argument('--max-batch-bytes', type=int, default=50_000_000,
+                        help="Maximum estimated response size for a multi-site batch")
+    args = parser.parse_args()
+    
+    scheduler_options = {
+        'requests_per_second': args.requests_per_second,
+        'max_retries': args.max_retries,
+        'deadline': args.deadline
+    }
+    downloader = USGSDataDownloader(max_in_flight=args.max_in_flight, scheduler_options=scheduler_options,
+                                    compression=args.compression,
+                                    metadata_ttl_days=args.metadata_ttl_days,
+                                    refresh_metadata=args.refresh_metadata)
+    
+    if args.replay_failed:
+        downloader.replay_failed_requests()
+    elif args.backfill:
+        station_ids = [station['station_id'] for station in get_registry(downloader.base_dir).stations()]
+        downloader.backfill('instantaneous', station_ids, args.backfill[0], args.backfill[1], chunk=args.chunk)
+    else:
+        # Download data for Alaska stations
+        downloader.download_alaska_stations_data(batched=args.batch,
+                                                 incremental=args.incremental,
+                                                 max_url_length=args.max_url_length,
+                                                 max_batch_bytes=args.max_batch_bytes)
     
-    # Download data for Alaska stations
-    downloader.download_alaska_stations_data()
+    downloader.save_failed_requests()
+    downloader.metadata_cache.update_gauges_master()
     
     # Create summary
     downloader.create_station_summary()
+    downloader.client.close()
     
     print("\nUSGS data download complete!")
     print("\nNext steps:")
@@ -10,6 +10,8 @@ import requests
 from datetime import datetime
 from pathlib import Path
 
+from json_writer import write_json_if_changed
+
 def get_working_directory():
     """Return the working directory for local storage"""
     return "."
@@ -75,6 +77,8 @@ def create_alaska_stream_gauge_list():
             "latitude": 60.4878,
             "longitude": -151.0583,
             "afca_location_id": 410,
+            "location_name": "Kenai River",
+            "location_aliases": ["Soldotna"],
             "parameters": ["flow", "temperature", "stage"],
             "usgs_url": "https://waterdata.usgs.gov/nwis/uv?site_no=15276000"
         },
@@ -84,6 +88,8 @@ def create_alaska_stream_gauge_list():
             "latitude": 60.4833,
             "longitude": -149.8333,
             "afca_location_id": 411,
+            "location_name": "Russian River",
+            "location_aliases": ["Cooper Landing"],
             "parameters": ["flow", "temperature", "stage"],
             "usgs_url": "https://waterdata.usgs.gov/nwis/uv?site_no=15290000"
         },
@@ -93,8 +99,17 @@ def create_alaska_stream_gauge_list():
             "latitude": 60.5167,
             "longitude": -150.8667,
             "afca_location_id": 412,
+            "location_name": "Moose River",
             "parameters": ["flow", "temperature", "stage"],
             "usgs_url": "https://waterdata.usgs.gov/nwis/uv?site_no=15284000"
+        },
+        {
+            "station_id": "15292000",
+            "station_name": "Killey River near Sterling, AK",
+            "afca_location_id": 413,
+            "location_name": "Killey River",
+            "parameters": ["flow", "temperature", "stage"],
+            "usgs_url": "https://waterdata.usgs.gov/nwis/uv?site_no=15292000"
         }
     ]
     
@@ -116,8 +131,7 @@ def create_alaska_stream_gauge_list():
         ]
     }
     
-    with open(output_file, "w") as f:
-        json.dump(gauge_data, f, indent=2)
+    write_json_if_changed(output_file, gauge_data)
     
     print(f"  Created Alaska stream gauge list: {output_file}")
     print(f"  Total stations: {len(alaska_gauges)}")
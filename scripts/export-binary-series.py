@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+AFCA Binary Series Export Script
+Writes every processed series file as a little-endian typed-array blob plus a
+JSON header under data/08-binary, for clients that view columns directly
+"""
+
+import os
+import json
+import argparse
+
+from binary_series import encode_document, encode_records, header_path, record_header_path, BINARY_DIR, BLOB_SUFFIX, RECORD_SUFFIX
+from columnar import is_columnar_file
+from json_writer import write_json_if_changed, write_bytes_if_changed
+from manifest_builder import ManifestBuilder
+
+def get_working_directory():
+    """Return the working directory for local storage"""
+    return "."
+
+class BinarySeriesExporter:
+    # Series directories exported, relative to data/
+    SERIES_DIRS = [
+        "03-temperature",
+        "04-quality",
+        "05-flow",
+        "06-stage",
+        "07-rollups/hourly",
+        "07-rollups/weekly",
+        "07-rollups/monthly",
+        "07-rollups/season"
+    ]
+
+    def __init__(self, encoding='auto', records=False):
+        self.base_dir = get_working_directory()
+        self.data_dir = f"{self.base_dir}/data"
+        self.encoding = encoding
+        self.records = records
+        self.touched_outputs = set()
+
+    def export_all(self):
+        """Export every series file; returns the number of blobs written or changed"""
+        written = 0
+        exported = 0
+        raw_bytes = 0
+        binary_bytes = 0
+        for series_dir in self.SERIES_DIRS:
+            source_dir = f"{self.data_dir}/{series_dir}"
+            if not os.path.exists(source_dir):
+                continue
+
+            for filename in sorted(os.listdir(source_dir)):
+                if not filename.endswith('.json') or is_columnar_file(filename):
+                    continue
+
+                source_file = f"{source_dir}/{filename}"
+                blob_file = f"{self.data_dir}/{BINARY_DIR}/{series_dir}/{filename[:-len('.json')]}{BLOB_SUFFIX}"
+                try:
+                    changed = self.export_file(source_file, blob_file)
+                except (ValueError, KeyError) as e:
+                    print(f"  Skipping {series_dir}/{filename}: {e}")
+                    continue
+
+                exported += 1
+                written += changed
+                raw_bytes += os.path.getsize(source_file)
+                binary_bytes += os.path.getsize(blob_file) + os.path.getsize(header_path(blob_file))
+
+        print(f"Exported {exported} series files ({written} changed): "
+              f"{raw_bytes:,} JSON bytes -> {binary_bytes:,} binary + header bytes")
+        return written
+
+    def export_file(self, source_file, blob_file):
+        """Export one series file; returns True when its blob or header changed"""
+        with open(source_file, 'r') as f:
+            document = json.load(f)
+
+        header, blob = encode_document(document, self.encoding)
+        header['blob'] = os.path.basename(blob_file)
+
+        blob_changed = write_bytes_if_changed(blob_file, blob)
+        header_changed = write_json_if_changed(header_path(blob_file), header)
+        self.touched_outputs.add(header_path(blob_file))
+        changed = blob_changed or header_changed
+
+        if self.records:
+            record_file = f"{blob_file[:-len(BLOB_SUFFIX)]}{RECORD_SUFFIX}"
+            header, data = encode_records(document, self.encoding)
+            header['records'] = os.path.basename(record_file)
+            changed |= write_bytes_if_changed(record_file, data)
+            changed |= write_json_if_changed(record_header_path(record_file), header)
+            self.touched_outputs.add(record_header_path(record_file))
+        return changed
+
+    def update_manifest(self):
+        """List the exported binary and records headers in manifest.json"""
+        if not os.path.exists(f"{self.base_dir}/manifest.json"):
+            return
+
+        builder = ManifestBuilder(self.base_dir)
+        builder.update(self.touched_outputs)
+        if builder.save():
+            print("Updated manifest.json with binary series headers")
+
+def main():
+    """Main export function"""
+    parser = argparse.ArgumentParser(description="Export processed series as typed-array blobs for zero-copy client loading")
+    parser.add_argument('--encoding', choices=['auto', 'float32', 'int16'], default='auto',
+                        help="Value encoding: scaled Int16 where exact, else Float32 (default); always Float32; "
+                             "or always scaled Int16")
+    parser.add_argument('--records', action='store_true',
+                        help="Also write a fixed-width records layout (.rec) whose periods can be fetched with HTTP Range requests")
+    args = parser.parse_args()
+
+    print("AFCA Binary Series Export")
+    print("=========================")
+
+    exporter = BinarySeriesExporter(encoding=args.encoding, records=args.records)
+    exporter.export_all()
+    exporter.update_manifest()
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,8 @@ import re
 from datetime import datetime
 from pathlib import Path
 
+from station_registry import get_registry
+
 def get_working_directory():
     """Return the working directory for local storage"""
     return "afca-watershed-dataset"
@@ -145,19 +147,13 @@ def save_extracted_data(entries, output_file):
 
 def map_locations_to_afca_ids(entries):
     """Map location names to AFCA location IDs"""
-    location_mapping = {
-        "Kenai River": 410,
-        "Russian River": 411,
-        "Moose River": 412,
-        "Killey River": 413,
-        "Soldotna": 410,
-        "Cooper Landing": 414
-    }
+    # Station names resolve against the master files in the repository base, like every other script
+    registry = get_registry()
     
     for entry in entries:
-        location_name = entry["location_name"]
-        if location_name in location_mapping:
-            entry["location_id"] = location_mapping[location_name]
+        location_id = registry.location_id_for_name(entry["location_name"])
+        if location_id is not None:
+            entry["location_id"] = location_id
     
     return entries
 
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+AFCA JSON Writer
+Writes output files only when their data changed, so unchanged files keep
+their bytes and their last_updated stamp
+"""
+
+import os
+import json
+
+# Top-level fields that change on every run without the data changing
+VOLATILE_FIELDS = ('last_updated',)
+
+def _payload(data, volatile):
+    """Return data as plain JSON values without its volatile top-level fields"""
+    return {key: value for key, value in json.loads(json.dumps(data)).items() if key not in volatile}
+
+def _round_floats(value, digits):
+    """Return value with every float rounded to digits decimals; integral floats become ints"""
+    if isinstance(value, float):
+        value = round(value, digits)
+        return int(value) if value.is_integer() else value
+    if isinstance(value, dict):
+        return {key: _round_floats(item, digits) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_round_floats(item, digits) for item in value]
+    return value
+
+def compact_json(data, float_digits=None):
+    """Return data as minified JSON text, optionally rounding floats to float_digits decimals"""
+    if float_digits is not None:
+        data = _round_floats(data, float_digits)
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False)
+
+def read_json(path):
+    """Return the parsed JSON file at path, or None when it is missing or unreadable"""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def write_json_if_changed(path, data, volatile=VOLATILE_FIELDS, indent=2):
+    """Write data to path as JSON unless the file already holds the same payload
+
+    Volatile top-level fields (last_updated) are ignored when comparing, so a
+    rerun over unchanged data leaves the file, and its last_updated, exactly
+    as it was. Returns True when the file was written.
+    """
+    existing = read_json(path)
+    if isinstance(existing, dict) and isinstance(data, dict) and _payload(existing, volatile) == _payload(data, volatile):
+        return False
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=indent)
+    return True
+
+def write_bytes_if_changed(path, data):
+    """Write bytes to path unless it already holds exactly them; returns True when written"""
+    if os.path.exists(path) and os.path.getsize(path) == len(data):
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return False
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return True
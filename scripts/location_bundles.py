@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+AFCA Location Bundle Format
+Joins a location's watershed summary and every parameter series into one
+file, so clients load a location-year (or all of its years) in one request
+"""
+
+from datetime import datetime
+
+from columnar import COLUMNAR_FORMAT, to_columnar_document, to_row_document
+
+BUNDLE_FORMAT = 'bundle'
+BUNDLE_DIR = '09-bundles'
+
+# Manifest key for the bundle holding every year of a location
+ALL_YEARS = 'all'
+
+# Parameter -> daily series directory, relative to data/
+PARAMETER_DIRS = {
+    'temperature': '03-temperature',
+    'quality': '04-quality',
+    'flow': '05-flow',
+    'stage': '06-stage'
+}
+
+def bundle_path(location_id, year=ALL_YEARS):
+    """Return the data/09-bundles path of a location-year bundle, or of the all-years bundle"""
+    if year == ALL_YEARS:
+        return f"data/{BUNDLE_DIR}/location-{location_id}.json"
+    return f"data/{BUNDLE_DIR}/location-{location_id}-{year}.json"
+
+def is_bundle(document):
+    """Return True when document is a location bundle"""
+    return isinstance(document, dict) and document.get('format') == BUNDLE_FORMAT
+
+def _series(document, columnar):
+    """Return a series document as embedded in a bundle: columnar when asked, else rows"""
+    if columnar:
+        return document if document.get('format') == COLUMNAR_FORMAT else to_columnar_document(document)
+    return to_row_document(document)
+
+def build_bundle(location_id, series, watershed=None, year=ALL_YEARS, columnar=False):
+    """Build a location bundle from {parameter: {year: series document}} and the watershed document
+
+    A location-year bundle maps each parameter to that year's document; the
+    all-years bundle maps each parameter to {year: document}. Series are
+    embedded as rows, or as columnar blocks when columnar is set.
+    """
+    years = sorted({int(series_year) for documents in series.values() for series_year in documents})
+    location_name = (watershed or {}).get('location_name')
+    if location_name is None:
+        location_name = next((document.get('location_name') for documents in series.values()
+                              for document in documents.values()), f"Location {location_id}")
+
+    parameters = {}
+    for parameter, documents in sorted(series.items()):
+        if year == ALL_YEARS:
+            parameters[parameter] = {str(series_year): _series(document, columnar)
+                                     for series_year, document in sorted(documents.items())}
+        elif str(year) in documents:
+            parameters[parameter] = _series(documents[str(year)], columnar)
+
+    return {
+        'format': BUNDLE_FORMAT,
+        'location_id': int(location_id),
+        'location_name': location_name,
+        'year': year if year == ALL_YEARS else int(year),
+        'years': years if year == ALL_YEARS else [int(year)],
+        'watershed': watershed,
+        'parameters': parameters,
+        'last_updated': datetime.now().isoformat()
+    }
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+AFCA Manifest Builder
+Keeps manifest.json's index of data files current by updating only the
+entries for files a run touched, and optionally splits the index into a
+small root manifest plus one shard per location. Every indexed file is
+listed with its content hash, size and record count so clients can keep
+copies until the hash changes
+"""
+
+import os
+import re
+import hashlib
+from datetime import datetime
+
+from build_cache import file_hash
+from columnar import COLUMNAR_FORMAT
+from json_writer import read_json, write_json_if_changed
+from location_bundles import ALL_YEARS, BUNDLE_FORMAT
+
+SHARD_DIR = 'manifests'
+
+# Bumped when the index gains fields, so older manifests are re-indexed once
+INDEX_VERSION = 2
+
+# Hex digits of the sha256 kept per file; enough to tell versions of one file apart
+HASH_LENGTH = 16
+
+# Daily series directory -> parameter key
+SERIES_KINDS = {
+    '03-temperature': 'temperature',
+    '04-quality': 'quality',
+    '05-flow': 'flow',
+    '06-stage': 'stage'
+}
+
+# Parameters reported in each location summary, in client order
+SUMMARY_PARAMETERS = ('temperature', 'flow', 'quality', 'stage', 'watershed')
+
+# Key order of an organized entry
+ENTRY_KEYS = ('watershed', 'temperature', 'flow', 'quality', 'stage', 'rollups', 'columnar', 'binary', 'records', 'bundles')
+
+# Header suffixes of the data/08-binary layouts -> organized key
+BINARY_VARIANTS = {'.bin.json': 'binary', '.rec.json': 'records'}
+
+_WATERSHED_FILE = re.compile(r'^data/02-watersheds/location-(?P<location>\d+)\.json$')
+_BUNDLE_FILE = re.compile(r'^data/09-bundles/location-(?P<location>\d+)(?:-(?P<year>\d{4}))?\.json$')
+_SERIES_FILE = re.compile(r'^data/(?P<binary>08-binary/)?(?:(?P<series>0[3-6]-[a-z]+)|07-rollups/(?P<resolution>[a-z]+))/'
+                          r'location-(?P<location>\d+)-(?P<year>\d{4})(?P<suffix>\.columnar\.json|\.bin\.json|\.rec\.json|\.json)$')
+
+def manifest_keys(path):
+    """Return (location id, keys) locating a data file in its location's organized entry, or None for other files
+
+    Row files map to (<parameter>, <year>) or ('rollups', <resolution>, <year>);
+    columnar, binary and records variants to (<variant>, <parameter or
+    resolution>, <year>); bundles to ('bundles', <year> or 'all'); watershed
+    files to ('watershed',).
+    """
+    match = _WATERSHED_FILE.match(path)
+    if match:
+        return match['location'], ('watershed',)
+
+    match = _BUNDLE_FILE.match(path)
+    if match:
+        return match['location'], ('bundles', match['year'] or 'all')
+
+    match = _SERIES_FILE.match(path)
+    if not match:
+        return None
+    kind = match['resolution'] or SERIES_KINDS.get(match['series'])
+    if kind is None:
+        return None
+
+    suffix = match['suffix']
+    if match['binary']:
+        variant = BINARY_VARIANTS.get(suffix)
+        return (match['location'], (variant, kind, match['year'])) if variant else None
+    if suffix == '.columnar.json':
+        return match['location'], ('columnar', kind, match['year'])
+    if suffix != '.json':
+        return None
+    if match['resolution']:
+        return match['location'], ('rollups', kind, match['year'])
+    return match['location'], (kind, match['year'])
+
+def record_count(document):
+    """Return the number of records in a data document, or None for files without a series
+
+    Row and columnar files count periods with data; binary and records
+    headers count every period, gaps included; bundles count the records of
+    every series they embed.
+    """
+    if not isinstance(document, dict):
+        return None
+    if document.get('format') == BUNDLE_FORMAT:
+        series = []
+        for documents in document.get('parameters', {}).values():
+            series.extend(documents.values() if document.get('year') == ALL_YEARS else [documents])
+        return sum(record_count(item) or 0 for item in series)
+    if document.get('format') == COLUMNAR_FORMAT:
+        values = list(document['columns']['values'].values())
+        return sum(1 for index in range(document['columns']['length']) if any(column[index] is not None for column in values))
+    if 'columns' in document and 'length' in document:
+        return document['length']
+    if isinstance(document.get('data'), list):
+        return len(document['data'])
+    return None
+
+def payload_entry(payload):
+    """Return the hash and size of bytes as a manifest file entry, for files published in another form"""
+    return {'hash': hashlib.sha256(payload).hexdigest()[:HASH_LENGTH], 'bytes': len(payload)}
+
+def file_entry(path):
+    """Return the manifest file entry of a file: {hash, bytes[, records]}"""
+    entry = {'hash': file_hash(path)[:HASH_LENGTH], 'bytes': os.path.getsize(path)}
+    records = record_count(read_json(path)) if path.endswith('.json') else None
+    if records is not None:
+        entry['records'] = records
+    return entry
+
+def shard_path(location_id):
+    """Return the manifest shard path of a location"""
+    return f"{SHARD_DIR}/location-{location_id}.json"
+
+def _sorted_entry(entry):
+    """Return an organized entry with its keys in ENTRY_KEYS order and years ascending"""
+    def ordered(value):
+        if isinstance(value, dict):
+            return {key: ordered(value[key]) for key in sorted(value) if value[key]}
+        return value
+    keys = [key for key in ENTRY_KEYS if entry.get(key)] + sorted(key for key in entry if key not in ENTRY_KEYS and entry[key])
+    return {key: ordered(entry[key]) for key in keys}
+
+def _summary(entry):
+    """Return a location's summary: row file count, series years and available parameters"""
+    years = sorted({int(year) for kind in SERIES_KINDS.values() for year in entry.get(kind, {})})
+    files = sum(len(entry.get(kind, {})) for kind in SERIES_KINDS.values()) + ('watershed' in entry)
+    return {
+        'files': files,
+        'years': years,
+        'parameters': [parameter for parameter in SUMMARY_PARAMETERS if entry.get(parameter)]
+    }
+
+def load_manifest(base_dir='.'):
+    """Return manifest.json with a sharded index merged back into 'organized', or None when it is missing"""
+    manifest = read_json(f"{base_dir}/manifest.json")
+    if manifest is None or 'organized' in manifest:
+        return manifest
+
+    organized = {}
+    files = {}
+    for location_id, summary in manifest.get('locations', {}).items():
+        shard = (read_json(f"{base_dir}/{summary['manifest']}") if 'manifest' in summary else None) or {}
+        organized[location_id] = shard.get('organized', {}).get(location_id, {})
+        files.update(shard.get('files', {}))
+    return {**manifest, 'organized': organized, 'files': dict(sorted(files.items()))}
+
+def changed_files(manifest, base_dir='.'):
+    """Return the manifest paths whose local file is missing or differs from its listed hash and size"""
+    changed = []
+    for path, listed in manifest.get('files', {}).items():
+        local = f"{base_dir}/{path}"
+        if (not os.path.exists(local) or os.path.getsize(local) != listed['bytes']
+                or file_hash(local)[:HASH_LENGTH] != listed['hash']):
+            changed.append(path)
+    return changed
+
+class ManifestBuilder:
+    def __init__(self, base_dir='.', shards=None):
+        """Load manifest.json; shards=None keeps the index layout already on disk"""
+        self.base_dir = base_dir
+        self.manifest_path = f"{base_dir}/manifest.json"
+        self.manifest = read_json(self.manifest_path) or {}
+        self.manifest.setdefault('statistics', {})
+
+        sharded_on_disk = 'organized' not in self.manifest and bool(self.manifest.get('locations'))
+        self.shards = sharded_on_disk if shards is None else shards
+        self.entries = {}
+        self.files = {}
+        self.touched = set()
+        self.rebuilding = False
+
+        # A monolithic manifest lists every file in one map; group it by location
+        self.listed_files = {}
+        for path, listed in self.manifest.get('files', {}).items():
+            located = manifest_keys(path)
+            if located:
+                self.listed_files.setdefault(located[0], {})[path] = listed
+
+        # Manifests written before the builder list files by name pattern rather than by what exists,
+        # and manifests from older builders lack file entries
+        if self.manifest.get('index_version') != INDEX_VERSION:
+            self.rebuild()
+        elif self.shards != sharded_on_disk:
+            for location_id in self._listed_locations():
+                self.entry(location_id)
+                self.touched.add(location_id)
+
+    def _listed_locations(self):
+        """Return the ids of every location the manifest on disk indexes"""
+        return set(self.manifest.get('organized', {})) | set(self.manifest.get('locations', {}))
+
+    def entry(self, location_id):
+        """Return a location's organized entry, loading it and its file entries from the manifest or its shard on first use"""
+        if location_id not in self.entries:
+            entry = {} if self.rebuilding else self.manifest.get('organized', {}).get(location_id)
+            files = {} if self.rebuilding else self.listed_files.get(location_id, {})
+            if entry is None:
+                shard = read_json(f"{self.base_dir}/{shard_path(location_id)}") or {}
+                entry = shard.get('organized', {}).get(location_id, {})
+                files = shard.get('files', {})
+            self.entries[location_id] = entry
+            self.files[location_id] = dict(files)
+        return self.entries[location_id]
+
+    def _relative(self, path):
+        """Return a data file path relative to the base directory, with forward slashes"""
+        return os.path.relpath(path, self.base_dir).replace(os.sep, '/')
+
+    def add(self, path):
+        """Index one data file; files the manifest does not index are ignored"""
+        relative = self._relative(path)
+        located = manifest_keys(relative)
+        if located is None:
+            return False
+        location_id, keys = located
+        node = self.entry(location_id)
+        for key in keys[:-1]:
+            node = node.setdefault(key, {})
+        node[keys[-1]] = relative
+        self.files[location_id][relative] = file_entry(f"{self.base_dir}/{relative}")
+        self.touched.add(location_id)
+        return True
+
+    def discard(self, path):
+        """Drop one data file from the index, pruning entries left empty"""
+        relative = self._relative(path)
+        located = manifest_keys(relative)
+        if located is None:
+            return False
+        location_id, keys = located
+        nodes = [self.entry(location_id)]
+        self.files[location_id].pop(relative, None)
+        for key in keys[:-1]:
+            nodes.append(nodes[-1].get(key, {}))
+        nodes[-1].pop(keys[-1], None)
+        for node, key in zip(reversed(nodes[:-1]), reversed(keys[:-1])):
+            if not node.get(key):
+                node.pop(key, None)
+        self.touched.add(location_id)
+        return True
+
+    def update(self, paths):
+        """Index the files in paths that exist and drop those that no longer do"""
+        for path in paths:
+            if os.path.exists(f"{self.base_dir}/{self._relative(path)}"):
+                self.add(path)
+            else:
+                self.discard(path)
+
+    def rebuild(self):
+        """Re-index every file under data/ from scratch"""
+        self.touched |= self._listed_locations()
+        self.entries = {location_id: {} for location_id in self.touched}
+        self.files = {location_id: {} for location_id in self.touched}
+        self.rebuilding = True
+        for root, _, filenames in os.walk(f"{self.base_dir}/data"):
+            for filename in sorted(filenames):
+                self.add(os.path.join(root, filename))
+
+    def save(self):
+        """Write the touched entries, location summaries and statistics; returns True when manifest.json changed"""
+        summaries = dict(self.manifest.get('locations', {}))
+        organized = dict(self.manifest.get('organized', {}))
+
+        for location_id in self.touched:
+            entry = _sorted_entry(self.entry(location_id))
+            if not entry:
+                summaries.pop(location_id, None)
+                organized.pop(location_id, None)
+                continue
+            summaries[location_id] = _summary(entry)
+            organized[location_id] = entry
+
+        # Shards are listed with their own hash and size, so clients revalidate them like data files
+        if self.shards:
+            for location_id in self.touched:
+                if location_id in summaries:
+                    shard_file = f"{self.base_dir}/{shard_path(location_id)}"
+                    write_json_if_changed(shard_file, {
+                        'location_id': int(location_id),
+                        'organized': {location_id: organized[location_id]},
+                        'files': dict(sorted(self.files[location_id].items())),
+                        'last_updated': datetime.now().isoformat()
+                    })
+                    shard = file_entry(shard_file)
+                    summaries[location_id].update(manifest=shard_path(location_id), manifest_hash=shard['hash'],
+                                                  manifest_bytes=shard['bytes'])
+        for location_id in self.touched:
+            stale = f"{self.base_dir}/{shard_path(location_id)}"
+            if (not self.shards or location_id not in summaries) and os.path.exists(stale):
+                os.remove(stale)
+
+        order = sorted(summaries, key=int)
+        statistics = self.manifest['statistics']
+        statistics['total_files'] = sum(summary['files'] for summary in summaries.values())
+        statistics['locations_covered'] = sum(1 for summary in summaries.values() if summary['files'])
+        statistics['years_covered'] = sorted({year for summary in summaries.values() for year in summary['years']})
+
+        self.manifest['locations'] = {location_id: summaries[location_id] for location_id in order}
+        if self.shards:
+            self.manifest.pop('organized', None)
+            self.manifest.pop('files', None)
+        else:
+            self.manifest['organized'] = {location_id: organized[location_id] for location_id in order}
+            files = {}
+            for location_id in order:
+                files.update(self.files[location_id] if location_id in self.files else self.listed_files.get(location_id, {}))
+            self.manifest['files'] = dict(sorted(files.items()))
+        self.manifest['index_version'] = INDEX_VERSION
+        self.manifest['last_updated'] = datetime.now().isoformat()
+
+        self.touched = set()
+        return write_json_if_changed(self.manifest_path, self.manifest)
+
+    def describe(self):
+        """Return a one-line description of the manifest statistics"""
+        statistics = self.manifest['statistics']
+        return (f"{statistics['total_files']} files, {statistics['locations_covered']} locations, "
+                f"{len(statistics['years_covered'])} years")
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+AFCA NWIS HTTP Client
+Pooled keep-alive sessions, bounded concurrent fetching and a retrying,
+rate-limited request scheduler for USGS Water Services
+"""
+
+import json
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from raw_archive import write_raw_stream
+
+def iter_body(response, expires=None, chunk_size=65536):
+    """Yield a response body in chunks, raising TimeoutError once time.monotonic() passes expires"""
+    for chunk in response.iter_content(chunk_size=chunk_size):
+        if expires is not None and time.monotonic() > expires:
+            raise TimeoutError(f"Request deadline passed while reading {response.url}")
+        yield chunk
+
+class BufferedResponse:
+    """A closed response together with the body that was read from it"""
+    def __init__(self, response, content):
+        self.response = response
+        self.content = content
+
+    def __getattr__(self, name):
+        return getattr(self.response, name)
+
+    @property
+    def text(self):
+        return self.content.decode(self.response.encoding or 'utf-8', errors='replace')
+
+    def json(self, **kwargs):
+        return json.loads(self.content, **kwargs)
+
+class SessionPool:
+    """One shared keep-alive requests.Session per host"""
+    def __init__(self, pool_size=8):
+        self.pool_size = pool_size
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    def get_session(self, url):
+        """Return the shared session for the host of url, creating it on first use"""
+        host = urlsplit(url).netloc
+        with self.lock:
+            session = self.sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self.sessions[host] = session
+            return session
+
+    def close(self):
+        """Close every pooled session"""
+        with self.lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions = {}
+
+class NWISClient:
+    """Thread-safe HTTP client with a max-in-flight limit and per-request statistics"""
+    def __init__(self, max_in_flight=8):
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.session_pool = SessionPool(pool_size=self.max_in_flight)
+        self.in_flight = threading.BoundedSemaphore(self.max_in_flight)
+        self.request_log = []
+        self.log_lock = threading.Lock()
+
+    def get(self, url, params=None, timeout=60, stream_to=None, expires=None):
+        """GET a URL through the pooled session for its host
+
+        With stream_to, a successful response body is streamed straight to that
+        raw archive path (compressed by its suffix) instead of being buffered;
+        otherwise the body is read in full and returned as a BufferedResponse.
+        timeout bounds each socket operation; expires, a time.monotonic()
+        value, bounds the whole request, body included, with TimeoutError.
+        """
+        session = self.session_pool.get_session(url)
+        started = time.perf_counter()
+        stats = {
+            'url': url,
+            'status': None,
+            'bytes': 0,
+            'latency_s': None,
+            'error': None
+        }
+
+        try:
+            with self.in_flight:
+                response = session.get(url, params=params, timeout=timeout, stream=True)
+                try:
+                    if stream_to is not None and response.ok:
+                        stats['bytes'] = write_raw_stream(iter_body(response, expires), stream_to)
+                    else:
+                        # Read here rather than by requests so the deadline covers the body
+                        response = BufferedResponse(response, b''.join(iter_body(response, expires)))
+                        stats['bytes'] = len(response.content)
+                finally:
+                    # Release the connection however the body read ends
+                    response.close()
+            stats['url'] = response.url
+            stats['status'] = response.status_code
+            return response
+        except Exception as e:
+            stats['error'] = str(e)
+            raise
+        finally:
+            stats['latency_s'] = round(time.perf_counter() - started, 3)
+            with self.log_lock:
+                self.request_log.append(stats)
+
+    def run_tasks(self, tasks):
+        """Run (function, args) tasks on a bounded worker pool and return their results in order"""
+        results = [None] * len(tasks)
+
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            futures = {executor.submit(func, *args): index for index, (func, args) in enumerate(tasks)}
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    results[index] = future.result()
+                except Exception as e:
+                    print(f"  Error in download task {index}: {e}")
+
+        return results
+
+    def summarize(self):
+        """Summarize request count, bytes and latency for the requests made so far"""
+        with self.log_lock:
+            log = list(self.request_log)
+
+        latencies = sorted(r['latency_s'] for r in log if r['latency_s'] is not None)
+        summary = {
+            'requests': len(log),
+            'failed_requests': sum(1 for r in log if r['error'] or (r['status'] or 0) >= 400),
+            'total_bytes': sum(r['bytes'] for r in log),
+            'max_in_flight': self.max_in_flight
+        }
+
+        if latencies:
+            summary['latency_s'] = {
+                'mean': round(sum(latencies) / len(latencies), 3),
+                'p95': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+                'max': latencies[-1]
+            }
+
+        return summary
+
+    def close(self):
+        """Release pooled connections"""
+        self.session_pool.close()
+
+class TokenBucket:
+    """Token-bucket rate limiter: refills at rate tokens per second up to burst tokens"""
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available and return the time spent waiting"""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+class RequestScheduler:
+    """Rate-limits requests per host and retries timeouts, dropped connections, interrupted bodies and 5xx
+    responses with jittered backoff, within a total per-request deadline"""
+    RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+    RETRY_EXCEPTIONS = (requests.Timeout, requests.ConnectionError, requests.exceptions.ChunkedEncodingError)
+
+    def __init__(self, client, requests_per_second=5, burst=10, max_retries=4,
+                 base_delay=1.0, max_delay=30.0, deadline=300):
+        self.client = client
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.buckets = {}
+        self.lock = threading.Lock()
+        self.stats = {
+            'retries': 0,
+            'throttle_wait_s': 0.0,
+            'deadline_exceeded': 0
+        }
+
+    def get_bucket(self, url):
+        """Return the token bucket for the host of url"""
+        host = urlsplit(url).netloc
+        with self.lock:
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                bucket = TokenBucket(self.requests_per_second, self.burst)
+                self.buckets[host] = bucket
+            return bucket
+
+    def backoff_delay(self, attempt, response=None):
+        """Full-jitter exponential backoff, honouring Retry-After when the server sends one"""
+        if response is not None and response.headers.get('Retry-After', '').isdigit():
+            return min(self.max_delay, float(response.headers['Retry-After']))
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def get(self, url, params=None, timeout=60, stream_to=None):
+        """GET a URL, retrying retryable failures until max_retries or the request deadline"""
+        bucket = self.get_bucket(url)
+        expires = time.monotonic() + self.deadline
+        attempt = 0
+
+        while True:
+            waited = bucket.acquire()
+            with self.lock:
+                self.stats['throttle_wait_s'] += waited
+
+            response = None
+            try:
+                remaining = expires - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"Request deadline of {self.deadline}s exceeded for {url}")
+
+                # The socket timeout alone would restart with every read; expires bounds the whole attempt
+                response = self.client.get(url, params=params, timeout=min(timeout, remaining), stream_to=stream_to,
+                                           expires=expires)
+                if response.status_code not in self.RETRY_STATUS_CODES:
+                    return response
+                error = requests.HTTPError(f"HTTP {response.status_code}", response=response)
+            except self.RETRY_EXCEPTIONS as e:
+                # A body cut off mid-stream leaves no partial file behind (write_raw_stream removes it)
+                error = e
+            except TimeoutError:
+                with self.lock:
+                    self.stats['deadline_exceeded'] += 1
+                raise
+
+            delay = self.backoff_delay(attempt, response)
+            if attempt >= self.max_retries or time.monotonic() + delay >= expires:
+                if response is not None:
+                    return response
+                raise error
+
+            attempt += 1
+            with self.lock:
+                self.stats['retries'] += 1
+            time.sleep(delay)
+
+    def summarize(self):
+        """Summarize retries, throttling and deadline failures"""
+        with self.lock:
+            summary = dict(self.stats)
+        summary['throttle_wait_s'] = round(summary['throttle_wait_s'], 3)
+        summary['requests_per_second'] = self.requests_per_second
+        return summary
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+AFCA NWIS Streaming Parser
+Yields NWIS time series values one record at a time without building the
+whole JSON document in memory
+"""
+
+import json
+from collections import namedtuple
+from itertools import groupby
+
+from raw_archive import open_raw
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# series is a small metadata dict shared by every record of one time series:
+# index, site, site_name, parameter, variable_name, statistic
+NWISRecord = namedtuple('NWISRecord', ['site', 'parameter', 'statistic', 'date_time', 'value', 'qualifiers', 'series'])
+
+SERIES_PREFIX = 'value.timeSeries.item'
+POINT_PREFIX = f'{SERIES_PREFIX}.values.item.value.item'
+
+def _qualifier_codes(qualifiers):
+    """Normalize NWIS qualifiers (plain codes or {'qualifierCode': ...} objects) to a tuple of codes"""
+    return tuple(q['qualifierCode'] if isinstance(q, dict) else q for q in qualifiers or ())
+
+def iter_records(source):
+    """Yield NWISRecord tuples from a binary NWIS JSON stream
+
+    Only the first values block of each series is read, matching how the
+    processors have always treated NWIS documents.
+    """
+    if ijson is None:
+        yield from _iter_loaded_records(json.load(source))
+        return
+
+    series = None
+    point = None
+    option = None
+    values_block = -1
+
+    for prefix, event, value in ijson.parse(source):
+        if prefix == SERIES_PREFIX:
+            if event == 'start_map':
+                index = series['index'] + 1 if series else 0
+                series = {'index': index, 'site': None, 'site_name': None, 'parameter': None,
+                          'variable_name': None, 'statistic': None}
+                values_block = -1
+        elif prefix == POINT_PREFIX:
+            if event == 'start_map':
+                point = {'value': None, 'dateTime': None, 'qualifiers': []}
+            elif event == 'end_map' and values_block == 0:
+                yield NWISRecord(series['site'], series['parameter'], series['statistic'], point['dateTime'],
+                                 point['value'], tuple(point['qualifiers']), series)
+        elif point is not None and prefix.startswith(POINT_PREFIX):
+            field = prefix[len(POINT_PREFIX) + 1:]
+            if field in ('value', 'dateTime'):
+                point[field] = value
+            elif field == 'qualifiers.item' and event == 'string':
+                point['qualifiers'].append(value)
+            elif field == 'qualifiers.item.qualifierCode':
+                point['qualifiers'].append(value)
+        elif prefix == f'{SERIES_PREFIX}.values.item' and event == 'start_map':
+            values_block += 1
+            point = None
+        elif prefix == f'{SERIES_PREFIX}.sourceInfo.siteCode.item.value':
+            series['site'] = series['site'] or value
+        elif prefix == f'{SERIES_PREFIX}.sourceInfo.siteName':
+            series['site_name'] = value
+        elif prefix == f'{SERIES_PREFIX}.variable.variableCode.item.value':
+            series['parameter'] = series['parameter'] or value
+        elif prefix == f'{SERIES_PREFIX}.variable.variableName':
+            series['variable_name'] = value
+        elif prefix == f'{SERIES_PREFIX}.variable.options.option.item':
+            if event == 'start_map':
+                option = {}
+            elif event == 'end_map' and option.get('name') == 'Statistic':
+                series['statistic'] = option.get('optionCode')
+        elif prefix.startswith(f'{SERIES_PREFIX}.variable.options.option.item.') and option is not None:
+            option[prefix.rsplit('.', 1)[1]] = value
+
+def _iter_loaded_records(data):
+    """Yield NWISRecord tuples from an already parsed document (used when ijson is unavailable)"""
+    for index, series_data in enumerate(data.get('value', {}).get('timeSeries', [])):
+        variable = series_data['variable']
+        statistic = None
+        for option in variable.get('options', {}).get('option', []):
+            if option.get('name') == 'Statistic':
+                statistic = option.get('optionCode')
+
+        series = {
+            'index': index,
+            'site': series_data['sourceInfo']['siteCode'][0]['value'],
+            'site_name': series_data['sourceInfo']['siteName'],
+            'parameter': variable['variableCode'][0]['value'],
+            'variable_name': variable['variableName'],
+            'statistic': statistic
+        }
+
+        values = series_data['values'][0]['value'] if series_data.get('values') else []
+        for point in values:
+            yield NWISRecord(series['site'], series['parameter'], series['statistic'], point.get('dateTime'),
+                             point.get('value'), _qualifier_codes(point.get('qualifiers')), series)
+
+def iter_file_records(path):
+    """Yield NWISRecord tuples from a plain or compressed raw NWIS file"""
+    with open_raw(path, 'rb') as f:
+        yield from iter_records(f)
+
+def group_by_series(records):
+    """Group a record stream into (series metadata, records) pairs, one per time series"""
+    for _, series_records in groupby(records, key=lambda record: record.series['index']):
+        first = next(series_records)
+        yield first.series, _chain_first(first, series_records)
+
+def _chain_first(first, rest):
+    """Yield first followed by the rest of a group"""
+    yield first
+    yield from rest
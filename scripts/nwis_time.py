@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+AFCA NWIS Timestamps
+Bulk parsing of NWIS ISO dateTime strings into integer seconds, and
+timezone-aware bucketing into day (or hour) ordinals
+"""
+
+from datetime import datetime, timezone
+
+import numpy as np
+
+SECONDS_PER_HOUR = 3600
+SECONDS_PER_DAY = 86400
+
+# USGS computes Alaska daily values on local standard time (AKST, UTC-09:00) all year
+ALASKA_STANDARD_OFFSET = -9 * SECONDS_PER_HOUR
+
+# How points are assigned to days:
+#   alaska - Alaska standard time days (matches USGS daily values)
+#   local  - the wall-clock date exactly as NWIS reported it
+#   utc    - UTC days
+DAY_BUCKETS = ('alaska', 'local', 'utc')
+
+# Offset marker for timestamps reported without a UTC offset (daily values)
+NAIVE_OFFSET = np.iinfo(np.int32).min
+
+WIDTH = 32
+_DATE_DIGITS = [0, 1, 2, 3, 5, 6, 8, 9]
+_TIME_DIGITS = [11, 12, 14, 15, 17, 18]
+
+def days_from_civil(year, month, day):
+    """Return day ordinals since 1970-01-01 for proleptic Gregorian dates (works on scalars and arrays)"""
+    year = year - (month <= 2)
+    era = year // 400
+    year_of_era = year - era * 400
+    day_of_year = (153 * ((month + 9) % 12) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    return era * 146097 + day_of_era - 719468
+
+_MONTH_DAYS = np.array([0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+
+def days_in_month(year, month):
+    """Return the number of days in each (year, month); out-of-range months give 0"""
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    month = np.clip(month, 0, 12)
+    return _MONTH_DAYS[month] + (leap & (month == 2))
+
+def parse_timestamps(date_times):
+    """Parse NWIS dateTime strings in bulk
+
+    Returns (wall, offsets, valid) int arrays: wall-clock seconds since
+    1970-01-01 as reported, the reported UTC offset in seconds (NAIVE_OFFSET
+    when none was given) and a validity mask. 'YYYY-MM-DD', 'YYYY-MM-DDTHH:MM:SS'
+    with optional fraction and '+HH:MM'/'-HH:MM' offset are decoded
+    arithmetically from their bytes, one fixed layout per string length;
+    anything else falls back to datetime.fromisoformat one timestamp at a time.
+    """
+    count = len(date_times)
+    wall = np.zeros(count, dtype=np.int64)
+    offsets = np.full(count, NAIVE_OFFSET, dtype=np.int64)
+    valid = np.zeros(count, dtype=bool)
+    if count == 0:
+        return wall, offsets, valid
+
+    try:
+        lengths = np.fromiter(map(len, date_times), dtype=np.int64, count=count)
+        chars = np.array(date_times, dtype=f'S{WIDTH}').view(np.uint8).reshape(count, WIDTH)
+    except (UnicodeEncodeError, TypeError, ValueError):
+        _parse_slow(date_times, np.arange(count), wall, offsets, valid)
+        return wall, offsets, valid
+
+    # NWIS chunks almost always share one layout, so this loop usually runs once
+    unique_lengths = np.unique(lengths)
+    for length in unique_lengths:
+        rows = slice(None) if len(unique_lengths) == 1 else np.flatnonzero(lengths == length)
+        if 19 <= length <= WIDTH or length == 10:
+            wall[rows], offsets[rows], valid[rows] = _parse_layout(chars[rows], int(length))
+
+    slow = np.flatnonzero(~valid)
+    if len(slow):
+        _parse_slow(date_times, slow, wall, offsets, valid)
+    return wall, offsets, valid
+
+def _parse_layout(chars, length):
+    """Decode timestamps that all have the same string length; returns (wall, offsets, valid)"""
+    # uint8 wrap-around: digit bytes map to 0-9, every other byte to 10 or more
+    digits = chars[:, :length] - np.uint8(ord('0'))
+    is_digit = digits <= 9
+
+    valid = is_digit[:, _DATE_DIGITS].all(axis=1) & (chars[:, 4] == ord('-')) & (chars[:, 7] == ord('-'))
+    offsets = np.full(len(chars), NAIVE_OFFSET, dtype=np.int64)
+
+    if length >= 19:
+        valid &= ((chars[:, 10] == ord('T')) | (chars[:, 10] == ord(' '))) & \
+            (chars[:, 13] == ord(':')) & (chars[:, 16] == ord(':')) & is_digit[:, _TIME_DIGITS].all(axis=1)
+
+        # Trailing +HH:MM / -HH:MM offset
+        has_offset = np.zeros(len(chars), dtype=bool)
+        if length >= 25:
+            sign = chars[:, length - 6]
+            has_offset = ((sign == ord('+')) | (sign == ord('-'))) & (chars[:, length - 3] == ord(':')) & \
+                is_digit[:, [length - 5, length - 4, length - 2, length - 1]].all(axis=1)
+            hours = digits[:, length - 5].astype(np.int64) * 10 + digits[:, length - 4]
+            minutes = digits[:, length - 2].astype(np.int64) * 10 + digits[:, length - 1]
+            offset = np.where(sign == ord('-'), -1, 1) * (hours * SECONDS_PER_HOUR + minutes * 60)
+            offsets[has_offset] = offset[has_offset]
+
+        # Whatever follows the seconds must be a .fraction, then the optional offset
+        body_end = np.where(has_offset, length - 6, length)
+        if length > 19:
+            fraction = np.arange(20, length) < body_end[:, None]
+            valid &= ((chars[:, 19] == ord('.')) | (body_end == 19)) & (is_digit[:, 20:length] | ~fraction).all(axis=1)
+
+    # Column-major copy so each digit column is contiguous
+    columns = np.ascontiguousarray(digits[:, :19 if length >= 19 else 10].T, dtype=np.int64)
+    year = columns[0] * 1000 + columns[1] * 100 + columns[2] * 10 + columns[3]
+    month = columns[5] * 10 + columns[6]
+    day = columns[8] * 10 + columns[9]
+    seconds = 0
+    if length >= 19:
+        hour = columns[11] * 10 + columns[12]
+        minute = columns[14] * 10 + columns[15]
+        second = columns[17] * 10 + columns[18]
+        valid &= (hour <= 23) & (minute <= 59) & (second <= 60)
+        seconds = hour * 3600 + minute * 60 + second
+    valid &= (month >= 1) & (month <= 12) & (day >= 1) & (day <= days_in_month(year, month))
+
+    wall = days_from_civil(year, month, day) * SECONDS_PER_DAY + seconds
+    offsets[~valid] = NAIVE_OFFSET
+    return np.where(valid, wall, 0), offsets, valid
+
+_offset_cache = {}
+
+def _parse_slow(date_times, rows, wall, offsets, valid):
+    """Parse the given rows one timestamp at a time, caching each distinct UTC offset"""
+    for row in rows:
+        date_time = date_times[row]
+        try:
+            parsed = datetime.fromisoformat(date_time.replace('Z', '+00:00'))
+        except (ValueError, TypeError, AttributeError):
+            continue
+
+        wall[row] = days_from_civil(parsed.year, parsed.month, parsed.day) * SECONDS_PER_DAY + \
+            parsed.hour * 3600 + parsed.minute * 60 + parsed.second
+        if parsed.tzinfo is not None:
+            offset = _offset_cache.get(parsed.tzinfo)
+            if offset is None:
+                offset = _offset_cache[parsed.tzinfo] = int(parsed.utcoffset().total_seconds())
+            offsets[row] = offset
+        valid[row] = True
+
+def to_epoch(wall, offsets):
+    """Return UTC epoch seconds; timestamps without an offset are taken as UTC"""
+    return np.where(offsets == NAIVE_OFFSET, wall, wall - offsets)
+
+def bucket_seconds(wall, offsets, bucket='alaska'):
+    """Shift reported wall-clock seconds into the bucketing timezone
+
+    Timestamps without an offset (daily values) are already local calendar
+    values and are left as reported for every bucket.
+    """
+    if bucket == 'local':
+        return wall
+    if bucket == 'utc':
+        target = 0
+    elif bucket == 'alaska':
+        target = ALASKA_STANDARD_OFFSET
+    else:
+        raise ValueError(f"Unknown day bucket: {bucket} (expected one of {', '.join(DAY_BUCKETS)})")
+    return np.where(offsets == NAIVE_OFFSET, wall, wall - offsets + target)
+
+def bucket_ordinals(date_times, bucket='alaska', seconds=SECONDS_PER_DAY):
+    """Return (ordinals of seconds-long periods since 1970-01-01, valid mask) for NWIS dateTime strings"""
+    wall, offsets, valid = parse_timestamps(date_times)
+    return bucket_seconds(wall, offsets, bucket) // seconds, valid
+
+def day_ordinals(date_times, bucket='alaska'):
+    """Return (day ordinals since 1970-01-01, valid mask) for NWIS dateTime strings"""
+    return bucket_ordinals(date_times, bucket, SECONDS_PER_DAY)
+
+def format_day(ordinal):
+    """Return the YYYY-MM-DD string of a day ordinal"""
+    return datetime.fromtimestamp(int(ordinal) * SECONDS_PER_DAY, tz=timezone.utc).strftime('%Y-%m-%d')
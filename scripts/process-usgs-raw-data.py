@@ -5,366 +5,510 @@ Processes downloaded USGS raw data files into AFCA format
 """
 
 import os
-import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from pathlib import Path
 
+from build_cache import BuildCache
+from columnar import columnar_path, to_columnar_document, RESOLUTION_STEPS
+from json_writer import write_json_if_changed
+from manifest_builder import ManifestBuilder
+from raw_archive import is_raw_file, raw_file_order
+from nwis_stream import iter_file_records, group_by_series
+from nwis_time import DAY_BUCKETS
+from series_aggregation import (aggregate_series, build_pyramid, primary_statistic, statistic_columns, column_records,
+                                summary_column, QUALITY_LABELS, RESOLUTIONS, STATISTIC_MAX, STATISTIC_MIN, STATISTIC_MEAN)
+from station_metadata_cache import StationMetadataCache
+from station_registry import get_registry
+
 def get_working_directory():
     """Return the working directory for local storage"""
     return "."
 
 class USGSRawDataProcessor:
-    def __init__(self):
+    # parameter -> (daily value key, rounding digits, unit, output directory)
+    PARAMETER_OUTPUTS = {
+        'flow': ('flow_cfs', 2, 'ft³/s', '05-flow'),
+        'temperature': ('temperature_c', 2, '°C', '03-temperature'),
+        'stage': ('stage_ft', 2, 'ft', '06-stage'),
+        'conductivity': ('conductivity_us_cm', 0, 'µS/cm', '04-quality'),
+        'dissolved_oxygen': ('dissolved_oxygen_mg_l', 2, 'mg/L', '04-quality'),
+        'turbidity': ('turbidity_ntu', 2, 'NTU', '04-quality'),
+        'ph': ('ph', 2, 'pH units', '04-quality')
+    }
+    
+    # Rollup pyramid levels written next to the daily files, one wide file per location-year
+    ROLLUP_DIR = '07-rollups'
+    ROLLUP_OUTPUTS = {
+        'hour': 'hourly',
+        'week': 'weekly',
+        'month': 'monthly',
+        'season': 'season'
+    }
+    
+    def __init__(self, quality_breakdown=False, day_bucket='alaska', rollups=True, columnar=False):
         self.base_dir = get_working_directory()
         self.raw_data_dir = f"{self.base_dir}/raw-data"
+        self.build_cache_file = f"{self.raw_data_dir}/build_cache.json"
         self.output_dir = f"{self.base_dir}/data"
+        self.metadata_cache = StationMetadataCache()
+        self.registry = get_registry(self.base_dir)
+        self.pending_outputs = {}
+        self.touched_outputs = set()
+        self.quality_breakdown = quality_breakdown
+        self.day_bucket = day_bucket
+        self.rollups = rollups
+        self.columnar = columnar
         
     def process_raw_usgs_file(self, raw_file_path):
         """Process a single raw USGS data file"""
+        result = self.aggregate_raw_usgs_file(raw_file_path)
+        self.accumulate_outputs(result['outputs'])
+        self.write_processed_data()
+        return result['ok']
+    
+    def aggregate_raw_usgs_file(self, raw_file_path):
+        """Aggregate a single raw USGS data file into yearly outputs without writing anything
+        
+        Returns {'file', 'ok', 'outputs', 'seconds'} where outputs is a list of
+        (location_id, location_name, parameter, resolution, year, year_data) tuples.
+        """
         print(f"Processing: {os.path.basename(raw_file_path)}")
+        started = time.perf_counter()
+        outputs = []
+        ok = False
         
         try:
-            with open(raw_file_path, 'r') as f:
-                data = json.load(f)
+            # Stream records series by series, indexing each series by (site, parameter, statistic)
+            found_series = False
+            parameter_series = {}
+            site_names = {}
+            for series, records in group_by_series(iter_file_records(raw_file_path)):
+                found_series = True
+                parameter = self._series_parameter(series)
+                if parameter:
+                    aggregate = aggregate_series(records, self._base_resolution(series), day_bucket=self.day_bucket)
+                    parameter_series.setdefault((series['site'], parameter), {})[series['statistic']] = aggregate
+                    site_names[series['site']] = series['site_name']
             
-            # Extract time series data
-            if 'value' in data and 'timeSeries' in data['value']:
-                time_series = data['value']['timeSeries']
-                
-                # Process each time series
-                for series in time_series:
-                    self._process_time_series(series)
-                
-                return True
+            # One output per parameter carrying every statistic as a column
+            for (site_code, parameter), aggregates in parameter_series.items():
+                outputs.extend(self._process_parameter(site_code, site_names[site_code], parameter, aggregates))
+            
+            if found_series:
+                ok = True
             else:
                 print(f"  No time series data found in {raw_file_path}")
-                return False
                 
         except Exception as e:
             print(f"  Error processing {raw_file_path}: {e}")
-            return False
+        
+        return {
+            'file': os.path.basename(raw_file_path),
+            'ok': ok,
+            'outputs': outputs,
+            'seconds': round(time.perf_counter() - started, 3)
+        }
+    
+    def accumulate_outputs(self, outputs, only=None):
+        """Merge aggregated (location_id, location_name, parameter, resolution, year, year_data) outputs into pending files
+        
+        With only, outputs for any other output file are ignored.
+        """
+        for location_id, location_name, parameter, resolution, year, year_data in outputs:
+            if only is None or self._output_file(location_id, parameter, resolution, year) in only:
+                self._accumulate_processed_data(location_id, location_name, parameter, resolution, year, year_data)
+    
+    def output_files(self, outputs):
+        """Return the output files a list of aggregated outputs maps to"""
+        files = {self._output_file(location_id, parameter, resolution, year)
+                 for location_id, _, parameter, resolution, year, _ in outputs}
+        files.discard(None)
+        return files
     
-    def _process_time_series(self, series):
-        """Process a single time series from USGS data"""
+    def _base_resolution(self, series):
+        """Return the finest level to aggregate a series at
+        
+        Daily value series are already daily; instantaneous series start at
+        hourly when rollups are wanted, so the daily level is built from them.
+        """
+        if not self.rollups or series['statistic'] in (STATISTIC_MAX, STATISTIC_MIN, STATISTIC_MEAN):
+            return 'day'
+        return 'hour'
+    
+    def _series_parameter(self, series):
+        """Return the AFCA parameter for a time series, or None if its parameter or station is unknown"""
+        # Map variable codes to AFCA parameters
+        parameter_map = {
+            '00060': 'flow',
+            '00010': 'temperature', 
+            '00065': 'stage',
+            '00095': 'conductivity',
+            '00094': 'dissolved_oxygen',
+            '00076': 'turbidity',
+            '00400': 'ph'
+        }
+        
+        parameter = parameter_map.get(series['parameter'])
+        if parameter is None:
+            print(f"  Unknown parameter code: {series['parameter']} ({series['variable_name']})")
+            return None
+        
+        if not self.registry.location_id_for_station(series['site']):
+            print(f"  Unknown station code: {series['site']}")
+            return None
+        
+        return parameter
+    
+    def _process_parameter(self, site_code, site_name, parameter, aggregates):
+        """Turn one parameter's {statistic code: SeriesAggregate} series into yearly outputs at every resolution"""
+        outputs = []
         try:
             # Extract station information
-            source_info = series['sourceInfo']
-            site_code = source_info['siteCode'][0]['value']
-            site_name = source_info['siteName']
+            site_name = self.metadata_cache.station_name(site_code) or site_name
+            location_id = self.registry.location_id_for_station(site_code)
             
-            # Extract variable information
-            variable = series['variable']
-            variable_code = variable['variableCode'][0]['value']
-            variable_name = variable['variableName']
+            # Roll each statistic's series up the pyramid, then regroup by resolution
+            levels = {}
+            for statistic, aggregate in aggregates.items():
+                for resolution, level in build_pyramid(aggregate).items():
+                    levels.setdefault(resolution, {})[statistic] = level
             
-            # Extract values
-            values = series['values'][0]['value']
-            
-            # Map variable codes to AFCA parameters
-            parameter_map = {
-                '00060': 'flow',
-                '00010': 'temperature', 
-                '00065': 'stage',
-                '00095': 'conductivity',
-                '00094': 'dissolved_oxygen',
-                '00076': 'turbidity',
-                '00400': 'ph'
-            }
-            
-            parameter = parameter_map.get(variable_code, 'unknown')
-            
-            if parameter == 'unknown':
-                print(f"  Unknown parameter code: {variable_code} ({variable_name})")
-                return
-            
-            # Map station codes to AFCA location IDs
-            station_map = {
-                '15276000': 410,  # Kenai River
-                '15290000': 411,  # Russian River
-                '15284000': 412,  # Moose River
-                '15292000': 413   # Killey River
-            }
-            
-            location_id = station_map.get(site_code)
-            if not location_id:
-                print(f"  Unknown station code: {site_code}")
-                return
-            
-            # Process values into daily data
-            daily_data = self._convert_to_daily_data(values, parameter)
-            
-            if daily_data:
-                # Group by year
-                yearly_data = {}
-                for day in daily_data:
-                    year = day['date'][:4]
-                    if year not in yearly_data:
-                        yearly_data[year] = []
-                    yearly_data[year].append(day)
-                
-                # Save yearly data
-                for year, year_data in yearly_data.items():
-                    self._save_processed_data(location_id, site_name, parameter, year, year_data)
+            for resolution in RESOLUTIONS:
+                if resolution not in levels or (resolution != 'day' and not self.rollups):
+                    continue
+                level = levels[resolution]
+                for year in level[primary_statistic(level)].observed_years():
+                    year_data = self._convert_to_daily_data(level, parameter, year, resolution)
+                    if year_data:
+                        outputs.append((location_id, site_name, parameter, resolution, str(year), year_data))
             
         except Exception as e:
             print(f"  Error processing time series: {e}")
-    
-    def _convert_to_daily_data(self, values, parameter):
-        """Convert USGS values to daily data format"""
-        daily_data = {}
-        
-        for value in values:
-            try:
-                # Extract date and value
-                date_time = value['dateTime']
-                date = date_time[:10]  # YYYY-MM-DD
-                value_str = value['value']
-                
-                # Skip missing values
-                if value_str == '-999999' or value_str == '':
-                    continue
-                
-                # Convert to float
-                try:
-                    numeric_value = float(value_str)
-                except ValueError:
-                    continue
-                
-                # Determine quality
-                qualifiers = value.get('qualifiers', [])
-                quality = 'good'
-                for qualifier in qualifiers:
-                    if qualifier['qualifierCode'] in ['P', 'e', 'A']:
-                        quality = 'fair'
-                    elif qualifier['qualifierCode'] in ['R', 'S']:
-                        quality = 'poor'
-                
-                # Group by date
-                if date not in daily_data:
-                    daily_data[date] = []
-                
-                daily_data[date].append({
-                    'value': numeric_value,
-                    'quality': quality,
-                    'datetime': date_time
-                })
-                
-            except (KeyError, ValueError) as e:
-                continue
         
-        # Calculate daily averages
-        daily_averages = []
-        for date, day_values in daily_data.items():
-            if day_values:
-                # Calculate average value
-                values_list = [v['value'] for v in day_values]
-                avg_value = sum(values_list) / len(values_list)
-                
-                # Determine overall quality
-                qualities = [v['quality'] for v in day_values]
-                if all(q == 'good' for q in qualities):
-                    quality = 'good'
-                elif any(q == 'poor' for q in qualities):
-                    quality = 'poor'
-                else:
-                    quality = 'fair'
-                
-                # Create output format based on parameter
-                if parameter == 'flow':
-                    output_value = {'flow_cfs': round(avg_value, 2)}
-                elif parameter == 'temperature':
-                    output_value = {'temperature_c': round(avg_value, 2)}
-                elif parameter == 'stage':
-                    output_value = {'stage_ft': round(avg_value, 2)}
-                elif parameter == 'conductivity':
-                    output_value = {'conductivity_us_cm': round(avg_value, 0)}
-                elif parameter == 'dissolved_oxygen':
-                    output_value = {'dissolved_oxygen_mg_l': round(avg_value, 2)}
-                elif parameter == 'turbidity':
-                    output_value = {'turbidity_ntu': round(avg_value, 2)}
-                elif parameter == 'ph':
-                    output_value = {'ph': round(avg_value, 2)}
-                else:
-                    continue
-                
-                daily_averages.append({
-                    'date': date,
-                    **output_value,
-                    'quality': quality
-                })
+        return outputs
+    
+    def _convert_to_daily_data(self, aggregates, parameter, year=None, resolution='day'):
+        """Convert one parameter's {statistic code: SeriesAggregate} series to daily (or rollup period) data format"""
+        if parameter not in self.PARAMETER_OUTPUTS:
+            return []
         
-        return sorted(daily_averages, key=lambda x: x['date'])
+        # Mean plus max/min columns, with the worst quality of any column
+        output_key, digits, _, _ = self.PARAMETER_OUTPUTS[parameter]
+        return column_records(statistic_columns(output_key, aggregates), digits, year=year, breakdown=self.quality_breakdown,
+                              period_key='date' if resolution == 'day' else 'period')
     
-    def _save_processed_data(self, location_id, location_name, parameter, year, year_data):
-        """Save processed data in AFCA format"""
-        # Calculate statistics
-        if parameter == 'flow':
-            values = [d['flow_cfs'] for d in year_data]
-            unit = 'ft³/s'
-        elif parameter == 'temperature':
-            values = [d['temperature_c'] for d in year_data]
-            unit = '°C'
-        elif parameter == 'stage':
-            values = [d['stage_ft'] for d in year_data]
-            unit = 'ft'
-        elif parameter == 'conductivity':
-            values = [d['conductivity_us_cm'] for d in year_data]
-            unit = 'µS/cm'
-        elif parameter == 'dissolved_oxygen':
-            values = [d['dissolved_oxygen_mg_l'] for d in year_data]
-            unit = 'mg/L'
-        elif parameter == 'turbidity':
-            values = [d['turbidity_ntu'] for d in year_data]
-            unit = 'NTU'
-        elif parameter == 'ph':
-            values = [d['ph'] for d in year_data]
-            unit = 'pH units'
-        else:
+    def _accumulate_processed_data(self, location_id, location_name, parameter, resolution, year, year_data):
+        """Add one parameter's data to the pending output file for its location-year and resolution
+        
+        Water quality parameters share one daily file per location-year, and
+        every parameter shares one file per rollup level; their values are
+        merged by period into one record per period when the file is written.
+        A parameter seen again for the same file replaces its earlier data.
+        """
+        output_file = self._output_file(location_id, parameter, resolution, year)
+        if output_file is None:
             return
         
-        if values:
-            stats = {
-                'mean': round(sum(values) / len(values), 2),
-                'min': round(min(values), 2),
-                'max': round(max(values), 2),
-                'count': len(values)
-            }
-            
-            # Create AFCA format data
-            afca_data = {
+        output_key, _, unit, _ = self.PARAMETER_OUTPUTS[parameter]
+        pending = self.pending_outputs.get(output_file)
+        if pending is None:
+            pending = self.pending_outputs[output_file] = {
                 'location_id': location_id,
                 'location_name': location_name,
                 'year': int(year),
-                'parameter': parameter,
-                'unit': unit,
-                'data': year_data,
-                'statistics': stats,
-                'source': 'USGS Stream Gauge Network',
-                'last_updated': datetime.now().isoformat()
+                'resolution': resolution,
+                'parameters': {}
             }
+        pending['parameters'][parameter] = (output_key, unit, year_data)
+    
+    def _output_file(self, location_id, parameter, resolution, year):
+        """Return the output file for one parameter's location-year at a resolution, or None for unknown parameters"""
+        if parameter not in self.PARAMETER_OUTPUTS:
+            return None
+        
+        output_dir = self.PARAMETER_OUTPUTS[parameter][3]
+        if resolution != 'day':
+            output_dir = f"{self.ROLLUP_DIR}/{self.ROLLUP_OUTPUTS[resolution]}"
+        return f"{self.output_dir}/{output_dir}/location-{location_id}-{year}.json"
+    
+    def write_processed_data(self):
+        """Write every pending output file once, in AFCA format, skipping files whose data is unchanged"""
+        unchanged = 0
+        self.touched_outputs.update(self.pending_outputs)
+        for output_file in sorted(self.pending_outputs):
+            pending = self.pending_outputs[output_file]
+            parameters = pending['parameters']
             
-            # Determine output directory and filename
-            if parameter in ['flow']:
-                output_dir = f"{self.output_dir}/05-flow"
-            elif parameter in ['temperature']:
-                output_dir = f"{self.output_dir}/03-temperature"
-            elif parameter in ['stage']:
-                output_dir = f"{self.output_dir}/06-stage"
-            elif parameter in ['conductivity', 'dissolved_oxygen', 'turbidity', 'ph']:
-                output_dir = f"{self.output_dir}/04-quality"
-            else:
-                return
+            resolution = pending['resolution']
+            rollup = resolution != 'day'
+            wide = rollup or os.path.basename(os.path.dirname(output_file)) == '04-quality'
+            period_key = 'period' if rollup else 'date'
+            
+            # Merge parameters by period; a merged period is only as good as its worst parameter
+            days = {}
+            for parameter, (_, _, parameter_data) in parameters.items():
+                for day in parameter_data:
+                    merged = days.setdefault(day[period_key], {period_key: day[period_key]})
+                    merged.update((key, value) for key, value in day.items() if key not in (period_key, 'quality', 'quality_breakdown'))
+                    quality = merged.get('quality', 'good')
+                    if QUALITY_LABELS.index(day['quality']) > QUALITY_LABELS.index(quality):
+                        quality = day['quality']
+                    merged['quality'] = quality
+                    if 'quality_breakdown' in day:
+                        if wide:
+                            merged.setdefault('quality_breakdown', {})[parameter] = day['quality_breakdown']
+                        else:
+                            merged['quality_breakdown'] = day['quality_breakdown']
             
-            os.makedirs(output_dir, exist_ok=True)
-            output_file = f"{output_dir}/location-{location_id}-{year}.json"
+            year_data = []
+            for date in sorted(days):
+                day = days[date]
+                quality = day.pop('quality')
+                breakdown = day.pop('quality_breakdown', None)
+                record = {**day, 'quality': quality}
+                if breakdown is not None:
+                    record['quality_breakdown'] = breakdown
+                year_data.append(record)
             
-            with open(output_file, 'w') as f:
-                json.dump(afca_data, f, indent=2)
+            # Calculate statistics
+            statistics = {}
+            for parameter, (output_key, _, _) in parameters.items():
+                # Parameters reported only as daily extremes are summarized by their max (or min) column
+                column = summary_column(output_key, year_data)
+                values = [day[column] for day in year_data if column in day]
+                if values:
+                    statistics[parameter] = {
+                        'mean': round(sum(values) / len(values), 2),
+                        'min': round(min(values), 2),
+                        'max': round(max(values), 2),
+                        'count': len(values)
+                    }
+            
+            if not statistics:
+                continue
+            
+            # Create AFCA format data
+            afca_data = {
+                'location_id': pending['location_id'],
+                'location_name': pending['location_name'],
+                'year': pending['year']
+            }
+            if rollup:
+                # One wide record per period across every parameter
+                afca_data.update({
+                    'resolution': self.ROLLUP_OUTPUTS[resolution],
+                    'parameters': list(parameters),
+                    'units': {output_key: unit for output_key, unit, _ in parameters.values()},
+                    'data': year_data,
+                    'statistics': statistics
+                })
+            elif wide:
+                # One wide record per day across every quality parameter
+                afca_data.update({
+                    'parameter': 'water_quality',
+                    'parameters': list(parameters),
+                    'units': {output_key: unit for output_key, unit, _ in parameters.values()},
+                    'data': year_data,
+                    'statistics': statistics
+                })
+            else:
+                parameter, (_, unit, _) = next(iter(parameters.items()))
+                afca_data.update({
+                    'parameter': parameter,
+                    'unit': unit,
+                    'data': year_data,
+                    'statistics': statistics[parameter]
+                })
+            afca_data.update({
+                'source': 'USGS Stream Gauge Network',
+                'last_updated': datetime.now().isoformat()
+            })
             
-            print(f"  Saved {parameter} data for {location_name} {year}: {len(year_data)} days")
+            if self.columnar:
+                write_json_if_changed(columnar_path(output_file), to_columnar_document(afca_data, RESOLUTION_STEPS[resolution]),
+                                      indent=None)
+            if not write_json_if_changed(output_file, afca_data):
+                unchanged += 1
+                continue
+            
+            periods = f"{self.ROLLUP_OUTPUTS[resolution]} periods" if rollup else "days"
+            print(f"  Saved {', '.join(parameters)} data for {pending['location_name']} {pending['year']}: {len(year_data)} {periods}")
+        
+        if unchanged:
+            print(f"  {unchanged} output files unchanged")
+        self.pending_outputs = {}
     
-    def process_all_raw_files(self):
-        """Process all raw USGS data files"""
+    def process_all_raw_files(self, workers=1, rebuild=False):
+        """Process raw USGS data files whose contents changed since the last run
+        
+        The build cache records each raw file's content hash and the output
+        files it produced. Only new or changed raw files are aggregated, plus
+        the unchanged files that share an output file with them, and only the
+        output files those changes touch are rewritten. rebuild ignores the
+        cache and reprocesses everything.
+        
+        With workers > 1 the files are aggregated on a process pool. Workers
+        only return outputs; this process writes them, in file order, so files
+        that map to the same location-year resolve the same way on every run.
+        Each incremental store comes after the dated downloads of its kind and
+        station, so its newer data wins where they overlap.
+        """
         if not os.path.exists(self.raw_data_dir):
             print("Raw data directory not found")
             return
         
-        raw_files = [f for f in os.listdir(self.raw_data_dir) if f.startswith('usgs_') and f.endswith('.json')]
+        raw_files = sorted((f for f in os.listdir(self.raw_data_dir) if f.startswith('usgs_') and is_raw_file(f)),
+                           key=raw_file_order)
         
         if not raw_files:
             print("No raw USGS data files found")
             return
         
-        print(f"Found {len(raw_files)} raw USGS data files to process")
+        print(f"Found {len(raw_files)} raw USGS data files")
+        
+        started = time.perf_counter()
+        raw_file_paths = [f"{self.raw_data_dir}/{raw_file}" for raw_file in raw_files]
+        cache = BuildCache(self.build_cache_file, rebuild=rebuild, settings={
+            'quality_breakdown': self.quality_breakdown,
+            'day_bucket': self.day_bucket,
+            'rollups': self.rollups,
+            'columnar': self.columnar
+        })
+        
+        changed = cache.changed(raw_file_paths)
+        removed = cache.removed(raw_file_paths)
+        if not changed and not removed:
+            print("All raw files unchanged since the last run; nothing to reprocess")
+            return
+        print(f"  {len(changed)} new or changed, {len(removed)} removed, {len(raw_files) - len(changed)} unchanged")
+        
+        # Output files touched by the changes: what changed files produced before and produce now
+        results = {path: result for path, result in zip(changed, self._aggregate_files(changed, workers))}
+        dirty = set()
+        for name in removed:
+            dirty.update(cache.outputs(name))
+        for path, result in results.items():
+            dirty.update(cache.outputs(path))
+            dirty.update(self.output_files(result['outputs']))
+        self.touched_outputs |= dirty
+        
+        # Unchanged files sharing those outputs are needed to rebuild them in full
+        unchanged = [path for path in raw_file_paths if path not in results]
+        dependents = cache.dependents(unchanged, dirty)
+        if dependents:
+            print(f"  Reprocessing {len(dependents)} unchanged files that share output files with the changes")
+            results.update(zip(dependents, self._aggregate_files(dependents, workers)))
+        
+        # Single writer: merge outputs in file order, then write each touched file once
+        for path in raw_file_paths:
+            if path in results:
+                self.accumulate_outputs(results[path]['outputs'], only=dirty)
+        self.write_processed_data()
+        
+        # Touched outputs that no raw file produces any more, e.g. after their only raw file was removed
+        produced = set()
+        for result in results.values():
+            produced |= self.output_files(result['outputs'])
+        produced |= {columnar_path(output) for output in produced}
+        for output in sorted(dirty - produced):
+            if os.path.exists(output):
+                os.remove(output)
+                print(f"  Removed {output}: no raw file contributes to it any more")
         
-        success_count = 0
-        for raw_file in raw_files:
-            raw_file_path = f"{self.raw_data_dir}/{raw_file}"
-            if self.process_raw_usgs_file(raw_file_path):
-                success_count += 1
+        # Outputs depend only on file contents and settings, so files without usable series are recorded too
+        for path, result in results.items():
+            outputs = self.output_files(result['outputs'])
+            if self.columnar:
+                outputs |= {columnar_path(output) for output in outputs}
+            cache.record(path, [output for output in outputs if os.path.exists(output)])
+        for name in removed:
+            cache.forget(name)
+        cache.save()
         
-        print(f"\nProcessed {success_count}/{len(raw_files)} raw files successfully")
+        results = [results[path] for path in raw_file_paths if path in results]
+        success_count = sum(1 for result in results if result['ok'])
+        print(f"\nProcessed {success_count}/{len(results)} raw files successfully")
+        self.print_timing_summary(results, time.perf_counter() - started, workers)
     
-    def update_manifest(self):
-        """Update manifest.json with processed data"""
-        print("Updating manifest with processed USGS data...")
+    def _aggregate_files(self, raw_file_paths, workers):
+        """Aggregate raw files, on a process pool when workers > 1; returns results in input order"""
+        if workers > 1 and len(raw_file_paths) > 1:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(self.quality_breakdown, self.day_bucket, self.rollups, self.columnar)) as executor:
+                return list(executor.map(_aggregate_in_worker, raw_file_paths))
+        return [self.aggregate_raw_usgs_file(path) for path in raw_file_paths]
+    
+    def print_timing_summary(self, results, wall_seconds, workers):
+        """Print per-file aggregation time, slowest first"""
+        print(f"\nPer-file timing ({workers} worker{'s' if workers > 1 else ''}):")
+        for result in sorted(results, key=lambda r: r['seconds'], reverse=True):
+            status = 'ok' if result['ok'] else 'failed'
+            print(f"  {result['seconds']:8.3f}s  {len(result['outputs']):4d} outputs  {status:6s}  {result['file']}")
         
-        manifest_path = f"{self.base_dir}/manifest.json"
+        file_seconds = sum(result['seconds'] for result in results)
+        print(f"  Total: {file_seconds:.3f}s of file time in {wall_seconds:.3f}s wall time")
+    
+    def update_manifest(self, rebuild=False):
+        """Update manifest.json entries for the output files this run touched, or re-index everything"""
+        print("Updating manifest with processed USGS data...")
         
-        with open(manifest_path, 'r') as f:
-            manifest = json.load(f)
+        builder = ManifestBuilder(self.base_dir)
+        if rebuild:
+            builder.rebuild()
+        else:
+            builder.update(self.touched_outputs | {columnar_path(path) for path in self.touched_outputs})
         
-        # Count files in each directory
-        total_files = 0
-        locations_covered = set()
-        years_covered = set()
-        organized = {}
+        if not builder.save():
+            print("  manifest.json unchanged")
+            return
         
-        for data_dir in ["02-watersheds", "03-temperature", "04-quality", "05-flow", "06-stage"]:
-            data_path = f"{self.output_dir}/{data_dir}"
-            if os.path.exists(data_path):
-                files = [f for f in os.listdir(data_path) if f.endswith('.json')]
-                total_files += len(files)
-                
-                # Extract location IDs and years from filenames
-                for filename in files:
-                    if "location-" in filename:
-                        parts = filename.replace(".json", "").split("-")
-                        if len(parts) >= 3:
-                            try:
-                                location_id = int(parts[1])
-                                locations_covered.add(location_id)
-                                
-                                year = int(parts[2])
-                                years_covered.add(year)
-                                
-                                # Build organized structure
-                                if str(location_id) not in organized:
-                                    organized[str(location_id)] = {
-                                        "watershed": f"data/02-watersheds/location-{location_id}.json",
-                                        "temperature": {},
-                                        "flow": {},
-                                        "quality": {},
-                                        "stage": {}
-                                    }
-                                
-                                # Add file to organized structure
-                                if data_dir == "03-temperature":
-                                    organized[str(location_id)]["temperature"][str(year)] = f"data/03-temperature/location-{location_id}-{year}.json"
-                                elif data_dir == "05-flow":
-                                    organized[str(location_id)]["flow"][str(year)] = f"data/05-flow/location-{location_id}-{year}.json"
-                                elif data_dir == "04-quality":
-                                    organized[str(location_id)]["quality"][str(year)] = f"data/04-quality/location-{location_id}-{year}.json"
-                                elif data_dir == "06-stage":
-                                    organized[str(location_id)]["stage"][str(year)] = f"data/06-stage/location-{location_id}-{year}.json"
-                                        
-                            except ValueError:
-                                continue
-        
-        # Update manifest statistics
-        manifest["statistics"]["total_files"] = total_files
-        manifest["statistics"]["locations_covered"] = len(locations_covered)
-        manifest["statistics"]["years_covered"] = sorted(list(years_covered))
-        manifest["last_updated"] = datetime.now().isoformat()
-        manifest["organized"] = organized
-        
-        with open(manifest_path, 'w') as f:
-            json.dump(manifest, f, indent=2)
-        
-        print(f"  Updated manifest.json with {total_files} files, {len(locations_covered)} locations, {len(years_covered)} years")
+        print(f"  Updated manifest.json with {builder.describe()}")
+
+_worker_processor = None
+
+def _init_worker(quality_breakdown, day_bucket, rollups, columnar):
+    """Create the per-process processor used by pool workers"""
+    global _worker_processor
+    _worker_processor = USGSRawDataProcessor(quality_breakdown=quality_breakdown, day_bucket=day_bucket, rollups=rollups,
+                                             columnar=columnar)
+
+def _aggregate_in_worker(raw_file_path):
+    """Aggregate one raw file in a pool worker"""
+    return _worker_processor.aggregate_raw_usgs_file(raw_file_path)
 
 def main():
     """Main processing function"""
+    parser = argparse.ArgumentParser(description="Process downloaded USGS raw data files into AFCA format")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Aggregate raw files on a pool of this many processes (default: 1, serial)")
+    parser.add_argument('--quality-breakdown', action='store_true',
+                        help="Add the per-day fraction of provisional, estimated and revised samples to each record")
+    parser.add_argument('--day-bucket', choices=DAY_BUCKETS, default='alaska',
+                        help="Assign instantaneous values to Alaska standard time days (default, as USGS daily values), "
+                             "the local date NWIS reported, or UTC days")
+    parser.add_argument('--no-rollups', dest='rollups', action='store_false',
+                        help="Only write daily files, skipping the hourly/weekly/monthly/salmon-season rollups in data/07-rollups")
+    parser.add_argument('--columnar', action='store_true',
+                        help="Also write a columnar variant (start, step, parallel value/quality arrays) of every output "
+                             "file as location-<id>-<year>.columnar.json")
+    parser.add_argument('--rebuild', action='store_true',
+                        help="Ignore the build cache, reprocess every raw file and re-index the manifest")
+    args = parser.parse_args()
+    
     print("AFCA USGS Raw Data Processing Script")
     print("====================================")
     
-    processor = USGSRawDataProcessor()
+    processor = USGSRawDataProcessor(quality_breakdown=args.quality_breakdown, day_bucket=args.day_bucket,
+                                     rollups=args.rollups, columnar=args.columnar)
     
     # Process all raw USGS data files
-    processor.process_all_raw_files()
+    processor.process_all_raw_files(workers=max(1, args.workers), rebuild=args.rebuild)
     
     # Update manifest
-    processor.update_manifest()
+    processor.update_manifest(rebuild=args.rebuild)
     
     print("\nUSGS raw data processing complete!")
     print("\nNext steps:")
@@ -12,22 +12,46 @@ import xml.etree.ElementTree as ET
 from datetime import datetime, timedelta
 from pathlib import Path
 import re
+import argparse
+
+from build_cache import BuildCache
+from columnar import columnar_path, to_columnar_document
+from json_writer import write_json_if_changed
+from manifest_builder import ManifestBuilder
+from station_metadata_cache import StationMetadataCache
+from station_registry import get_registry
+from nwis_stream import iter_records, group_by_series
+from series_aggregation import aggregate_daily, primary_statistic, statistic_columns, column_records
 
 def get_working_directory():
     """Return the working directory for local storage"""
     return "."
 
 class WaterDataProcessor:
-    def __init__(self):
+    def __init__(self, day_bucket='alaska', columnar=False):
         self.base_dir = get_working_directory()
         self.output_dir = f"{self.base_dir}/data"
         self.raw_data_dir = f"{self.base_dir}/raw-data"
+        self.research_cache_file = f"{self.raw_data_dir}/research_build_cache.json"
+        self.metadata_cache = StationMetadataCache()
+        self.day_bucket = day_bucket
+        self.columnar = columnar
+        self.touched_outputs = set()
         os.makedirs(self.raw_data_dir, exist_ok=True)
         
     def process_usgs_stream_gauge_data(self, station_id, location_id, location_name, start_date, end_date):
         """Process USGS stream gauge data into AFCA format"""
         print(f"Processing USGS stream gauge data for {location_name} (Station: {station_id})")
         
+        # Only request parameters the station is known to report (from the metadata cache)
+        parameter_codes = ['00060', '00010', '00065']  # Flow, Temperature, Stage
+        available_codes = self.metadata_cache.parameter_codes(station_id)
+        if available_codes is not None:
+            parameter_codes = [code for code in parameter_codes if code in available_codes]
+            if not parameter_codes:
+                print(f"  Station {station_id} reports none of the requested parameters")
+                return False
+        
         # USGS Water Services API endpoint
         base_url = "https://waterservices.usgs.gov/nwis/iv/"
         params = {
@@ -35,168 +59,123 @@ class WaterDataProcessor:
             'sites': station_id,
             'startDT': start_date,
             'endDT': end_date,
-            'parameterCd': '00060,00010,00065',  # Flow, Temperature, Stage
+            'parameterCd': ','.join(parameter_codes),
             'siteStatus': 'all'
         }
         
         try:
-            response = requests.get(base_url, params=params, timeout=30)
+            response = requests.get(base_url, params=params, timeout=30, stream=True)
             response.raise_for_status()
-            data = response.json()
+            response.raw.decode_content = True
             
-            # Parse USGS JSON response
-            if 'value' in data and 'timeSeries' in data['value']:
-                time_series = data['value']['timeSeries']
-                
-                # Extract flow data
-                flow_data = self._extract_usgs_parameter(time_series, '00060', 'Flow')
-                # Extract temperature data
-                temp_data = self._extract_usgs_parameter(time_series, '00010', 'Temperature')
-                # Extract stage data
-                stage_data = self._extract_usgs_parameter(time_series, '00065', 'Stage')
-                
-                # Process and save data
-                self._save_usgs_data(location_id, location_name, 'flow', flow_data)
-                self._save_usgs_data(location_id, location_name, 'temperature', temp_data)
-                self._save_usgs_data(location_id, location_name, 'stage', stage_data)
-                
-                return True
-            else:
+            # Parse the USGS JSON response as a record stream
+            parameter_data = self._extract_usgs_parameters(iter_records(response.raw), {
+                '00060': 'flow',         # Flow
+                '00010': 'temperature',  # Temperature
+                '00065': 'stage'         # Stage
+            })
+            
+            if parameter_data is None:
                 print(f"  No data found for station {station_id}")
                 return False
+            
+            # Process and save data
+            for parameter in ('flow', 'temperature', 'stage'):
+                self._save_usgs_data(location_id, location_name, parameter, parameter_data.get(parameter))
+            
+            return True
                 
         except Exception as e:
             print(f"  Error processing USGS data: {e}")
             return False
     
-    def _extract_usgs_parameter(self, time_series, parameter_code, parameter_name):
-        """Extract specific parameter data from USGS time series"""
-        for series in time_series:
-            if series['variable']['variableCode'][0]['value'] == parameter_code:
-                values = series['values'][0]['value']
-                
-                data_points = []
-                for value in values:
-                    try:
-                        # Parse date and value
-                        date_str = value['dateTime']
-                        value_str = value['value']
-                        qualifiers = value.get('qualifiers', [])
-                        
-                        # Determine quality
-                        quality = 'good'
-                        for qualifier in qualifiers:
-                            if qualifier['qualifierCode'] in ['P', 'e', 'A']:
-                                quality = 'fair'
-                            elif qualifier['qualifierCode'] in ['R', 'S']:
-                                quality = 'poor'
-                        
-                        data_points.append({
-                            'date': date_str[:10],  # YYYY-MM-DD
-                            'value': float(value_str) if value_str != '-999999' else None,
-                            'quality': quality
-                        })
-                    except (ValueError, KeyError) as e:
-                        continue
-                
-                return data_points
+    def _extract_usgs_parameters(self, records, parameter_codes):
+        """Aggregate every time series in a USGS record stream, indexed by parameter and statistic code
+        
+        Returns {parameter: {statistic code: SeriesAggregate}}, or None when the
+        stream held no time series at all.
+        """
+        parameter_data = None
         
-        return []
+        for series, series_records in group_by_series(records):
+            if parameter_data is None:
+                parameter_data = {}
+            
+            parameter = parameter_codes.get(series['parameter'])
+            if parameter is None:
+                continue
+            
+            statistics = parameter_data.setdefault(parameter, {})
+            if series['statistic'] not in statistics:
+                statistics[series['statistic']] = aggregate_daily(series_records, day_bucket=self.day_bucket)
+        
+        return parameter_data
     
-    def _save_usgs_data(self, location_id, location_name, parameter, data_points):
+    def _save_usgs_data(self, location_id, location_name, parameter, aggregates):
         """Save USGS data in AFCA format"""
-        if not data_points:
+        if not aggregates:
             return
         
-        # Group data by year
-        yearly_data = {}
-        for point in data_points:
-            if point['value'] is not None:
-                year = point['date'][:4]
-                if year not in yearly_data:
-                    yearly_data[year] = []
-                yearly_data[year].append(point)
+        # Statistics and years come from the series behind the daily mean column
+        aggregate = aggregates[primary_statistic(aggregates)]
         
         # Save each year's data
-        for year, year_data in yearly_data.items():
+        for year in aggregate.observed_years():
             # Calculate statistics
-            values = [p['value'] for p in year_data if p['value'] is not None]
-            if values:
-                stats = {
-                    'mean': round(sum(values) / len(values), 2),
-                    'min': round(min(values), 2),
-                    'max': round(max(values), 2),
-                    'count': len(values)
-                }
-                
-                # Determine unit and parameter name
-                if parameter == 'flow':
-                    unit = 'ft³/s'
-                    param_name = 'flow'
-                    # Convert to daily data format
-                    daily_data = self._convert_to_daily_data(year_data, 'value', 'flow_cfs')
-                elif parameter == 'temperature':
-                    unit = '°C'
-                    param_name = 'temperature'
-                    daily_data = self._convert_to_daily_data(year_data, 'value', 'temperature_c')
-                elif parameter == 'stage':
-                    unit = 'ft'
-                    param_name = 'stage'
-                    daily_data = self._convert_to_daily_data(year_data, 'value', 'stage_ft')
-                else:
-                    continue
-                
-                # Create AFCA format data
-                afca_data = {
-                    'location_id': location_id,
-                    'location_name': location_name,
-                    'year': int(year),
-                    'parameter': param_name,
-                    'unit': unit,
-                    'data': daily_data,
-                    'statistics': stats,
-                    'source': 'USGS Stream Gauge Network',
-                    'last_updated': datetime.now().isoformat()
-                }
-                
-                # Save to appropriate directory
-                if parameter == 'flow':
-                    output_file = f"{self.output_dir}/05-flow/location-{location_id}-{year}.json"
-                elif parameter == 'temperature':
-                    output_file = f"{self.output_dir}/03-temperature/location-{location_id}-{year}.json"
-                elif parameter == 'stage':
-                    output_file = f"{self.output_dir}/06-stage/location-{location_id}-{year}.json"
-                
-                with open(output_file, 'w') as f:
-                    json.dump(afca_data, f, indent=2)
-                
-                print(f"  Saved {parameter} data for {location_name} {year}: {len(daily_data)} days")
+            stats = aggregate.statistics(year)
+            
+            # Determine unit and parameter name
+            if parameter == 'flow':
+                unit = 'ft³/s'
+                param_name = 'flow'
+                # Convert to daily data format
+                daily_data = self._convert_to_daily_data(aggregates, year, 'flow_cfs')
+            elif parameter == 'temperature':
+                unit = '°C'
+                param_name = 'temperature'
+                daily_data = self._convert_to_daily_data(aggregates, year, 'temperature_c')
+            elif parameter == 'stage':
+                unit = 'ft'
+                param_name = 'stage'
+                daily_data = self._convert_to_daily_data(aggregates, year, 'stage_ft')
+            else:
+                continue
+            
+            # Create AFCA format data
+            afca_data = {
+                'location_id': location_id,
+                'location_name': location_name,
+                'year': year,
+                'parameter': param_name,
+                'unit': unit,
+                'data': daily_data,
+                'statistics': stats,
+                'source': 'USGS Stream Gauge Network',
+                'last_updated': datetime.now().isoformat()
+            }
+            
+            # Save to appropriate directory
+            if parameter == 'flow':
+                output_file = f"{self.output_dir}/05-flow/location-{location_id}-{year}.json"
+            elif parameter == 'temperature':
+                output_file = f"{self.output_dir}/03-temperature/location-{location_id}-{year}.json"
+            elif parameter == 'stage':
+                output_file = f"{self.output_dir}/06-stage/location-{location_id}-{year}.json"
+            
+            self.touched_outputs.add(output_file)
+            if self.columnar:
+                self.touched_outputs.add(columnar_path(output_file))
+                write_json_if_changed(columnar_path(output_file), to_columnar_document(afca_data), indent=None)
+            if not write_json_if_changed(output_file, afca_data):
+                print(f"  Unchanged {parameter} data for {location_name} {year}")
+                continue
+            
+            print(f"  Saved {parameter} data for {location_name} {year}: {len(daily_data)} days")
     
-    def _convert_to_daily_data(self, hourly_data, value_key, output_key):
-        """Convert hourly USGS data to daily averages"""
-        daily_data = {}
-        
-        for point in hourly_data:
-            date = point['date']
-            if date not in daily_data:
-                daily_data[date] = []
-            daily_data[date].append(point)
-        
-        # Calculate daily averages
-        daily_averages = []
-        for date, day_points in daily_data.items():
-            values = [p[value_key] for p in day_points if p[value_key] is not None]
-            if values:
-                avg_value = sum(values) / len(values)
-                quality = 'good' if all(p['quality'] == 'good' for p in day_points) else 'fair'
-                
-                daily_averages.append({
-                    'date': date,
-                    output_key: round(avg_value, 2),
-                    'quality': quality
-                })
-        
-        return sorted(daily_averages, key=lambda x: x['date'])
+    def _convert_to_daily_data(self, aggregates, year, output_key):
+        """Convert one year of a parameter's {statistic code: SeriesAggregate} series to daily mean/max/min records"""
+        # Any qualified point makes the day 'fair'
+        return column_records(statistic_columns(output_key, aggregates), labels=('good', 'fair', 'fair'), year=year)
     
     def process_epa_water_quality_data(self, location_id, location_name, csv_file):
         """Process EPA water quality data from CSV file"""
@@ -248,8 +227,10 @@ class WaterDataProcessor:
                     }
                     
                     output_file = f"{self.output_dir}/04-quality/location-{location_id}-{year}.json"
-                    with open(output_file, 'w') as f:
-                        json.dump(afca_data, f, indent=2)
+                    self.touched_outputs.add(output_file)
+                    if not write_json_if_changed(output_file, afca_data):
+                        print(f"  Unchanged water quality data for {location_name} {year}")
+                        continue
                     
                     print(f"  Saved water quality data for {location_name} {year}: {len(year_data)} records")
                 
@@ -266,8 +247,33 @@ class WaterDataProcessor:
         except (ValueError, TypeError):
             return None
     
+    def process_research_sources(self, pdf_text_dir, location_mapping, rebuild=False):
+        """Process every research paper text file, skipping the stage when no text file or output changed since the last run
+        
+        Text files overwrite each other's outputs, so any change reprocesses
+        them all in sorted order. The USGS stage writes the same files first,
+        so the stage also reruns whenever an output no longer holds what it
+        wrote, and a cached run ends with the same files as a full run.
+        """
+        text_files = [f"{pdf_text_dir}/{f}" for f in sorted(os.listdir(pdf_text_dir)) if f.endswith('.txt')]
+        cache = BuildCache(self.research_cache_file, rebuild=rebuild)
+        if not cache.changed(text_files) and not cache.removed(text_files):
+            print("Research paper text and outputs unchanged since the last run; skipping")
+            return
+        
+        # Outputs are recorded once every text file is written, as later files may overwrite earlier ones
+        outputs = {}
+        for text_file in text_files:
+            outputs[text_file] = self.process_research_paper_data(text_file, location_mapping)
+        for text_file, written in outputs.items():
+            if written is not None:
+                cache.record(text_file, [output for output in written if output])
+        for name in cache.removed(text_files):
+            cache.forget(name)
+        cache.save()
+    
     def process_research_paper_data(self, pdf_text_file, location_mapping):
-        """Process water data extracted from research papers"""
+        """Process water data extracted from research papers; returns the output files written, or None on error"""
         print(f"Processing research paper data from {pdf_text_file}")
         
         try:
@@ -282,20 +288,21 @@ class WaterDataProcessor:
             locations = self._extract_locations_from_text(text, location_mapping)
             
             # Process and save data
+            outputs = []
             for location in locations:
                 location_id = location['id']
                 location_name = location['name']
                 
                 if temp_data:
-                    self._save_research_data(location_id, location_name, 'temperature', temp_data)
+                    outputs.append(self._save_research_data(location_id, location_name, 'temperature', temp_data))
                 if flow_data:
-                    self._save_research_data(location_id, location_name, 'flow', flow_data)
+                    outputs.append(self._save_research_data(location_id, location_name, 'flow', flow_data))
             
-            return True
+            return outputs
             
         except Exception as e:
             print(f"  Error processing research paper data: {e}")
-            return False
+            return None
     
     def _extract_temperature_from_text(self, text):
         """Extract temperature data from research paper text"""
@@ -353,9 +360,9 @@ class WaterDataProcessor:
         return locations
     
     def _save_research_data(self, location_id, location_name, parameter, values):
-        """Save research data in AFCA format"""
+        """Save research data in AFCA format; returns the output file"""
         if not values:
-            return
+            return None
         
         # Calculate statistics
         stats = {
@@ -405,126 +412,68 @@ class WaterDataProcessor:
                 'last_updated': datetime.now().isoformat()
             }
         
-        with open(output_file, 'w') as f:
-            json.dump(afca_data, f, indent=2)
+        self.touched_outputs.add(output_file)
+        if not write_json_if_changed(output_file, afca_data):
+            print(f"  Unchanged research {parameter} data for {location_name}")
+            return output_file
         
         print(f"  Saved research {parameter} data for {location_name}: {len(values)} measurements")
+        return output_file
     
-    def update_manifest(self):
-        """Update manifest.json with processed data"""
+    def update_manifest(self, rebuild=False):
+        """Update manifest.json entries for the output files this run touched, or re-index everything"""
         print("Updating manifest with processed data...")
         
-        manifest_path = f"{self.base_dir}/manifest.json"
-        
-        with open(manifest_path, 'r') as f:
-            manifest = json.load(f)
+        builder = ManifestBuilder(self.base_dir)
+        if rebuild:
+            builder.rebuild()
+        else:
+            builder.update(self.touched_outputs)
         
-        # Count files in each directory
-        total_files = 0
-        locations_covered = set()
-        years_covered = set()
-        organized = {}
-        
-        for data_dir in ["02-watersheds", "03-temperature", "04-quality", "05-flow", "06-stage"]:
-            data_path = f"{self.output_dir}/{data_dir}"
-            if os.path.exists(data_path):
-                files = [f for f in os.listdir(data_path) if f.endswith('.json')]
-                total_files += len(files)
-                
-                # Extract location IDs and years from filenames
-                for filename in files:
-                    if "location-" in filename:
-                        parts = filename.replace(".json", "").split("-")
-                        if len(parts) >= 2:
-                            try:
-                                location_id = int(parts[1])
-                                locations_covered.add(location_id)
-                                
-                                if len(parts) >= 3:
-                                    year = int(parts[2])
-                                    years_covered.add(year)
-                                    
-                                    # Build organized structure
-                                    if str(location_id) not in organized:
-                                        organized[str(location_id)] = {
-                                            "watershed": f"data/02-watersheds/location-{location_id}.json",
-                                            "temperature": {},
-                                            "flow": {},
-                                            "quality": {},
-                                            "stage": {}
-                                        }
-                                    
-                                    # Add file to organized structure
-                                    if data_dir == "03-temperature":
-                                        organized[str(location_id)]["temperature"][str(year)] = f"data/03-temperature/location-{location_id}-{year}.json"
-                                    elif data_dir == "05-flow":
-                                        organized[str(location_id)]["flow"][str(year)] = f"data/05-flow/location-{location_id}-{year}.json"
-                                    elif data_dir == "04-quality":
-                                        organized[str(location_id)]["quality"][str(year)] = f"data/04-quality/location-{location_id}-{year}.json"
-                                    elif data_dir == "06-stage":
-                                        organized[str(location_id)]["stage"][str(year)] = f"data/06-stage/location-{location_id}-{year}.json"
-                                        
-                            except ValueError:
-                                continue
-        
-        # Update manifest statistics
-        manifest["statistics"]["total_files"] = total_files
-        manifest["statistics"]["locations_covered"] = len(locations_covered)
-        manifest["statistics"]["years_covered"] = sorted(list(years_covered))
-        manifest["last_updated"] = datetime.now().isoformat()
-        manifest["organized"] = organized
-        
-        with open(manifest_path, 'w') as f:
-            json.dump(manifest, f, indent=2)
+        if not builder.save():
+            print("  manifest.json unchanged")
+            return
         
-        print(f"  Updated manifest.json with {total_files} files, {len(locations_covered)} locations, {len(years_covered)} years")
+        print(f"  Updated manifest.json with {builder.describe()}")
 
 def main():
     """Main processing function"""
+    parser = argparse.ArgumentParser(description="Convert water data from USGS and research sources into AFCA format")
+    parser.add_argument('--columnar', action='store_true',
+                        help="Also write a columnar variant of every USGS output file as location-<id>-<year>.columnar.json")
+    parser.add_argument('--rebuild', action='store_true',
+                        help="Ignore the build cache, reprocess every research paper text file and re-index the manifest")
+    args = parser.parse_args()
+    
     print("Starting AFCA Water Data Processing Pipeline...")
     
-    processor = WaterDataProcessor()
+    processor = WaterDataProcessor(columnar=args.columnar)
     
-    # Process USGS stream gauge data for Alaska stations
-    alaska_stations = [
-        {"station_id": "15276000", "location_id": 410, "location_name": "Kenai River"},
-        {"station_id": "15290000", "location_id": 411, "location_name": "Russian River"},
-        {"station_id": "15284000", "location_id": 412, "location_name": "Moose River"}
-    ]
+    registry = get_registry(processor.base_dir)
     
-    # Process recent data (2023-2024)
-    for station in alaska_stations:
+    # Process recent data (2023-2024) for every registered Alaska station
+    for station in registry.stations():
         for year in [2023, 2024]:
             start_date = f"{year}-06-01"
             end_date = f"{year}-09-30"
             
             processor.process_usgs_stream_gauge_data(
                 station["station_id"],
-                station["location_id"],
-                station["location_name"],
+                station["afca_location_id"],
+                registry.location_name(station["afca_location_id"]),
                 start_date,
                 end_date
             )
     
     # Process research paper data (if available)
-    location_mapping = {
-        "Kenai River": 410,
-        "Russian River": 411,
-        "Moose River": 412,
-        "Killey River": 413
-    }
+    location_mapping = registry.name_mapping()
     
     pdf_text_dir = f"{processor.base_dir}/pdf-source-materials"
     if os.path.exists(pdf_text_dir):
-        text_files = [f for f in os.listdir(pdf_text_dir) if f.endswith('.txt')]
-        for text_file in text_files:
-            processor.process_research_paper_data(
-                f"{pdf_text_dir}/{text_file}",
-                location_mapping
-            )
+        processor.process_research_sources(pdf_text_dir, location_mapping, rebuild=args.rebuild)
     
     # Update manifest
-    processor.update_manifest()
+    processor.update_manifest(rebuild=args.rebuild)
     
     print("\nWater data processing complete!")
     print("\nNext steps:")
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+AFCA Data Publish Script
+Writes a CDN-ready copy of the dataset: minified JSON with controlled float
+precision, precompressed .gz and .br siblings and a size-budget report. The
+published manifest and shards list the hashes and sizes of the published
+files, and copies whose source is gone are removed
+"""
+
+import os
+import gzip
+import json
+import argparse
+from datetime import datetime
+
+from json_writer import compact_json, read_json, write_bytes_if_changed, write_json_if_changed
+from manifest_builder import payload_entry, SHARD_DIR
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+def get_working_directory():
+    """Return the working directory for local storage"""
+    return "."
+
+class DataPublisher:
+    # Published file types; everything else under data/ is left out
+    PUBLISHED_SUFFIXES = ('.json', '.bin', '.rec')
+
+    def __init__(self, output_dir=None, float_digits=4, file_budget_kb=64, dir_budget_kb=None, growth_warning=0.1):
+        self.base_dir = get_working_directory()
+        self.data_dir = f"{self.base_dir}/data"
+        self.output_dir = output_dir or f"{self.base_dir}/publish"
+        self.report_file = f"{self.output_dir}/size-report.json"
+        self.float_digits = float_digits
+        self.file_budget = file_budget_kb * 1024
+        self.dir_budget = dir_budget_kb * 1024 if dir_budget_kb else None
+        self.growth_warning = growth_warning
+        self.published = {}
+
+    def is_index_file(self, relative_path):
+        """Return True for manifest.json and its shards, whose file entries describe other files"""
+        return relative_path == "manifest.json" or relative_path.startswith(f"{SHARD_DIR}/")
+
+    def source_files(self):
+        """Return the relative paths of every publishable file under data/, then the shards, then manifest.json
+
+        Index files come last so their file entries can describe the
+        published bytes of everything they list.
+        """
+        files = ["manifest.json"] if os.path.exists(f"{self.base_dir}/manifest.json") else []
+        for directory in (f"{self.base_dir}/{SHARD_DIR}", self.data_dir):
+            for root, _, filenames in os.walk(directory):
+                for filename in filenames:
+                    if filename.endswith(self.PUBLISHED_SUFFIXES):
+                        files.append(os.path.relpath(os.path.join(root, filename), self.base_dir))
+        return sorted(files, key=lambda path: (path == "manifest.json", self.is_index_file(path), path))
+
+    def published_index(self, document):
+        """Return a manifest or shard whose file entries, and shard hashes, describe the published files"""
+        document = dict(document)
+        if isinstance(document.get('files'), dict):
+            document['files'] = {path: {**listed, **self.published.get(path, {})}
+                                 for path, listed in document['files'].items()}
+        if isinstance(document.get('locations'), dict):
+            locations = {}
+            for location_id, summary in document['locations'].items():
+                shard = self.published.get(summary.get('manifest'))
+                if shard:
+                    summary = {**summary, 'manifest_hash': shard['hash'], 'manifest_bytes': shard['bytes']}
+                locations[location_id] = summary
+            document['locations'] = locations
+        return document
+
+    def publish_file(self, relative_path):
+        """Publish one file and its compressed siblings; returns its size entry"""
+        source = f"{self.base_dir}/{relative_path}"
+        with open(source, 'rb') as f:
+            raw = f.read()
+
+        if relative_path.endswith('.json'):
+            document = json.loads(raw)
+            if self.is_index_file(relative_path) and isinstance(document, dict):
+                document = self.published_index(document)
+            payload = compact_json(document, self.float_digits).encode('utf-8')
+        else:
+            payload = raw
+        self.published[relative_path] = payload_entry(payload)
+
+        target = f"{self.output_dir}/{relative_path}"
+        changed = write_bytes_if_changed(target, payload)
+
+        # mtime=0 keeps the .gz bytes identical across runs for unchanged payloads
+        gzipped = gzip.compress(payload, compresslevel=9, mtime=0)
+        changed |= write_bytes_if_changed(f"{target}.gz", gzipped)
+
+        entry = {'source': len(raw), 'published': len(payload), 'gzip': len(gzipped)}
+        if brotli is not None:
+            compressed = brotli.compress(payload, quality=11)
+            changed |= write_bytes_if_changed(f"{target}.br", compressed)
+            entry['brotli'] = len(compressed)
+
+        entry['changed'] = changed
+        return entry
+
+    def publish_all(self):
+        """Publish every file and write the size report; returns the report"""
+        print(f"Publishing to {self.output_dir}")
+        if brotli is None:
+            print("  brotli is not installed; skipping .br siblings (pip install brotli)")
+
+        files = {}
+        for relative_path in self.source_files():
+            files[relative_path] = self.publish_file(relative_path)
+        self.prune(files)
+
+        report = self.size_report(files, read_json(self.report_file))
+        write_json_if_changed(self.report_file, report, volatile=('generated',))
+
+        self.print_size_report(report)
+        return report
+
+    def prune(self, relative_paths):
+        """Remove published files, and compressed siblings, whose source no longer exists"""
+        suffixes = ('', '.gz', '.br') if brotli is not None else ('', '.gz')
+        keep = {os.path.normpath(self.report_file)}
+        for relative_path in relative_paths:
+            keep.update(os.path.normpath(f"{self.output_dir}/{relative_path}{suffix}") for suffix in suffixes)
+
+        for root, _, filenames in os.walk(self.output_dir, topdown=False):
+            for filename in filenames:
+                path = os.path.normpath(os.path.join(root, filename))
+                if path not in keep:
+                    os.remove(path)
+                    print(f"  Removed {os.path.relpath(path, self.output_dir)}: no longer published")
+            if os.path.normpath(root) != os.path.normpath(self.output_dir) and not os.listdir(root):
+                os.rmdir(root)
+
+    def transfer_size(self, entry):
+        """Return the bytes a client transfers for a file: its smallest encoding"""
+        return min(size for key, size in entry.items() if key in ('published', 'gzip', 'brotli'))
+
+    def size_report(self, files, previous=None):
+        """Build the per-file and per-directory size report, comparing against the previous report"""
+        previous_files = (previous or {}).get('files', {})
+        directories = {}
+        over_budget = []
+        regressions = []
+
+        for relative_path, entry in files.items():
+            entry['transfer'] = self.transfer_size(entry)
+            before = previous_files.get(relative_path, {}).get('transfer')
+            if before:
+                entry['previous_transfer'] = before
+                if entry['transfer'] > before * (1 + self.growth_warning):
+                    regressions.append(relative_path)
+            if entry['transfer'] > self.file_budget:
+                over_budget.append(relative_path)
+
+            directory = directories.setdefault(os.path.dirname(relative_path) or '.', {
+                'files': 0, 'source': 0, 'published': 0, 'gzip': 0, 'transfer': 0
+            })
+            directory['files'] += 1
+            for key in ('source', 'published', 'gzip', 'transfer'):
+                directory[key] += entry[key]
+            if 'brotli' in entry:
+                directory['brotli'] = directory.get('brotli', 0) + entry['brotli']
+
+        previous_directories = (previous or {}).get('directories', {})
+        for name, directory in directories.items():
+            before = previous_directories.get(name, {}).get('transfer')
+            if before:
+                directory['previous_transfer'] = before
+            if self.dir_budget and directory['transfer'] > self.dir_budget:
+                over_budget.append(f"{name}/")
+
+        totals = {key: sum(directory.get(key, 0) for directory in directories.values())
+                  for key in ('files', 'source', 'published', 'gzip', 'brotli', 'transfer')}
+        return {
+            'generated': datetime.now().isoformat(),
+            'float_digits': self.float_digits,
+            'budgets': {'file_bytes': self.file_budget, 'directory_bytes': self.dir_budget},
+            'totals': totals,
+            'directories': dict(sorted(directories.items())),
+            'files': files,
+            'over_budget': sorted(over_budget),
+            'regressions': sorted(regressions)
+        }
+
+    def print_size_report(self, report):
+        """Print the per-directory size table, budget violations and regressions"""
+        print(f"\n{'Directory':36s} {'Files':>6s} {'Source':>12s} {'Minified':>12s} {'Transfer':>12s} {'Change':>8s}")
+        for name, directory in report['directories'].items():
+            before = directory.get('previous_transfer')
+            change = f"{(directory['transfer'] - before) / before:+.1%}" if before else 'new'
+            print(f"{name:36s} {directory['files']:6d} {directory['source']:12,d} {directory['published']:12,d} "
+                  f"{directory['transfer']:12,d} {change:>8s}")
+
+        totals = report['totals']
+        print(f"{'Total':36s} {totals['files']:6d} {totals['source']:12,d} {totals['published']:12,d} {totals['transfer']:12,d}")
+        if totals['source']:
+            print(f"  Transfer bytes are {totals['transfer'] / totals['source']:.1%} of the source bytes")
+
+        changed = sum(1 for entry in report['files'].values() if entry['changed'])
+        print(f"  {changed} published files changed")
+
+        for path in report['over_budget']:
+            print(f"  ⚠️ Over size budget: {path}")
+        for path in report['regressions']:
+            entry = report['files'][path]
+            print(f"  ⚠️ Grew {entry['transfer'] / entry['previous_transfer'] - 1:.0%}: {path}")
+        print(f"\nSize report saved: {self.report_file}")
+
+def main():
+    """Main publish function"""
+    parser = argparse.ArgumentParser(description="Publish minified, precompressed dataset files for the CDN")
+    parser.add_argument('--output', help="Publish directory (default: ./publish)")
+    parser.add_argument('--float-digits', type=int, default=4,
+                        help="Round every float to this many decimals (default: 4)")
+    parser.add_argument('--file-budget-kb', type=int, default=64,
+                        help="Flag files whose transfer size exceeds this many KB (default: 64)")
+    parser.add_argument('--dir-budget-kb', type=int,
+                        help="Flag directories whose total transfer size exceeds this many KB")
+    parser.add_argument('--growth-warning', type=float, default=0.1,
+                        help="Flag files whose transfer size grew by more than this fraction since the last publish "
+                             "(default: 0.1)")
+    args = parser.parse_args()
+
+    print("AFCA Data Publish")
+    print("=================")
+
+    publisher = DataPublisher(output_dir=args.output, float_digits=args.float_digits, file_budget_kb=args.file_budget_kb,
+                              dir_budget_kb=args.dir_budget_kb, growth_warning=args.growth_warning)
+    publisher.publish_all()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+AFCA Raw Data Archive
+Transparent reading and writing of plain, gzip and zstd compressed raw USGS files
+"""
+
+import os
+import io
+import re
+import gzip
+import json
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSION_SUFFIXES = {
+    'none': '.json',
+    'gzip': '.json.gz',
+    'zstd': '.json.zst'
+}
+
+def raw_suffix(filename):
+    """Return the raw file suffix of filename, or None if it is not a raw JSON file"""
+    for suffix in ('.json.gz', '.json.zst', '.json'):
+        if filename.endswith(suffix):
+            return suffix
+    return None
+
+def is_raw_file(filename):
+    """Return True for plain or compressed JSON files"""
+    return raw_suffix(filename) is not None
+
+def strip_raw_suffix(filename):
+    """Return filename without its .json/.json.gz/.json.zst suffix"""
+    suffix = raw_suffix(filename)
+    return filename[:-len(suffix)] if suffix else filename
+
+# usgs_<kind>_<station>_<start>_<end>: a dated download of the usgs_<kind>_<station> incremental store's data
+DATED_STEM = re.compile(r'^(?P<store>.+)_\d{4}-\d{2}-\d{2}_\d{4}-\d{2}-\d{2}$')
+
+def raw_file_order(filename):
+    """Sort key placing each incremental store after the dated downloads of the same kind and station
+
+    Processing lets later files replace earlier ones for overlapping
+    location-years, so the store, which holds the newest merged data, wins.
+    """
+    stem = strip_raw_suffix(os.path.basename(filename))
+    match = DATED_STEM.match(stem)
+    if match:
+        return (match['store'], 0, stem)
+    return (stem, 1, stem)
+
+def raw_path(stem, compression='gzip'):
+    """Return the archive path for a file stem and compression"""
+    return f"{stem}{COMPRESSION_SUFFIXES[compression]}"
+
+def find_raw_file(stem):
+    """Return the existing archive path for a stem in any compression, or None"""
+    for suffix in COMPRESSION_SUFFIXES.values():
+        if os.path.exists(f"{stem}{suffix}"):
+            return f"{stem}{suffix}"
+    return None
+
+def open_raw(path, mode='rb'):
+    """Open a raw file for binary reading or writing, compressing by file suffix"""
+    if path.endswith('.gz'):
+        return gzip.open(path, mode, compresslevel=6)
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError("zstandard is required for .zst raw files (pip install zstandard)")
+        if 'w' in mode:
+            return zstandard.ZstdCompressor(level=10).stream_writer(open(path, mode))
+        return zstandard.ZstdDecompressor().stream_reader(open(path, mode))
+    return open(path, mode)
+
+def load_raw_json(path):
+    """Load a raw JSON document from a plain or compressed file"""
+    with open_raw(path, 'rb') as f:
+        return json.load(io.TextIOWrapper(f, encoding='utf-8'))
+
+def dump_raw_json(data, path):
+    """Write a raw JSON document compactly, compressed by file suffix"""
+    tmp_path = f"{path}.tmp{os.path.splitext(path)[1]}"
+    with open_raw(tmp_path, 'wb') as f:
+        f.write(json.dumps(data, separators=(',', ':')).encode('utf-8'))
+    os.replace(tmp_path, path)
+
+def write_raw_stream(chunks, path):
+    """Write an iterable of raw response byte chunks to path and return the uncompressed byte count"""
+    total = 0
+    tmp_path = f"{path}.tmp{os.path.splitext(path)[1]}"
+    try:
+        with open_raw(tmp_path, 'wb') as f:
+            for chunk in chunks:
+                if chunk:
+                    f.write(chunk)
+                    total += len(chunk)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+    return total
@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""
+AFCA Series Aggregation
+Vectorized aggregation of NWIS record streams: values are parsed into NumPy
+arrays in chunks and reduced into per-hour or per-day partials (sum, count,
+min, max, worst quality, flagged point counts), which roll up into weekly,
+monthly and salmon-season partials
+"""
+
+from itertools import islice
+from operator import attrgetter
+
+import numpy as np
+
+from nwis_time import bucket_ordinals, SECONDS_PER_HOUR, SECONDS_PER_DAY
+
+CHUNK_SIZE = 65536
+MISSING_VALUE = -999999
+
+QUALITY_GOOD = 0
+QUALITY_FAIR = 1
+QUALITY_POOR = 2
+QUALITY_LABELS = ('good', 'fair', 'poor')
+
+# NWIS qualifier codes as bit flags, so any combination of codes is one small integer
+QUALIFIER_FLAGS = {
+    'P': 1,   # Provisional
+    'e': 2,   # Estimated
+    'A': 4,   # Approved
+    'R': 8,   # Revised
+    'S': 16   # Suspect
+}
+
+# Severity of each flag ('A' is kept as 'fair' for compatibility with earlier output)
+FLAG_SEVERITY = {
+    QUALIFIER_FLAGS['P']: QUALITY_FAIR,
+    QUALIFIER_FLAGS['e']: QUALITY_FAIR,
+    QUALIFIER_FLAGS['A']: QUALITY_FAIR,
+    QUALIFIER_FLAGS['R']: QUALITY_POOR,
+    QUALIFIER_FLAGS['S']: QUALITY_POOR
+}
+
+# Worst severity of every possible flag combination, indexed by bitmask
+SEVERITY_BY_FLAGS = np.array([
+    max((severity for flag, severity in FLAG_SEVERITY.items() if mask & flag), default=QUALITY_GOOD)
+    for mask in range(2 ** len(QUALIFIER_FLAGS))
+], dtype=np.int8)
+
+# Flags counted by the optional per-day quality breakdown
+BREAKDOWN_FLAGS = (
+    ('provisional', QUALIFIER_FLAGS['P']),
+    ('estimated', QUALIFIER_FLAGS['e']),
+    ('revised', QUALIFIER_FLAGS['R'])
+)
+
+# Column accessors for NWISRecord tuples
+DATE_TIME = attrgetter('date_time')
+VALUE = attrgetter('value')
+QUALIFIERS = attrgetter('qualifiers')
+
+class _QualifierTable(dict):
+    """Qualifier tuple -> flag bitmask, filled on first sight of each distinct tuple"""
+    def __missing__(self, qualifiers):
+        flags = 0
+        for code in qualifiers:
+            flags |= QUALIFIER_FLAGS.get(code, 0)
+        self[qualifiers] = flags
+        return flags
+
+_qualifier_table = _QualifierTable()
+
+def qualifier_flags(qualifiers):
+    """Return the flag bitmask of a tuple of qualifier codes"""
+    return _qualifier_table[qualifiers]
+
+def qualifier_severity(qualifiers):
+    """Return the worst quality severity of a tuple of qualifier codes"""
+    return int(SEVERITY_BY_FLAGS[_qualifier_table[qualifiers]])
+
+def _parse_values(values):
+    """Parse value strings to float64; missing or unparseable values become NaN"""
+    try:
+        return np.fromiter(map(float, values), dtype=np.float64, count=len(values))
+    except (ValueError, TypeError):
+        return np.array([_parse_value(value) for value in values], dtype=np.float64)
+
+def _parse_value(value):
+    """Parse one value string, or return NaN"""
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return np.nan
+
+def iter_point_chunks(records, chunk_size=CHUNK_SIZE, day_bucket='alaska', seconds=SECONDS_PER_DAY):
+    """Yield (period ordinals, values, qualifier flags) arrays for valid points, chunk_size records at a time
+
+    Points are assigned to seconds-long periods (days by default) by
+    nwis_time.bucket_ordinals with the given day bucket. Points without a
+    parseable timestamp or value, or flagged with the NWIS missing value
+    (-999999), are dropped.
+    """
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            return
+
+        ordinals, valid = bucket_ordinals(list(map(DATE_TIME, chunk)), day_bucket, seconds)
+        values = _parse_values(list(map(VALUE, chunk)))
+        flags = np.fromiter(map(_qualifier_table.__getitem__, map(QUALIFIERS, chunk)), dtype=np.uint8, count=len(chunk))
+
+        valid &= ~np.isnan(values) & (values != MISSING_VALUE)
+        yield ordinals[valid], values[valid], flags[valid]
+
+# Rollup pyramid levels, finest first. Each level is built from the partials of
+# its source level, never from raw points; weeks straddle months, so months
+# roll up from days rather than weeks.
+RESOLUTIONS = ('hour', 'day', 'week', 'month', 'season')
+ROLLUP_SOURCES = {'day': 'hour', 'week': 'day', 'month': 'day', 'season': 'month'}
+RESOLUTION_SECONDS = {'hour': SECONDS_PER_HOUR, 'day': SECONDS_PER_DAY}
+
+# Months (inclusive) summarized by the salmon-season level: May through September
+SALMON_SEASON_MONTHS = (5, 9)
+
+def _rollup_ordinals(ordinals, resolution):
+    """Map source-level ordinals to resolution ordinals; returns (ordinals, keep mask)"""
+    keep = np.ones(len(ordinals), dtype=bool)
+    if resolution == 'day':
+        return ordinals // 24, keep
+    if resolution == 'week':
+        # Weeks start on Monday; 1970-01-01 was a Thursday
+        return (ordinals + 3) // 7, keep
+    if resolution == 'month':
+        return ordinals.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64), keep
+    if resolution == 'season':
+        month = ordinals % 12 + 1
+        keep = (month >= SALMON_SEASON_MONTHS[0]) & (month <= SALMON_SEASON_MONTHS[1])
+        return ordinals // 12, keep
+    raise ValueError(f"Unknown resolution: {resolution}")
+
+class SeriesAggregate:
+    """Per-period partial aggregates over a contiguous, growable range of period ordinals
+
+    Ordinals count hours, days, weeks (from the Monday before 1970-01-01),
+    months or salmon seasons (years) since 1970, depending on resolution.
+    """
+    def __init__(self, resolution='day'):
+        self.resolution = resolution
+        self.origin = None
+        self.sum = np.zeros(0)
+        self.count = np.zeros(0, dtype=np.int64)
+        self.min = np.zeros(0)
+        self.max = np.zeros(0)
+        self.severity = np.zeros(0, dtype=np.int8)
+        # Per-period point counts for each BREAKDOWN_FLAGS entry
+        self.flag_counts = np.zeros((len(BREAKDOWN_FLAGS), 0), dtype=np.int64)
+
+    def _reserve(self, first, last):
+        """Grow the arrays so they cover ordinals first..last"""
+        if self.origin is None:
+            self.origin = first
+        start = min(self.origin, first)
+        end = max(self.origin + len(self.count), last + 1)
+        if start == self.origin and end == self.origin + len(self.count):
+            return
+
+        offset = self.origin - start
+        size = end - start
+        for name, fill in (('sum', 0.0), ('count', 0), ('min', np.inf), ('max', -np.inf), ('severity', 0)):
+            old = getattr(self, name)
+            grown = np.full(size, fill, dtype=old.dtype)
+            grown[offset:offset + len(old)] = old
+            setattr(self, name, grown)
+        flag_counts = np.zeros((len(BREAKDOWN_FLAGS), size), dtype=np.int64)
+        flag_counts[:, offset:offset + self.flag_counts.shape[1]] = self.flag_counts
+        self.flag_counts = flag_counts
+        self.origin = start
+
+    def add(self, ordinals, values, flags):
+        """Reduce one chunk of points (period ordinals, values, qualifier flags) into the partials"""
+        if len(ordinals) == 0:
+            return
+        self._reserve(int(ordinals.min()), int(ordinals.max()))
+        index = ordinals - self.origin
+        np.add.at(self.sum, index, values)
+        self.count += np.bincount(index, minlength=len(self.count))
+        np.minimum.at(self.min, index, values)
+        np.maximum.at(self.max, index, values)
+        np.maximum.at(self.severity, index, SEVERITY_BY_FLAGS[flags])
+        for row, (_, flag) in enumerate(BREAKDOWN_FLAGS):
+            self.flag_counts[row] += np.bincount(index, weights=(flags & flag) != 0, minlength=len(self.count)).astype(np.int64)
+
+    def rollup(self, resolution):
+        """Return the coarser aggregate for resolution, combined from these partials"""
+        if ROLLUP_SOURCES.get(resolution) != self.resolution:
+            raise ValueError(f"Cannot roll {self.resolution} partials up to {resolution}")
+
+        rolled = SeriesAggregate(resolution)
+        index = self.observed()
+        ordinals, keep = _rollup_ordinals(self.origin + index if len(index) else index, resolution)
+        index, ordinals = index[keep], ordinals[keep]
+        if len(index) == 0:
+            return rolled
+
+        rolled._reserve(int(ordinals.min()), int(ordinals.max()))
+        target = ordinals - rolled.origin
+        np.add.at(rolled.sum, target, self.sum[index])
+        np.add.at(rolled.count, target, self.count[index])
+        np.minimum.at(rolled.min, target, self.min[index])
+        np.maximum.at(rolled.max, target, self.max[index])
+        np.maximum.at(rolled.severity, target, self.severity[index])
+        for row in range(len(BREAKDOWN_FLAGS)):
+            np.add.at(rolled.flag_counts[row], target, self.flag_counts[row, index])
+        return rolled
+
+    def observed(self, year=None):
+        """Return the array indexes of periods holding at least one point, optionally limited to one year"""
+        index = np.flatnonzero(self.count)
+        if year is not None:
+            index = index[self.years()[index] == int(year)]
+        return index
+
+    def ordinals(self):
+        """Return the ordinal of every slot"""
+        return np.arange(len(self.count), dtype=np.int64) + int(self.origin or 0)
+
+    def start_days(self):
+        """Return the day ordinal each slot starts on"""
+        ordinals = self.ordinals()
+        if self.resolution == 'hour':
+            return ordinals // 24
+        if self.resolution == 'day':
+            return ordinals
+        if self.resolution == 'week':
+            return ordinals * 7 - 3
+        if self.resolution == 'month':
+            return ordinals.astype('datetime64[M]').astype('datetime64[D]').astype(np.int64)
+        return ordinals.astype('datetime64[Y]').astype('datetime64[D]').astype(np.int64)
+
+    def dates(self):
+        """Return the datetime64[D] date each slot starts on"""
+        return self.start_days().astype('datetime64[D]')
+
+    def years(self):
+        """Return the calendar year of every slot (weeks belong to the year of their Thursday)"""
+        days = self.start_days()
+        if self.resolution == 'week':
+            days = days + 3
+        return days.astype('datetime64[D]').astype('datetime64[Y]').astype(np.int64) + 1970
+
+    def observed_years(self):
+        """Return the sorted calendar years that hold data"""
+        return [int(year) for year in np.unique(self.years()[self.observed()])]
+
+    def labels(self, index):
+        """Return the period label of each slot in index: YYYY-MM-DDTHH:00, YYYY-MM-DD (weeks: their Monday), YYYY-MM or YYYY"""
+        ordinals = self.ordinals()[index]
+        if self.resolution == 'hour':
+            return [f"{label}:00" for label in ordinals.astype('datetime64[h]').astype(str).tolist()]
+        if self.resolution == 'month':
+            return ordinals.astype('datetime64[M]').astype(str).tolist()
+        if self.resolution == 'season':
+            return ordinals.astype('datetime64[Y]').astype(str).tolist()
+        return self.dates()[index].astype(str).tolist()
+
+    def mean(self):
+        """Return the per-period mean (NaN for empty periods)"""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.sum / self.count
+
+    def statistics(self, year=None):
+        """Return mean/min/max/count over the raw points of the observed periods"""
+        index = self.observed(year)
+        if len(index) == 0:
+            return None
+        count = int(self.count[index].sum())
+        return {
+            'mean': round(float(self.sum[index].sum()) / count, 2),
+            'min': round(float(self.min[index].min()), 2),
+            'max': round(float(self.max[index].max()), 2),
+            'count': count
+        }
+
+    def breakdown(self, index):
+        """Return, for each period in index, the fraction of its points flagged provisional, estimated and revised"""
+        fractions = (self.flag_counts[:, index] / self.count[index]).round(3).tolist()
+        return [
+            {name: fractions[row][i] for row, (name, _) in enumerate(BREAKDOWN_FLAGS)}
+            for i in range(len(index))
+        ]
+
+def aggregate_series(records, resolution='day', chunk_size=CHUNK_SIZE, day_bucket='alaska'):
+    """Aggregate a stream of NWIS records into an hourly or daily SeriesAggregate"""
+    aggregate = SeriesAggregate(resolution)
+    for ordinals, values, flags in iter_point_chunks(records, chunk_size, day_bucket, RESOLUTION_SECONDS[resolution]):
+        aggregate.add(ordinals, values, flags)
+    return aggregate
+
+def aggregate_daily(records, chunk_size=CHUNK_SIZE, day_bucket='alaska'):
+    """Aggregate a stream of NWIS records into a daily SeriesAggregate"""
+    return aggregate_series(records, 'day', chunk_size, day_bucket)
+
+def build_pyramid(aggregate):
+    """Return {resolution: SeriesAggregate} for aggregate's level and every coarser level"""
+    levels = {aggregate.resolution: aggregate}
+    for resolution in RESOLUTIONS[RESOLUTIONS.index(aggregate.resolution) + 1:]:
+        levels[resolution] = levels[ROLLUP_SOURCES[resolution]].rollup(resolution)
+    return levels
+
+# NWIS statistic codes carried by daily value series
+STATISTIC_MAX = '00001'
+STATISTIC_MIN = '00002'
+STATISTIC_MEAN = '00003'
+
+def primary_statistic(aggregates):
+    """Return the statistic code whose series anchors a parameter's columns, years and statistics
+
+    Daily mean series are preferred, then series without a reducing
+    statistic (instantaneous values), then the daily max and min series.
+    """
+    if STATISTIC_MEAN in aggregates:
+        return STATISTIC_MEAN
+    unreduced = [statistic for statistic in aggregates if statistic not in (STATISTIC_MAX, STATISTIC_MIN)]
+    return unreduced[0] if unreduced else sorted(aggregates)[0]
+
+def statistic_columns(output_key, aggregates):
+    """Choose the output columns for one parameter from {statistic code: SeriesAggregate}
+
+    Returns [(column, aggregate, reduction)] with the daily mean under
+    output_key and the daily extremes under output_key + '_max' / '_min'.
+    Daily value series supply each column from their own statistic code;
+    series without one (instantaneous values) supply all three. Without a
+    mean or instantaneous series there is no mean column, and the max (or
+    min) column comes first.
+    """
+    if not aggregates:
+        return []
+
+    statistic = primary_statistic(aggregates)
+    primary = aggregates[statistic]
+    instantaneous = statistic not in (STATISTIC_MAX, STATISTIC_MIN, STATISTIC_MEAN)
+
+    columns = [(output_key, primary, 'mean')] if statistic == STATISTIC_MEAN or instantaneous else []
+    for statistic, suffix in ((STATISTIC_MAX, 'max'), (STATISTIC_MIN, 'min')):
+        if statistic in aggregates:
+            columns.append((f"{output_key}_{suffix}", aggregates[statistic], suffix))
+        elif instantaneous:
+            columns.append((f"{output_key}_{suffix}", primary, suffix))
+    return columns
+
+def summary_column(output_key, records):
+    """Return the column that summarizes a parameter's records: the mean column, else its first extreme column"""
+    for column in (output_key, f"{output_key}_max", f"{output_key}_min"):
+        if any(column in record for record in records):
+            return column
+    return output_key
+
+def column_records(columns, digits=2, labels=QUALITY_LABELS, year=None, breakdown=False, period_key='date'):
+    """Return [{period_key: label, column: value, ..., quality}] merging several (column, aggregate, reduction) columns by period
+
+    Periods are anchored on the first (primary) column: a period missing it is
+    dropped. A day's quality is the worst quality of the points behind any
+    of its columns. With breakdown, each day also carries a
+    'quality_breakdown' of the primary column's flagged point fractions.
+    """
+    days = {}
+    for position, (column, aggregate, reduction) in enumerate(columns):
+        index = aggregate.observed(year)
+        if reduction == 'mean':
+            values = aggregate.mean()[index]
+        else:
+            values = getattr(aggregate, reduction)[index]
+        dates = aggregate.labels(index)
+        breakdowns = aggregate.breakdown(index) if breakdown and position == 0 else None
+        for i, (date, value, severity) in enumerate(zip(dates, values.tolist(), aggregate.severity[index].tolist())):
+            day = days.get(date)
+            if day is None:
+                if position:
+                    continue
+                day = days[date] = [{period_key: date}, severity, breakdowns[i] if breakdowns else None]
+            day[0][column] = round(value, digits)
+            day[1] = max(day[1], severity)
+
+    records = []
+    for date in sorted(days):
+        record, severity, fractions = days[date]
+        record['quality'] = labels[severity]
+        if fractions is not None:
+            record['quality_breakdown'] = fractions
+        records.append(record)
+    return records
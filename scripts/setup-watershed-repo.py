@@ -10,6 +10,9 @@ import requests
 from datetime import datetime
 from pathlib import Path
 
+from json_writer import write_json_if_changed
+from manifest_builder import ManifestBuilder
+
 def get_working_directory():
     """Return the working directory for local storage"""
     return "."
@@ -82,35 +85,17 @@ def create_sample_data_files():
         "last_updated": datetime.now().isoformat()
     }
     
-    with open(f"{base_dir}/data/03-temperature/location-410-2023.json", "w") as f:
-        json.dump(temp_data, f, indent=2)
+    write_json_if_changed(f"{base_dir}/data/03-temperature/location-410-2023.json", temp_data)
     
     print("Created sample temperature data file")
 
 def update_manifest():
-    """Update the manifest.json with current statistics"""
-    manifest_path = f"{get_working_directory()}/manifest.json"
-    
-    with open(manifest_path, "r") as f:
-        manifest = json.load(f)
-    
-    # Count files in each directory
-    base_dir = get_working_directory()
-    total_files = 0
-    
-    for data_dir in ["02-watersheds", "03-temperature", "04-quality", "05-flow"]:
-        data_path = f"{base_dir}/data/{data_dir}"
-        if os.path.exists(data_path):
-            files = [f for f in os.listdir(data_path) if f.endswith('.json')]
-            total_files += len(files)
-    
-    manifest["statistics"]["total_files"] = total_files
-    manifest["last_updated"] = datetime.now().isoformat()
-    
-    with open(manifest_path, "w") as f:
-        json.dump(manifest, f, indent=2)
+    """Re-index manifest.json over the data files"""
+    builder = ManifestBuilder(get_working_directory())
+    builder.rebuild()
+    builder.save()
     
-    print(f"Updated manifest.json with {total_files} total files")
+    print(f"Updated manifest.json with {builder.manifest['statistics']['total_files']} total files")
 
 def main():
     """Main setup function"""
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+AFCA Station Metadata Cache
+On-disk cache of USGS site and parameter lookups keyed by station id
+"""
+
+import os
+import json
+import threading
+from datetime import datetime, timedelta
+
+def get_working_directory():
+    """Return the working directory for local storage"""
+    return "."
+
+class StationMetadataCache:
+    def __init__(self, cache_file=None, ttl_days=30, refresh=False):
+        self.base_dir = get_working_directory()
+        self.cache_file = cache_file or f"{self.base_dir}/raw-data/station_metadata_cache.json"
+        self.gauges_file = f"{self.base_dir}/data/01-master/alaska-stream-gauges.json"
+        self.ttl = timedelta(days=ttl_days)
+        self.refresh = refresh
+        self.lock = threading.Lock()
+        self.cache = self.load()
+
+    def load(self):
+        """Load the cache file and seed static station fields from the gauges master file"""
+        cache = {"version": 1, "stations": {}}
+        if os.path.exists(self.cache_file):
+            with open(self.cache_file, 'r') as f:
+                cache = json.load(f)
+
+        if os.path.exists(self.gauges_file):
+            with open(self.gauges_file, 'r') as f:
+                gauges = json.load(f)
+            for station in gauges.get('stations', []):
+                entry = cache["stations"].setdefault(station['station_id'], {"fetched_at": {}})
+                for field in ('station_name', 'latitude', 'longitude', 'afca_location_id'):
+                    if field in station:
+                        entry.setdefault(field, station[field])
+
+        return cache
+
+    def save(self):
+        """Write the cache file"""
+        os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+        with open(self.cache_file, 'w') as f:
+            json.dump(self.cache, f, indent=2)
+
+    def station(self, station_id):
+        """Return every cached field for a station (possibly stale), or an empty dict"""
+        return self.cache["stations"].get(station_id, {})
+
+    def station_name(self, station_id):
+        """Return the cached station name, or None"""
+        return self.station(station_id).get('station_name')
+
+    def is_fresh(self, station_id, field):
+        """Return True when a fetched field exists and is younger than the TTL"""
+        fetched_at = self.station(station_id).get('fetched_at', {}).get(field)
+        if self.refresh or not fetched_at:
+            return False
+        return datetime.now() - datetime.fromisoformat(fetched_at) < self.ttl
+
+    def put(self, station_id, field, value):
+        """Store a fetched field for a station and persist the cache"""
+        with self.lock:
+            entry = self.cache["stations"].setdefault(station_id, {"fetched_at": {}})
+            entry[field] = value
+            entry.setdefault('fetched_at', {})[field] = datetime.now().isoformat()
+            self.save()
+
+    def lookup(self, station_id, field, fetch):
+        """Return a cached field, calling fetch() when it is missing, expired or a refresh was requested
+
+        If fetch() fails (returns None) a stale cached value is returned, so the
+        pipeline keeps working without network access.
+        """
+        if self.is_fresh(station_id, field):
+            return self.station(station_id)[field]
+
+        value = fetch()
+        if value is not None:
+            self.put(station_id, field, value)
+            return value
+
+        return self.station(station_id).get(field)
+
+    def parameter_codes(self, station_id):
+        """Return the cached NWIS parameter codes for a station, or None if never fetched"""
+        parameters = self.station(station_id).get('parameters')
+        if parameters is None:
+            return None
+        return [parameter['code'] for parameter in parameters]
+
+    def update_gauges_master(self):
+        """Write cached parameter codes back into alaska-stream-gauges.json"""
+        if not os.path.exists(self.gauges_file):
+            return
+
+        with open(self.gauges_file, 'r') as f:
+            gauges = json.load(f)
+
+        changed = False
+        for station in gauges.get('stations', []):
+            codes = self.parameter_codes(station['station_id'])
+            if codes is not None and station.get('usgs_parameter_codes') != sorted(set(codes)):
+                station['usgs_parameter_codes'] = sorted(set(codes))
+                changed = True
+
+        if changed:
+            gauges['last_updated'] = datetime.now().isoformat()
+            with open(self.gauges_file, 'w') as f:
+                json.dump(gauges, f, indent=2)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+AFCA Station Registry
+Single indexed source of USGS station -> AFCA location mappings, loaded once
+from data/01-master/alaska-stream-gauges.json and master-watersheds.json
+"""
+
+import os
+import json
+
+def get_working_directory():
+    """Return the working directory for local storage"""
+    return "."
+
+class StationRegistry:
+    def __init__(self, base_dir=None):
+        self.base_dir = base_dir or get_working_directory()
+        self.master_dir = f"{self.base_dir}/data/01-master"
+        self.by_station_id = {}
+        self.by_location_id = {}
+        self.by_name = {}
+        self.load()
+
+    def load(self):
+        """Build the station, location and name indexes from the master files
+
+        Raises FileNotFoundError when either master file is missing, rather than
+        returning a registry that maps nothing.
+        """
+        gauges_file = f"{self.master_dir}/alaska-stream-gauges.json"
+        watersheds_file = f"{self.master_dir}/master-watersheds.json"
+        for master_file in (gauges_file, watersheds_file):
+            if not os.path.exists(master_file):
+                raise FileNotFoundError(f"Station registry master file not found: {master_file}")
+
+        with open(watersheds_file, 'r') as f:
+            watersheds = json.load(f).get('watersheds', {})
+
+        for watershed in watersheds.values():
+            self._add_location(watershed['location_id'], watershed['location_name'])
+            self.by_location_id[watershed['location_id']]['watershed_name'] = watershed.get('watershed_name')
+
+        with open(gauges_file, 'r') as f:
+            stations = json.load(f).get('stations', [])
+
+        for station in stations:
+            location_id = station['afca_location_id']
+            location = self._add_location(location_id, station.get('location_name', station['station_name']))
+            location['station_ids'].append(station['station_id'])
+            self.by_station_id[station['station_id']] = station
+
+            self.by_name[station['station_name'].lower()] = location_id
+            for alias in station.get('location_aliases', []):
+                self.by_name[alias.lower()] = location_id
+
+    def _add_location(self, location_id, location_name):
+        """Return the location entry for location_id, creating and indexing it on first sight"""
+        location = self.by_location_id.get(location_id)
+        if location is None:
+            location = {
+                'location_id': location_id,
+                'location_name': location_name,
+                'station_ids': []
+            }
+            self.by_location_id[location_id] = location
+            self.by_name[location_name.lower()] = location_id
+        return location
+
+    def stations(self):
+        """Return every registered station"""
+        return list(self.by_station_id.values())
+
+    def station(self, station_id):
+        """Return the station entry for a USGS station id, or None"""
+        return self.by_station_id.get(station_id)
+
+    def location_id_for_station(self, station_id):
+        """Return the AFCA location id for a USGS station id, or None"""
+        station = self.by_station_id.get(station_id)
+        return station['afca_location_id'] if station else None
+
+    def location(self, location_id):
+        """Return the location entry for an AFCA location id, or None"""
+        return self.by_location_id.get(int(location_id))
+
+    def location_name(self, location_id):
+        """Return the AFCA location name for a location id, or None"""
+        location = self.location(location_id)
+        return location['location_name'] if location else None
+
+    def location_id_for_name(self, name):
+        """Return the AFCA location id for a location, station or alias name (case-insensitive), or None"""
+        return self.by_name.get(name.lower())
+
+    def name_mapping(self):
+        """Return {location name: location id} for every location"""
+        return {location['location_name']: location_id for location_id, location in self.by_location_id.items()}
+
+_registries = {}
+
+def get_registry(base_dir=None):
+    """Return the shared registry for base_dir, loading the master files only once"""
+    base_dir = base_dir or get_working_directory()
+    if base_dir not in _registries:
+        _registries[base_dir] = StationRegistry(base_dir)
+    return _registries[base_dir]
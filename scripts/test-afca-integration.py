@@ -5,11 +5,32 @@ Tests water data integration with AFCA app format
 """
 
 import os
+import gzip
 import json
+import time
+import tempfile
+import importlib.util
+import threading
 import requests
-from datetime import datetime
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 
+from binary_series import encode_records, read_record_header, record_range, RECORD_HEADER, RECORD_SUFFIX
+from columnar import (COLUMNAR_SUFFIX, columnar_errors, columnar_path, period_index, period_label, to_columnar_document,
+                      to_row_document)
+from json_writer import compact_json
+from location_bundles import build_bundle, is_bundle, ALL_YEARS, PARAMETER_DIRS
+from manifest_builder import changed_files, load_manifest
+from nwis_client import NWISClient, RequestScheduler
+from nwis_stream import NWISRecord
+from series_aggregation import aggregate_series, column_records, statistic_columns, STATISTIC_MAX, STATISTIC_MEAN, STATISTIC_MIN
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
 def get_working_directory():
     """Return the working directory for local storage"""
     return "."
@@ -37,8 +58,9 @@ class AFCAIntegrationTester:
             with open(manifest_path, 'r') as f:
                 manifest = json.load(f)
             
-            # Check required fields
-            required_fields = ['version', 'dataset_name', 'organized', 'statistics']
+            # Check required fields; a sharded manifest keeps its organized index in per-location shards
+            required_fields = ['version', 'dataset_name', 'statistics']
+            required_fields.append('organized' if 'organized' in manifest or 'locations' not in manifest else 'locations')
             for field in required_fields:
                 if field not in manifest:
                     self.test_results["errors"].append(f"Manifest missing field: {field}")
@@ -46,11 +68,36 @@ class AFCAIntegrationTester:
                     return False
             
             # Check organized structure
-            if not isinstance(manifest['organized'], dict):
+            full_manifest = load_manifest(self.base_dir)
+            organized = full_manifest['organized']
+            if not isinstance(organized, dict):
                 self.test_results["errors"].append("Manifest organized field must be a dictionary")
                 self.test_results["tests_failed"] += 1
                 return False
             
+            # Location summaries must agree with the entries they summarize
+            for location_id, summary in manifest.get('locations', {}).items():
+                if not organized.get(location_id):
+                    self.test_results["errors"].append(f"Manifest location {location_id} has no organized entry or shard")
+                    self.test_results["tests_failed"] += 1
+                    return False
+                years = sorted({int(year) for parameter in PARAMETER_DIRS for year in organized[location_id].get(parameter, {})})
+                if summary['years'] != years:
+                    self.test_results["errors"].append(f"Manifest location {location_id} summary years {summary['years']} != {years}")
+                    self.test_results["tests_failed"] += 1
+                    return False
+            
+            # Listed hashes and sizes are what clients validate their caches against
+            if organized and not full_manifest.get('files'):
+                self.test_results["errors"].append("Manifest lists no file hashes; rerun scripts/build-manifest.py")
+                self.test_results["tests_failed"] += 1
+                return False
+            stale = changed_files(full_manifest, self.base_dir)
+            if stale:
+                self.test_results["errors"].append(f"Manifest hashes out of date for {len(stale)} files, e.g. {stale[0]}")
+                self.test_results["tests_failed"] += 1
+                return False
+            
             print("  ✅ Manifest loading test passed")
             self.test_results["tests_passed"] += 1
             return True
@@ -121,10 +168,8 @@ class AFCAIntegrationTester:
         self.test_results["tests_run"] += 1
         
         try:
-            # Load manifest
-            manifest_path = f"{self.base_dir}/manifest.json"
-            with open(manifest_path, 'r') as f:
-                manifest = json.load(f)
+            # Load manifest, with any per-location shards merged in
+            manifest = load_manifest(self.base_dir)
             
             # Test location data access pattern
             location_id = "410"
@@ -227,6 +272,26 @@ class AFCAIntegrationTester:
             watershed_url = f"{base_url}/data/02-watersheds/location-410.json"
             print(f"  Watershed URL: {watershed_url}")
             
+            # Every path the manifest hands to clients must exist, or the CDN answers 404
+            manifest = load_manifest(self.base_dir)
+            paths = []
+            pending = [manifest.get('organized', {})]
+            while pending:
+                node = pending.pop()
+                for value in node.values():
+                    if isinstance(value, dict):
+                        pending.append(value)
+                    elif isinstance(value, str):
+                        paths.append(value)
+            missing = [path for path in paths if not os.path.exists(f"{self.base_dir}/{path}")]
+            for path in missing:
+                self.test_results["warnings"].append(f"Manifest path not found locally: {path}")
+            print(f"  {len(paths) - len(missing)}/{len(paths)} manifest paths resolve")
+            
+            if not self.check_published_artifacts():
+                self.test_results["tests_failed"] += 1
+                return False
+            
             print("  ✅ GitHub CDN compatibility test passed")
             self.test_results["tests_passed"] += 1
             return True
@@ -236,6 +301,650 @@ class AFCAIntegrationTester:
             self.test_results["tests_failed"] += 1
             return False
     
+    def check_published_artifacts(self):
+        """Check publish-data.py output: minified JSON matching its source, .gz/.br siblings that decode to it and
+        a published manifest whose hashes and sizes describe the published files"""
+        publish_dir = f"{self.base_dir}/publish"
+        report = None
+        if os.path.exists(f"{publish_dir}/size-report.json"):
+            with open(f"{publish_dir}/size-report.json", 'r') as f:
+                report = json.load(f)
+        if report is None:
+            self.test_results["warnings"].append("No published artifacts; run scripts/publish-data.py before deploying")
+            print("  ⚠️ No published artifacts found")
+            return True
+        
+        for relative_path in ["manifest.json", "data/03-temperature/location-410-2023.json"]:
+            published_file = f"{publish_dir}/{relative_path}"
+            if relative_path not in report['files'] or not os.path.exists(published_file):
+                continue
+            
+            with open(published_file, 'rb') as f:
+                published = f.read()
+            with open(f"{self.base_dir}/{relative_path}", 'r') as f:
+                source = json.load(f)
+            
+            # The published manifest swaps in the published files' hashes, so only its index is compared
+            if relative_path == "manifest.json":
+                stale = load_manifest(publish_dir)['organized'] != load_manifest(self.base_dir)['organized']
+            else:
+                stale = published != compact_json(source, report['float_digits']).encode('utf-8')
+            if stale:
+                self.test_results["errors"].append(f"Published {relative_path} is stale or not minified; rerun publish-data.py")
+                return False
+            
+            with gzip.open(f"{published_file}.gz", 'rb') as f:
+                if f.read() != published:
+                    self.test_results["errors"].append(f"Published {relative_path}.gz does not match {relative_path}")
+                    return False
+            
+            if brotli is not None and os.path.exists(f"{published_file}.br"):
+                with open(f"{published_file}.br", 'rb') as f:
+                    if brotli.decompress(f.read()) != published:
+                        self.test_results["errors"].append(f"Published {relative_path}.br does not match {relative_path}")
+                        return False
+        
+        # Clients validate their cached copies of published files against the published manifest
+        changed = changed_files(load_manifest(publish_dir), publish_dir)
+        if changed:
+            self.test_results["errors"].append(f"Published manifest hashes do not match {len(changed)} published files, "
+                                               f"e.g. {changed[0]}; rerun publish-data.py")
+            return False
+        
+        for path in report.get('over_budget', []):
+            self.test_results["warnings"].append(f"Over size budget: {path}")
+        for path in report.get('regressions', []):
+            self.test_results["warnings"].append(f"Transfer size regression: {path}")
+        
+        totals = report['totals']
+        print(f"  Published transfer: {totals['transfer']:,} of {totals['source']:,} source bytes "
+              f"({totals['transfer'] / max(totals['source'], 1):.1%})")
+        return True
+    
+    def test_concurrent_downloader(self):
+        """Test the pooled concurrent NWIS client against a local stand-in server"""
+        print("Testing concurrent downloader against local stand-in server...")
+        self.test_results["tests_run"] += 1
+        
+        state = {"active": 0, "peak": 0, "ports": set()}
+        lock = threading.Lock()
+        body = json.dumps({"value": {"timeSeries": []}}).encode()
+        
+        class StandInNWISHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            
+            def do_GET(self):
+                with lock:
+                    state["active"] += 1
+                    state["peak"] = max(state["peak"], state["active"])
+                    state["ports"].add(self.client_address[1])
+                time.sleep(0.05)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                with lock:
+                    state["active"] -= 1
+            
+            def log_message(self, format, *args):
+                pass
+        
+        server = ThreadingHTTPServer(("127.0.0.1", 0), StandInNWISHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_address[1]}/nwis"
+        
+        try:
+            max_in_flight = 4
+            client = NWISClient(max_in_flight=max_in_flight)
+            tasks = [(client.get, (f"{base_url}/dv", {"sites": str(15276000 + i)})) for i in range(24)]
+            responses = client.run_tasks(tasks)
+            summary = client.summarize()
+            client.close()
+            
+            if any(r is None or r.status_code != 200 for r in responses):
+                self.test_results["errors"].append("Concurrent downloader: not every request succeeded")
+                self.test_results["tests_failed"] += 1
+                return False
+            
+            if state["peak"] > max_in_flight:
+                self.test_results["errors"].append(f"Concurrent downloader exceeded max in flight: {state['peak']} > {max_in_flight}")
+                self.test_results["tests_failed"] += 1
+                return False
+            
+            if len(state["ports"]) > max_in_flight:
+                self.test_results["errors"].append(f"Concurrent downloader opened {len(state['ports'])} connections for {max_in_flight} workers")
+                self.test_results["tests_failed"] += 1
+                return False
+            
+            if summary["requests"] != len(tasks) or summary["total_bytes"] != len(body) * len(tasks):
+                self.test_results["errors"].append("Concurrent downloader request statistics are incomplete")
+                self.test_results["tests_failed"] += 1
+                return False
+            
+            print(f"  Peak in flight: {state['peak']}, connections: {len(state['ports'])}, mean latency: {summary['latency_s']['mean']}s")
+            print("  ✅ Concurrent downloader test passed")
+            self.test_results["tests_passed"] += 1
+            return True
+            
+        except Exception as e:
+            self.test_results["errors"].append(f"Concurrent downloader test error: {e}")
+            self.test_results["tests_failed"] += 1
+            return False
+        finally:
+            server.shutdown()
+            server.server_close()
+    
+    def test_request_scheduler(self):
+        """Test request retries, interrupted-body retries, the total deadline and throttling against a local stand-in server"""
+        print("Testing request scheduler against local stand-in server...")
+        self.test_results["tests_run"] += 1
+        
+        attempts = {}
+        lock = threading.Lock()
+        body = json.dumps({"value": {"timeSeries": [{"name": "USGS:15266300:00060:00003"}]}}).encode()
+        
+        class FlakyNWISHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            
+            def send_chunk(self, chunk):
+                self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+                self.wfile.flush()
+            
+            def do_GET(self):
+                path = self.path.split("?")[0]
+                with lock:
+                    attempt = attempts[path] = attempts.get(path, 0) + 1
+                
+                if path == "/unavailable" and attempt <= 2:
+                    # Two 503s before the real response
+                    self.send_response(503)
+                    self.send_header("Retry-After", "0")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                if path == "/interrupted" and attempt == 1:
+                    # Half the body, then the connection drops mid-stream
+                    self.send_chunk(body[:len(body) // 2])
+                    self.close_connection = True
+                    return
+                if path == "/slow":
+                    # Each read arrives well within the socket timeout, but the whole body takes seconds
+                    try:
+                        for _ in range(20):
+                            self.send_chunk(b" ")
+                            time.sleep(0.1)
+                    except (BrokenPipeError, ConnectionResetError):
+                        # The client gave up at its deadline
+                        self.close_connection = True
+                        return
+                self.send_chunk(body)
+                self.wfile.write(b"0\r\n\r\n")
+            
+            def log_message(self, format, *args):
+                pass
+        
+        server = ThreadingHTTPServer(("127.0.0.1", 0), FlakyNWISHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+        client = NWISClient(max_in_flight=2)
+        
+        try:
+            scheduler = RequestScheduler(client, requests_per_second=1000, burst=100, max_retries=3, base_delay=0.01, deadline=5)
+            
+            # Retryable status codes are retried until the real response arrives
+            response = scheduler.get(f"{base_url}/unavailable")
+            if response.status_code != 200 or response.json() != json.loads(body) or attempts["/unavailable"] != 3:
+                self.test_results["errors"].append(f"Request scheduler did not retry 503s: {attempts.get('/unavailable')} attempts")
+                self.test_results["tests_failed"] += 1
+                return False
+            
+            # A body interrupted mid-stream is retried and leaves only the complete file
+            with tempfile.TemporaryDirectory() as stream_dir:
+                stream_file = f"{stream_dir}/usgs_daily_15266300.json"
+                scheduler.get(f"{base_url}/interrupted", stream_to=stream_file)
+                with open(stream_file, 'rb') as f:
+                    streamed = f.read()
+                leftovers = [name for name in os.listdir(stream_dir) if name != os.path.basename(stream_file)]
+            if streamed != body or attempts["/interrupted"] != 2 or leftovers:
+                self.test_results["errors"].append(f"Request scheduler did not retry an interrupted body cleanly: {leftovers}")
+                self.test_results["tests_failed"] += 1
+                return False
+            
+            if scheduler.summarize()["retries"] != 3:
+                self.test_results["errors"].append(f"Request scheduler counted {scheduler.summarize()['retries']} retries, expected 3")
+                self.test_results["tests_failed"] += 1
+                return False
+            
+            # The deadline bounds the whole request, not each socket read
+            deadline_scheduler = RequestScheduler(client, deadline=0.5)
+            started = time.monotonic()
+            try:
+                deadline_scheduler.get(f"{base_url}/slow", timeout=60)
+                timed_out = False
+            except TimeoutError:
+                timed_out = True
+            elapsed = time.monotonic() - started
+            if not timed_out or elapsed > 1.5 or deadline_scheduler.summarize()["deadline_exceeded"] != 1:
+                self.test_results["errors"].append(f"Request deadline not enforced: request ran {elapsed:.2f}s")
+                self.test_results["tests_failed"] += 1
+                return False
+            
+            # A one-token bucket refilling at 20/s spaces five requests over at least 0.2s
+            throttled = RequestScheduler(client, requests_per_second=20, burst=1)
+            started = time.monotonic()
+            for _ in range(5):
+                throttled.get(f"{base_url}/ok")
+            elapsed = time.monotonic() - started
+            if elapsed < 0.18 or throttled.summarize()["throttle_wait_s"] <= 0:
+                self.test_results["errors"].append(f"Token bucket did not throttle: 5 requests in {elapsed:.2f}s")
+                self.test_results["tests_failed"] += 1
+                return False
+            
+            print(f"  3 retries recovered, deadline enforced, 5 throttled requests in {elapsed:.2f}s")
+            print("  ✅ Request scheduler test passed")
+            self.test_results["tests_passed"] += 1
+            return True
+            
+        except Exception as e:
+            self.test_results["errors"].append(f"Request scheduler test error: {e}")
+            self.test_results["tests_failed"] += 1
+            return False
+        finally:
+            client.close()
+            server.shutdown()
+            server.server_close()
+    
+    def test_incremental_watermarks(self):
+        """Test that concurrent incremental downloads keep the watermark file whole and correct"""
+        print("Testing concurrent incremental downloads...")
+        self.test_results["tests_run"] += 1
+        
+        spec = importlib.util.spec_from_file_location("download_usgs_data", Path(__file__).parent / "download-usgs-data.py")
+        download_usgs_data = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(download_usgs_data)
+        
+        station_ids = [str(15276000 + i) for i in range(8)]
+        # Stage stops reporting five days before the other parameters
+        lag_days = {"00065": 5}
+        starts = {}
+        starts_lock = threading.Lock()
+        
+        def fake_fetch(service, sites, start_date, end_date, parameters, timeout=60):
+            with starts_lock:
+                for code in parameters:
+                    starts.setdefault((sites[0], code), []).append(start_date)
+            time.sleep(0.01)
+            end = datetime.strptime(end_date, "%Y-%m-%d")
+            series = []
+            for code in parameters:
+                last = end - timedelta(days=lag_days.get(code, 0))
+                day = datetime.strptime(start_date, "%Y-%m-%d")
+                values = []
+                while day <= last:
+                    values.append({"value": "1.0", "qualifiers": ["P"], "dateTime": day.strftime("%Y-%m-%dT00:00:00.000-09:00")})
+                    day += timedelta(days=1)
+                series.append({"name": f"USGS:{sites[0]}:{code}:00003",
+                               "variable": {"variableCode": [{"value": code}]},
+                               "values": [{"value": values}]})
+            return {"value": {"timeSeries": series}}
+        
+        try:
+            with tempfile.TemporaryDirectory() as tmp:
+                downloader = download_usgs_data.USGSDataDownloader(max_in_flight=6)
+                downloader.raw_data_dir = tmp
+                downloader.watermarks_file = f"{tmp}/download_watermarks.json"
+                downloader.fetch_time_series = fake_fetch
+                
+                for end_date in ("2024-06-01", "2024-06-20"):
+                    results = downloader.download_stations_incremental(station_ids, end_date)
+                    if downloader.failed_requests or any(result is None for result in results):
+                        errors = sorted({request["error"] for request in downloader.failed_requests})
+                        self.test_results["errors"].append(f"Concurrent incremental download failed: {errors}")
+                        self.test_results["tests_failed"] += 1
+                        return False
+                downloader.client.close()
+                
+                with open(downloader.watermarks_file) as f:
+                    watermarks = json.load(f)
+                leftovers = [name for name in os.listdir(tmp) if ".tmp" in name]
+                if leftovers:
+                    self.test_results["errors"].append(f"Watermark writes left temporary files: {leftovers}")
+                    self.test_results["tests_failed"] += 1
+                    return False
+                
+                for kind, (_, parameters) in download_usgs_data.DOWNLOAD_KINDS.items():
+                    for station_id in station_ids:
+                        for code in parameters:
+                            expected = (datetime(2024, 6, 20) - timedelta(days=lag_days.get(code, 0))).strftime("%Y-%m-%d")
+                            mark = watermarks.get(kind, {}).get(station_id, {}).get(code, "")
+                            if mark[:10] != expected:
+                                self.test_results["errors"].append(f"Watermark {kind}/{station_id}/{code} is {mark or 'missing'}, expected {expected}")
+                                self.test_results["tests_failed"] += 1
+                                return False
+                
+                # The second run resumes every parameter from its own watermark
+                for station_id in station_ids:
+                    for code, lag in (("00060", 0), ("00065", 5)):
+                        resumed = starts[(station_id, code)][-1]
+                        expected = (datetime(2024, 6, 1) - timedelta(days=lag)).strftime("%Y-%m-%d")
+                        if resumed != expected:
+                            self.test_results["errors"].append(f"Station {station_id} {code} resumed from {resumed}, expected {expected}")
+                            self.test_results["tests_failed"] += 1
+                            return False
+            
+            print("  ✅ Incremental watermarks test passed")
+            self.test_results["tests_passed"] += 1
+            return True
+            
+        except Exception as e:
+            self.test_results["errors"].append(f"Incremental watermarks test error: {e}")
+            self.test_results["tests_failed"] += 1
+            return False
+    
+    def test_byte_range_records(self):
+        """Test partial reads of a fixed-width records file through a local Range-aware server"""
+        print("Testing byte-range records against local Range-aware server...")
+        self.test_results["tests_run"] += 1
+        
+        # Serve an exported records file; without any, encode one row file in memory
+        files = {}
+        for root, _, filenames in os.walk(f"{self.data_dir}/08-binary"):
+            for filename in sorted(filenames):
+                if filename.endswith(RECORD_SUFFIX):
+                    with open(os.path.join(root, filename), 'rb') as f:
+                        files = {"/series.rec": f.read()}
+                    break
+            if files:
+                break
+        
+        if not files:
+            row_file = f"{self.data_dir}/05-flow/location-410-2023.json"
+            if not os.path.exists(row_file):
+                self.test_results["warnings"].append("No series file available for the byte-range records test")
+                print("  ⚠️ Byte-range records test skipped: no data files")
+                self.test_results["tests_passed"] += 1
+                return True
+            with open(row_file, 'r') as f:
+                header, data = encode_records(json.load(f))
+            files = {"/series.rec": data}
+        
+        served = {"bytes": 0}
+        
+        class RangeHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            
+            def do_GET(self):
+                body = files.get(self.path)
+                if body is None:
+                    self.send_error(404)
+                    return
+                
+                status = 200
+                first, last = 0, len(body) - 1
+                requested = self.headers.get("Range", "")
+                if requested.startswith("bytes="):
+                    start, _, end = requested[len("bytes="):].partition("-")
+                    first = int(start)
+                    last = min(int(end), len(body) - 1) if end else len(body) - 1
+                    if first > last:
+                        self.send_response(416)
+                        self.send_header("Content-Range", f"bytes */{len(body)}")
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                    status = 206
+                
+                chunk = body[first:last + 1]
+                self.send_response(status)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Accept-Ranges", "bytes")
+                if status == 206:
+                    self.send_header("Content-Range", f"bytes {first}-{last}/{len(body)}")
+                self.send_header("Content-Length", str(len(chunk)))
+                self.end_headers()
+                self.wfile.write(chunk)
+                served["bytes"] += len(chunk)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        server = ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}/series.rec"
+        
+        try:
+            data = files["/series.rec"]
+            with requests.Session() as session:
+                # The fixed header alone locates every record
+                response = session.get(url, headers={"Range": f"bytes=0-{RECORD_HEADER.size - 1}"})
+                if response.status_code != 206 or len(response.content) != RECORD_HEADER.size:
+                    self.test_results["errors"].append(f"Range request for the records header returned {response.status_code}")
+                    self.test_results["tests_failed"] += 1
+                    return False
+                header = {**read_record_header(response.content), 'header_bytes': RECORD_HEADER.size}
+                
+                # A window of up to a week, starting a week in or halfway through shorter series
+                offset = min(7, header['length'] // 2)
+                count = min(7, header['length'] - offset)
+                first = period_label(header['start'], offset, header['step'])
+                last = period_label(header['start'], offset + count - 1, header['step'])
+                first_record, first_byte, last_byte = record_range(header, first, last)
+                response = session.get(url, headers={"Range": f"bytes={first_byte}-{last_byte}"})
+                if response.status_code != 206 or response.content != data[first_byte:last_byte + 1]:
+                    self.test_results["errors"].append(f"Range request for {first}..{last} returned the wrong bytes")
+                    self.test_results["tests_failed"] += 1
+                    return False
+                
+                if first_record != offset or len(response.content) != count * header['record_bytes']:
+                    self.test_results["errors"].append(f"Record range for {first}..{last} starts at record {first_record}")
+                    self.test_results["tests_failed"] += 1
+                    return False
+                
+                response = session.get(url, headers={"Range": f"bytes={len(data)}-"})
+                if response.status_code != 416:
+                    self.test_results["errors"].append("Range request past the end of the records file was not rejected")
+                    self.test_results["tests_failed"] += 1
+                    return False
+            
+            print(f"  {first}..{last}: {served['bytes']:,} of {len(data):,} bytes transferred")
+            print("  ✅ Byte-range records test passed")
+            self.test_results["tests_passed"] += 1
+            return True
+            
+        except Exception as e:
+            self.test_results["errors"].append(f"Byte-range records test error: {e}")
+            self.test_results["tests_failed"] += 1
+            return False
+        finally:
+            server.shutdown()
+            server.server_close()
+    
+    def test_columnar_format(self):
+        """Test that columnar variants expand back to their row files"""
+        print("Testing columnar series format...")
+        self.test_results["tests_run"] += 1
+        
+        try:
+            # Weeks run Monday through Sunday: 2023-06-05 is a Monday, 2023-06-11 its Sunday
+            week = [period_index(f"2023-06-{day:02d}", 'P1W') for day in (4, 5, 11, 12)]
+            if week[1] != week[2] or week[0] != week[1] - 1 or week[3] != week[1] + 1:
+                self.test_results["errors"].append(f"Weekly period indexes {week} do not run Monday through Sunday")
+                self.test_results["tests_failed"] += 1
+                return False
+            
+            # Pair every row file that has a columnar variant; without any, convert one row file in memory
+            pairs = []
+            for root, _, files in os.walk(self.data_dir):
+                for filename in sorted(files):
+                    if filename.endswith(COLUMNAR_SUFFIX):
+                        columnar_file = os.path.join(root, filename)
+                        row_file = columnar_file[:-len(COLUMNAR_SUFFIX)] + '.json'
+                        if os.path.exists(row_file):
+                            pairs.append((row_file, columnar_file))
+            
+            if not pairs:
+                row_file = f"{self.data_dir}/05-flow/location-410-2023.json"
+                if not os.path.exists(row_file):
+                    self.test_results["warnings"].append("No row data file available for the columnar format test")
+                    print("  ⚠️ Columnar format test skipped: no data files")
+                    self.test_results["tests_passed"] += 1
+                    return True
+                pairs.append((row_file, None))
+            
+            row_bytes = 0
+            columnar_bytes = 0
+            for row_file, columnar_file in pairs:
+                with open(row_file, 'r') as f:
+                    row_text = f.read()
+                rows = json.loads(row_text)
+                if columnar_file:
+                    with open(columnar_file, 'r') as f:
+                        columnar_text = f.read()
+                else:
+                    columnar_text = json.dumps(to_columnar_document(rows), separators=(',', ':'))
+                columnar = json.loads(columnar_text)
+                
+                errors = columnar_errors(columnar.get('columns', {}))
+                if errors:
+                    self.test_results["errors"].append(f"Columnar file {columnar_file or columnar_path(row_file)}: {errors[0]}")
+                    self.test_results["tests_failed"] += 1
+                    return False
+                
+                if to_row_document(columnar).get('data') != rows.get('data'):
+                    self.test_results["errors"].append(f"Columnar data does not match {row_file}")
+                    self.test_results["tests_failed"] += 1
+                    return False
+                
+                row_bytes += len(row_text.encode('utf-8'))
+                columnar_bytes += len(columnar_text.encode('utf-8'))
+            
+            print(f"  {len(pairs)} file(s): {row_bytes:,} row bytes vs {columnar_bytes:,} columnar bytes "
+                  f"({row_bytes / max(columnar_bytes, 1):.1f}x smaller)")
+            print("  ✅ Columnar format test passed")
+            self.test_results["tests_passed"] += 1
+            return True
+            
+        except Exception as e:
+            self.test_results["errors"].append(f"Columnar format test error: {e}")
+            self.test_results["tests_failed"] += 1
+            return False
+    
+    def test_statistic_columns(self):
+        """Test that daily max/min series never fill the mean column"""
+        print("Testing daily statistic columns...")
+        self.test_results["tests_run"] += 1
+        
+        try:
+            def daily_series(statistic, values):
+                records = [NWISRecord('15266300', '00010', statistic, f"2023-06-0{day}T00:00:00.000-09:00", str(value), ('A',), None)
+                           for day, value in enumerate(values, start=1)]
+                return aggregate_series(records)
+            
+            maxima = daily_series(STATISTIC_MAX, [12.5, 13.0, 14.5])
+            minima = daily_series(STATISTIC_MIN, [8.0, 8.5, 9.0])
+            means = daily_series(STATISTIC_MEAN, [10.0, 10.5, 11.5])
+            
+            # Extremes only: no mean column, max first
+            columns = [column for column, _, _ in statistic_columns('temperature_c', {STATISTIC_MAX: maxima, STATISTIC_MIN: minima})]
+            records = column_records(statistic_columns('temperature_c', {STATISTIC_MAX: maxima, STATISTIC_MIN: minima}))
+            if columns != ['temperature_c_max', 'temperature_c_min'] or any('temperature_c' in record for record in records):
+                self.test_results["errors"].append(f"Max/min-only daily series produced columns {columns}")
+                self.test_results["tests_failed"] += 1
+                return False
+            if [record['temperature_c_max'] for record in records] != [12.5, 13.0, 14.5]:
+                self.test_results["errors"].append("Max-only daily series lost its daily maxima")
+                self.test_results["tests_failed"] += 1
+                return False
+            
+            columns = [column for column, _, _ in statistic_columns('temperature_c', {STATISTIC_MAX: maxima})]
+            if columns != ['temperature_c_max']:
+                self.test_results["errors"].append(f"Max-only daily series produced columns {columns}")
+                self.test_results["tests_failed"] += 1
+                return False
+            
+            # With a mean series, the mean column holds the daily means
+            records = column_records(statistic_columns('temperature_c', {STATISTIC_MAX: maxima, STATISTIC_MEAN: means}))
+            if [record['temperature_c'] for record in records] != [10.0, 10.5, 11.5]:
+                self.test_results["errors"].append("Daily mean column does not hold the mean series")
+                self.test_results["tests_failed"] += 1
+                return False
+            
+            print("  ✅ Statistic columns test passed")
+            self.test_results["tests_passed"] += 1
+            return True
+            
+        except Exception as e:
+            self.test_results["errors"].append(f"Statistic columns test error: {e}")
+            self.test_results["tests_failed"] += 1
+            return False
+    
+    def test_location_bundles(self):
+        """Test that location bundles hold the same documents as the per-parameter files"""
+        print("Testing location bundles...")
+        self.test_results["tests_run"] += 1
+        
+        try:
+            manifest = load_manifest(self.base_dir)
+            
+            # Check every bundle the manifest lists; without any, build one in memory
+            bundles = []
+            for location_id, location in manifest.get('organized', {}).items():
+                for year, path in location.get('bundles', {}).items():
+                    with open(f"{self.base_dir}/{path}", 'r') as f:
+                        bundles.append((location, year, json.load(f)))
+            
+            if not bundles:
+                location = manifest.get('organized', {}).get('410', {})
+                series = {}
+                for parameter in PARAMETER_DIRS:
+                    for year, path in location.get(parameter, {}).items():
+                        with open(f"{self.base_dir}/{path}", 'r') as f:
+                            series.setdefault(parameter, {})[year] = json.load(f)
+                if not series:
+                    self.test_results["warnings"].append("No series files available for the location bundle test")
+                    print("  ⚠️ Location bundle test skipped: no data files")
+                    self.test_results["tests_passed"] += 1
+                    return True
+                year = min(year for documents in series.values() for year in documents)
+                bundles.append((location, year, build_bundle(410, series, year=year)))
+            
+            requests_saved = 0
+            for location, year, bundle in bundles:
+                if not is_bundle(bundle):
+                    self.test_results["errors"].append(f"Bundle for location {location.get('watershed')} {year} has no bundle format")
+                    self.test_results["tests_failed"] += 1
+                    return False
+                
+                for parameter, documents in bundle['parameters'].items():
+                    documents = documents if year == ALL_YEARS else {year: documents}
+                    for series_year, document in documents.items():
+                        path = location.get(parameter, {}).get(str(series_year))
+                        if not path:
+                            continue
+                        with open(f"{self.base_dir}/{path}", 'r') as f:
+                            source = json.load(f)
+                        if to_row_document(document) != to_row_document(source):
+                            self.test_results["errors"].append(f"Bundled {parameter} {series_year} does not match {path}")
+                            self.test_results["tests_failed"] += 1
+                            return False
+                        requests_saved += 1
+            
+            print(f"  {len(bundles)} bundle(s) replace {requests_saved} parameter file requests")
+            print("  ✅ Location bundle test passed")
+            self.test_results["tests_passed"] += 1
+            return True
+            
+        except Exception as e:
+            self.test_results["errors"].append(f"Location bundle test error: {e}")
+            self.test_results["tests_failed"] += 1
+            return False
+    
     def generate_afca_integration_code(self):
         """Generate AFCA integration code example"""
         print("Generating AFCA integration code example...")
@@ -355,6 +1064,13 @@ watershedLoader.loadWatershedData('410').then(data => {
         self.test_afca_data_format()
         self.test_data_statistics()
         self.test_github_cdn_compatibility()
+        self.test_concurrent_downloader()
+        self.test_request_scheduler()
+        self.test_incremental_watermarks()
+        self.test_byte_range_records()
+        self.test_columnar_format()
+        self.test_location_bundles()
+        self.test_statistic_columns()
         
         # Generate integration code
         self.generate_afca_integration_code()
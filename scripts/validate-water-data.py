@@ -9,6 +9,8 @@ import json
 from datetime import datetime
 from pathlib import Path
 
+from columnar import COLUMNAR_FORMAT, columnar_errors, to_row_document
+
 def get_working_directory():
     """Return the working directory for local storage"""
     return "."
@@ -61,6 +63,13 @@ class WaterDataValidator:
             with open(file_path, 'r') as f:
                 data = json.load(f)
             
+            # Columnar variants are checked structurally, then validated as rows
+            if data.get('format') == COLUMNAR_FORMAT:
+                if not self.validate_columnar_structure(data, file_path):
+                    self.validation_results["files_invalid"] += 1
+                    return
+                data = to_row_document(data)
+            
             # Basic structure validation
             if not self.validate_basic_structure(data, file_path):
                 self.validation_results["files_invalid"] += 1
@@ -138,6 +147,34 @@ class WaterDataValidator:
         
         return True
     
+    def validate_columnar_structure(self, data, file_path):
+        """Validate a columnar variant's arrays and compare it with the row file next to it"""
+        if 'columns' in data:
+            errors = columnar_errors(data['columns'])
+        else:
+            errors = ["Missing columns block"]
+        if errors:
+            for error in errors:
+                self.validation_results["errors"].append({
+                    "file": file_path,
+                    "error": error,
+                    "type": "columnar_error"
+                })
+            return False
+        
+        row_file = file_path.replace('.columnar.json', '.json')
+        if os.path.exists(row_file):
+            with open(row_file, 'r') as f:
+                rows = json.load(f)
+            if rows.get('data') != to_row_document(data)['data']:
+                self.validation_results["warnings"].append({
+                    "file": file_path,
+                    "warning": f"Columnar data differs from {os.path.basename(row_file)}",
+                    "type": "columnar_mismatch"
+                })
+        
+        return True
+    
     def validate_temperature_data(self, data, file_path):
         """Validate temperature data"""
         # Check for data array
@@ -151,7 +188,9 @@ class WaterDataValidator:
         
         # Validate temperature values
         for i, day in enumerate(data['data']):
-            if 'temperature_c' not in day:
+            # Series reported only as daily extremes carry temperature_c_max / temperature_c_min instead
+            column = next((column for column in ('temperature_c', 'temperature_c_max', 'temperature_c_min') if column in day), None)
+            if column is None:
                 self.validation_results["errors"].append({
                     "file": file_path,
                     "error": f"Missing temperature_c in data[{i}]",
@@ -159,7 +198,7 @@ class WaterDataValidator:
                 })
                 return False
             
-            temp = day['temperature_c']
+            temp = day[column]
             if not isinstance(temp, (int, float)):
                 self.validation_results["errors"].append({
                     "file": file_path,
@@ -202,7 +241,9 @@ class WaterDataValidator:
         
         # Validate flow values
         for i, day in enumerate(data['data']):
-            if 'flow_cfs' not in day:
+            # Series reported only as daily extremes carry flow_cfs_max / flow_cfs_min instead
+            column = next((column for column in ('flow_cfs', 'flow_cfs_max', 'flow_cfs_min') if column in day), None)
+            if column is None:
                 self.validation_results["errors"].append({
                     "file": file_path,
                     "error": f"Missing flow_cfs in data[{i}]",
@@ -210,7 +251,7 @@ class WaterDataValidator:
                 })
                 return False
             
-            flow = day['flow_cfs']
+            flow = day[column]
             if not isinstance(flow, (int, float)):
                 self.validation_results["errors"].append({
                     "file": file_path,